@@ -1,8 +1,13 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
+import contextlib
+import contextvars
+import json
 import os
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout, wait as wait_for_futures
 from typing import List
-from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_core.messages import HumanMessage, SystemMessage, ToolMessage
 from langchain_openai import ChatOpenAI
+from langgraph.errors import GraphRecursionError
 from langgraph.prebuilt import create_react_agent
 
 # Import all tools
@@ -12,21 +17,64 @@ from tools import (
     # Reading and navigation
     read_text, move_cursor, find_text, report_status,
     # Text manipulation
-    modify_selection, edit_text, clipboard_action, history_action,
+    modify_selection, edit_text, batch_edit, clipboard_action, history_action,
     # Formatting and file management
     apply_formatting, manage_file,
     # TTS and app features
     control_tts, manage_app_feature, get_help
 )
+import budgets
+import completion
+import partials
+import profiler
+import recorder
+from budgets import DEADLINE, STEPS, BudgetCallback, BudgetExceeded, CommandBudget, describe_reason, invalid_limit
+from document import get_document, use_document
+from fast_path import CONFIDENCE_THRESHOLD, interpret
+from memory import references_context
+from plan_cache import document_state, from_environment as plan_cache_from_environment
+from sessions import SESSION_HEADER, sessions
+from speculation import AGENT, LOCAL, Speculation, SpeculationCallback, record as record_speculation, stats as speculation_stats
+from sync import get_operation_log, parse_position
 
 # Initialize Flask app
 app = Flask(__name__)
 
+# Define the tools list - group them by category for easier management
+TOOLS = [
+    # Original general-purpose tools
+    search_web, calculator, get_current_time,
+    
+    # Reading and navigation tools
+    read_text, move_cursor, find_text, report_status,
+    
+    # Text manipulation tools
+    modify_selection, edit_text, batch_edit, clipboard_action, history_action,
+    
+    # Formatting and file management tools
+    apply_formatting, manage_file,
+    
+    # TTS and app feature tools
+    control_tts, manage_app_feature, get_help
+]
+TOOLS_BY_NAME = {tool.name: tool for tool in TOOLS}
+
+# Opt-in cache of the tool calls chosen for each command: PLAN_CACHE=on, or PLAN_CACHE_PATH
+# to share it between worker processes through a SQLite file. Cached responses are tool outputs.
+plan_cache = plan_cache_from_environment()
+
+# Commands the local fast path recognizes confidently skip the agent; doubtful ones race it. FAST_PATH=off disables this.
+fast_path_enabled = os.environ.get("FAST_PATH", "on") != "off"
+
+# Agent runs happen on these threads so a request can stop waiting at its deadline
+agent_executor = ThreadPoolExecutor(max_workers=64, thread_name_prefix="agent")
+
 # Set your OpenAI API key
 # os.environ["OPENAI_API_KEY"] = "your-api-key-here"
 
 # Initialize the agent
-def initialize_agent():
+def initialize_agent(llm=None):
+    """Build the ReAct agent. Pass ``llm`` to use a model other than OpenAI (e.g. a stub in tests)."""
     # Create a custom system message for the accessibility assistant
     system_message = """You are an intelligent voice-controlled text editor assistant designed to help users 
 with accessibility needs. Your primary focus is to provide accurate and helpful responses to voice commands 
@@ -41,31 +89,14 @@ Important: Users may have visual impairments, so your responses should be clear
 easy to understand when read aloud by a screen reader."""
     
     # Initialize the LLM with system message
-    llm = ChatOpenAI(model="gpt-3.5-turbo", temperature=0)
+    if llm is None:
+        llm = ChatOpenAI(model="gpt-3.5-turbo", temperature=0)
     llm_with_system = llm.bind(messages=[SystemMessage(content=system_message)])
     
-    # Define the tools list - group them by category for easier management
-    tools = [
-        # Original general-purpose tools
-        search_web, calculator, get_current_time,
-        
-        # Reading and navigation tools
-        read_text, move_cursor, find_text, report_status,
-        
-        # Text manipulation tools
-        modify_selection, edit_text, clipboard_action, history_action,
-        
-        # Formatting and file management tools
-        apply_formatting, manage_file,
-        
-        # TTS and app feature tools
-        control_tts, manage_app_feature, get_help
-    ]
-    
     # Create a ReAct agent using LangGraph's prebuilt helper
     agent = create_react_agent(
         llm_with_system,
-        tools
+        TOOLS
     )
     
     return agent
@@ -73,6 +104,265 @@ easy to understand when read aloud by a screen reader."""
 # Initialize the agent at startup
 agent = initialize_agent()
 
+def describe_messages(messages):
+    """Turn agent messages into the process_details list returned to clients"""
+    process_details = []
+    for message in messages:
+        if hasattr(message, "tool_calls") and message.tool_calls:
+            # AI message with tool calls
+            step = {
+                "type": "ai_thinking",
+                "content": message.content if message.content else "Deciding to use a tool...",
+                "tool_calls": []
+            }
+            
+            for tool_call in message.tool_calls:
+                step["tool_calls"].append({
+                    "name": tool_call['name'],
+                    "args": tool_call['args']
+                })
+            
+            process_details.append(step)
+        elif hasattr(message, "name") and message.name:
+            # Tool response message
+            process_details.append({
+                "type": "tool_response",
+                "name": message.name,
+                "content": message.content
+            })
+        else:
+            # Human or AI message without tool calls
+            msg_type = "human" if isinstance(message, HumanMessage) else "ai"
+            process_details.append({
+                "type": msg_type,
+                "content": message.content
+            })
+    return process_details
+
+def tool_calls_made(process_details):
+    """All tool calls made while handling a command"""
+    tool_calls = []
+    for step in process_details:
+        if step["type"] == "ai_thinking":
+            tool_calls.extend(step["tool_calls"])
+    return tool_calls
+
+def extract_plan(process_details):
+    """The tool calls made for a command, or None if the run should not be cached"""
+    for step in process_details:
+        if step["type"] == "tool_response" and str(step["content"]).startswith("Error"):
+            return None
+    return tool_calls_made(process_details) or None
+
+def tracing_callbacks():
+    """Callbacks of the profiler and trace recorder, when they are on for this request"""
+    return [*profiler.callbacks(), *recorder.callbacks()]
+
+def run_plan(user_input, plan, note="Using a cached plan for this command"):
+    """Run known tool calls directly, without the LLM"""
+    process_details = [
+        {"type": "human", "content": user_input},
+        {"type": "ai_thinking", "content": note, "tool_calls": plan}
+    ]
+    outputs = []
+    for tool_call in plan:
+        output = str(TOOLS_BY_NAME[tool_call["name"]].invoke(tool_call["args"], {"callbacks": tracing_callbacks()}))
+        outputs.append(output)
+        process_details.append({"type": "tool_response", "name": tool_call["name"], "content": output})
+    final_response = " ".join(outputs)
+    process_details.append({"type": "ai", "content": final_response})
+    return final_response, process_details
+
+def partial_response(messages, reason):
+    """Best-effort final response for a run stopped by its budget"""
+    done = [str(message.content) for message in messages
+            if isinstance(message, ToolMessage) and not str(message.content).startswith("Error")]
+    summary = " ".join(done) if done else "No actions were taken."
+    return f"Stopped early because {describe_reason(reason)}. Done so far: {summary}"
+
+class AgentRun:
+    """One agent run on a worker thread, bounded by a CommandBudget.
+    
+    The messages produced so far are kept, so a run stopped by its budget can
+    still report what it did. Pass ``draft`` (the agent's first message,
+    drafted from a partial transcript) to start from that step instead of a
+    fresh model call.
+    """
+    
+    def __init__(self, user_input, history, budget, callbacks=(), draft=None):
+        self.budget = budget
+        self.draft = draft
+        self.history_length = len(history)
+        self.messages = history + [HumanMessage(content=user_input)]
+        config = {
+            "callbacks": [BudgetCallback(budget), *tracing_callbacks(), *callbacks],
+            "recursion_limit": budget.recursion_limit
+        }
+        # Copy the context so the agent's tools see this request's document
+        context = contextvars.copy_context()
+        self.future = agent_executor.submit(context.run, self._run, config)
+    
+    def _run(self, config):
+        if self.draft is not None:
+            self.messages = self.messages + [self.draft]
+            if not self.draft.tool_calls:
+                return
+            # Run the drafted tool calls as the agent's tools node would, then let it continue
+            self.messages = self.messages + [self._call_tool(tool_call, config) for tool_call in self.draft.tool_calls]
+        for state in agent.stream({"messages": self.messages}, config, stream_mode="values"):
+            self.messages = state["messages"]
+    
+    def _call_tool(self, tool_call, config):
+        tool = TOOLS_BY_NAME.get(tool_call["name"])
+        if tool is None:
+            return ToolMessage(content=f"Error: {tool_call['name']} is not a valid tool",
+                               name=tool_call["name"], tool_call_id=tool_call["id"], status="error")
+        try:
+            return tool.invoke({**tool_call, "type": "tool_call"}, config)
+        except BudgetExceeded:
+            raise
+        except Exception as e:
+            return ToolMessage(content=f"Error: {repr(e)}\n Please fix your mistakes.",
+                               name=tool_call["name"], tool_call_id=tool_call["id"], status="error")
+    
+    def result(self):
+        """Wait until the run ends or its deadline passes.
+        
+        Returns the final response, process details and the reason the run
+        stopped early (None if it finished).
+        """
+        reason = None
+        try:
+            self.future.result(timeout=self.budget.remaining())
+        except FutureTimeout:
+            # The run stops at its next model or tool call
+            reason = self.budget.exhaust(DEADLINE)
+        except BudgetExceeded as e:
+            reason = e.reason
+        except GraphRecursionError:
+            reason = self.budget.exhaust(STEPS)
+        
+        messages = self.messages[self.history_length:]
+        if reason is not None:
+            final_response = partial_response(messages, reason)
+            return final_response, describe_messages(messages) + [{"type": "ai", "content": final_response}], reason
+        return messages[-1].content, describe_messages(messages), None
+
+def run_agent(user_input, history, budget):
+    """Run the agent on a command within its budget"""
+    return AgentRun(user_input, history, budget).result()
+
+def draft_first_step(user_input, history):
+    """Run the agent up to its first model response, without running any tool"""
+    stream = agent.stream({"messages": history + [HumanMessage(content=user_input)]}, stream_mode="updates")
+    try:
+        for update in stream:
+            # Closing the stream after the model node stops the graph before the tools node
+            return update["agent"]["messages"][-1]
+    finally:
+        stream.close()
+
+def run_speculative(user_input, history, interpretation, budget):
+    """Commit a confident local interpretation, or race a doubtful one against the agent.
+    
+    Confident interpretations run without the agent. Below the threshold the
+    agent starts, and the local plan is used only if the agent's first step
+    proposes the same tool calls (see speculation.py). Returns the final
+    response, process details, the reason the agent stopped early (if it
+    did) and whether the local path won.
+    """
+    if interpretation.confidence >= CONFIDENCE_THRESHOLD:
+        record_speculation(LOCAL)
+        final_response, process_details = run_plan(
+            user_input, interpretation.tool_calls, "Recognized this command without the language model")
+        return final_response, process_details, None, True
+    
+    speculation = Speculation(interpretation.tool_calls)
+    run = AgentRun(user_input, history, budget, [SpeculationCallback(speculation)])
+    wait_for_futures([run.future], timeout=budget.remaining())
+    # Settle the race: the agent's claim fails only if it already confirmed the local plan
+    if not speculation.claim(AGENT):
+        run.future.cancel()
+        final_response, process_details = run_plan(
+            user_input, interpretation.tool_calls, "The language model confirmed the local interpretation")
+        return final_response, process_details, None, True
+    
+    final_response, process_details, reason = run.result()
+    return final_response, process_details, reason, False
+
+def run_command(user_input, memory=None, budget=None, draft=None):
+    """Handle one command, with conversation memory if the request belongs to a session
+    
+    ``draft`` is the session's draft from partial transcripts, if any; it is
+    used when it was made for this command.
+    """
+    budget = budget or CommandBudget()
+    # Commands that refer back to earlier turns need the agent and the conversation history
+    context_dependent = memory is not None and references_context(user_input)
+    use_plan_cache = plan_cache is not None and not context_dependent
+    # The state the plan will depend on, taken before anything runs
+    plan_state = document_state(get_document()) if use_plan_cache else ""
+    
+    # Reuse the tool calls from an earlier run of the same command in the same state if we have them
+    with profiler.span("plan_cache.get"):
+        plan = plan_cache.get(user_input, plan_state) if use_plan_cache else None
+    if plan is not None and all(tool_call["name"] in TOOLS_BY_NAME for tool_call in plan):
+        final_response, process_details = run_plan(user_input, plan)
+        result = {
+            'command': user_input,
+            'final_response': final_response,
+            'process_details': process_details,
+            'cached_plan': True
+        }
+    else:
+        # Earlier turns (recent ones verbatim, older ones summarized) go before the command
+        with profiler.span("memory.build_messages"):
+            history = memory.build_messages(get_document(), user_input) if memory is not None else []
+        
+        drafted = None
+        if draft is not None and draft.matches(user_input, history):
+            with profiler.span("partials.wait_for_draft"):
+                drafted = draft.message(budget.remaining())
+        
+        interpretation = None
+        if drafted is None and fast_path_enabled and not context_dependent:
+            with profiler.span("fast_path.interpret"):
+                interpretation = interpret(user_input, get_document())
+        
+        if drafted is not None:
+            # The model already picked its first step while the user was speaking
+            partials.count("drafts_reused")
+            final_response, process_details, exhausted = AgentRun(
+                user_input, history, budget, draft=drafted).result()
+            used_fast_path = False
+        elif interpretation is not None:
+            final_response, process_details, exhausted, used_fast_path = run_speculative(
+                user_input, history, interpretation, budget)
+        else:
+            final_response, process_details, exhausted = run_agent(user_input, history, budget)
+            used_fast_path = False
+        
+        result = {
+            'command': user_input,
+            'final_response': final_response,
+            'process_details': process_details
+        }
+        if drafted is not None:
+            result['draft_reused'] = True
+        if used_fast_path:
+            result['fast_path'] = True
+        elif exhausted is not None:
+            # Partial runs are returned but never cached
+            result['budget_exhausted'] = exhausted
+        else:
+            plan = extract_plan(process_details)
+            if use_plan_cache and plan is not None:
+                plan_cache.put(user_input, plan, plan_state)
+    
+    if memory is not None:
+        memory.add_turn(user_input, final_response, tool_calls_made(process_details))
+    return result
+
 # API endpoint for processing text commands
 @app.route('/api/command', methods=['POST'])
 def process_command():
@@ -86,97 +376,224 @@ def process_command():
         
         user_input = data['command']
         
-        # Create the agent input with messages
-        agent_input = {"messages": [HumanMessage(content=user_input)]}
-        
-        # Run the agent
-        response = agent.invoke(agent_input)
-        
-        # Extract the full process details
-        process_details = []
-        for message in response["messages"]:
-            if hasattr(message, "tool_calls") and message.tool_calls:
-                # AI message with tool calls
-                step = {
-                    "type": "ai_thinking",
-                    "content": message.content if message.content else "Deciding to use a tool...",
-                    "tool_calls": []
-                }
-                
-                for tool_call in message.tool_calls:
-                    step["tool_calls"].append({
-                        "name": tool_call['name'],
-                        "args": tool_call['args']
-                    })
-                
-                process_details.append(step)
-            elif hasattr(message, "name") and message.name:
-                # Tool response message
-                process_details.append({
-                    "type": "tool_response",
-                    "name": message.name,
-                    "content": message.content
-                })
+        # Clients may ask for a tighter deadline or fewer steps than the server defaults
+        invalid = invalid_limit(data)
+        if invalid is not None:
+            return jsonify({'error': f'{invalid} must be a positive integer'}), 400
+        budget = CommandBudget(data.get('deadline_ms'), data.get('max_steps'), data.get('max_tool_calls'))
+        
+        # Profile this command if the client asks for it or profiling is on for all requests
+        profiling = profiler.profiling(user_input) if data.get('profile') or profiler.profiling_enabled else None
+        
+        with profiling or contextlib.nullcontext() as profile:
+            # Requests in a session get their own document and conversation memory
+            session_id = data.get('session_id') or request.headers.get(SESSION_HEADER)
+            if session_id:
+                session = sessions.get(str(session_id))
+                with session.lock, use_document(session.document), \
+                        recorder.recording(session.document, user_input, session.id) as recording:
+                    draft = session.drafter.take() if session.drafter is not None else None
+                    result = run_command(user_input, session.memory, budget, draft)
+                    if recording is not None:
+                        recording.result = result
+                result['session_id'] = session.id
             else:
-                # Human or AI message without tool calls
-                msg_type = "human" if isinstance(message, HumanMessage) else "ai"
-                process_details.append({
-                    "type": msg_type,
-                    "content": message.content
-                })
+                with recorder.recording(get_document(), user_input, None) as recording:
+                    result = run_command(user_input, budget=budget)
+                    if recording is not None:
+                        recording.result = result
         
-        # Extract the last message which contains the final response
-        final_response = response["messages"][-1].content
+        if profile is not None:
+            result['profile_id'] = profile.id
         
         # Return the detailed response
-        return jsonify({
-            'command': user_input,
-            'final_response': final_response,
-            'process_details': process_details
-        })
+        return jsonify(result)
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def handle_partial(transcript, session):
+    """Classify, prefetch and draft from a partial transcript (see partials.py)"""
+    partials.count("partials")
+    result = {'transcript': transcript, 'intent': None, 'prefetched': [], 'drafting': False}
+    if plan_cache is not None and plan_cache.get(transcript, document_state(session.document), count=False) is not None:
+        result['intent'] = 'cached_plan'
+        return result
+    
+    interpretation = interpret(transcript, session.document) if fast_path_enabled else None
+    if interpretation is not None:
+        result['intent'] = [tool_call['name'] for tool_call in interpretation.tool_calls]
+        result['prefetched'] = partials.prefetch(interpretation, session.document)
+        if interpretation.confidence >= CONFIDENCE_THRESHOLD:
+            # The fast path will handle the final command without the model
+            return result
+    
+    if session.drafter is None:
+        session.drafter = partials.Drafter(agent_executor, draft_first_step)
+    history = session.memory.build_messages(session.document, transcript)
+    result['drafting'] = session.drafter.update(transcript, history)
+    return result
+
+# API endpoint for partial transcripts of a command that is still being spoken
+@app.route('/api/command/partial', methods=['POST'])
+def process_partial():
+    try:
+        data = request.get_json()
+        
+        if 'transcript' not in data:
+            return jsonify({'error': 'No transcript provided'}), 400
+        
+        session_id = data.get('session_id') or request.headers.get(SESSION_HEADER)
+        if not session_id:
+            return jsonify({'error': 'Partial transcripts need a session_id'}), 400
+        
+        session = sessions.get(str(session_id))
+        # Partials are only hints: while a command runs in the session, answer at once without a draft
+        if not session.lock.acquire(blocking=False):
+            partials.count("partials_busy")
+            result = {'transcript': data['transcript'], 'intent': None, 'prefetched': [], 'drafting': False,
+                      'busy': True}
+        else:
+            try:
+                result = handle_partial(data['transcript'], session)
+            finally:
+                session.lock.release()
+        result['session_id'] = session.id
+        return jsonify(result)
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# Seconds between keep-alive comments on idle event streams
+SYNC_HEARTBEAT = 15
+
+def session_operation_log(session_id):
+    """The operation log of a session's document, for clients sharing it"""
+    # Only the document's short lock is needed, so this never waits for a running command
+    return get_operation_log(sessions.get(str(session_id)).document)
+
+# Full state of a shared session's document, for clients joining it
+@app.route('/api/sessions/<session_id>/snapshot', methods=['GET'])
+def session_snapshot(session_id):
+    return jsonify(session_operation_log(session_id).snapshot())
+
+# Operations after ?since=N as one batch (or a snapshot if N is too old), for polling clients
+@app.route('/api/sessions/<session_id>/ops', methods=['GET'])
+def session_operations(session_id):
+    log = session_operation_log(session_id)
+    return jsonify(log.batch_since(request.args.get('since', type=int), request.args.get('log_id')))
+
+# Server-sent event stream of a shared session's changes: a snapshot, then batches of operations
+@app.route('/api/sessions/<session_id>/events', methods=['GET'])
+def session_events(session_id):
+    log_id, since = request.args.get('log_id'), request.args.get('since', type=int)
+    if since is None:
+        # EventSource sends the last event id it saw when it reconnects
+        log_id, since = parse_position(request.headers.get('Last-Event-ID'))
+    log = session_operation_log(session_id)
+    subscription = log.subscribe(since, log_id)
+    
+    def stream():
+        while True:
+            message = subscription.next_message(SYNC_HEARTBEAT)
+            if message is None:
+                yield ": keep-alive\n\n"
+            else:
+                yield f"id: {log.id}:{subscription.seq}\nevent: {message['type']}\ndata: {json.dumps(message)}\n\n"
+    
+    return Response(stream(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
+# Apply many edits to a session's document in one round trip, as a single undoable change
+@app.route('/api/sessions/<session_id>/edits', methods=['POST'])
+def session_edits(session_id):
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data.get('edits'), list):
+        return jsonify({'error': 'No edits provided'}), 400
+    try:
+        edits = [(int(start), int(end), str(text)) for start, end, text in data['edits']]
+        cursors = [int(cursor) for cursor in data.get('cursors') or []]
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': f'Invalid edits: {e}'}), 400
+    
+    session = sessions.get(str(session_id))
+    with session.lock:
+        document = session.document
+        previous_cursors = document.cursor, document.cursors
+        try:
+            # Cursors are given in offsets of the text before the edits, so the edits move them
+            if cursors:
+                document.set_cursors(cursors)
+            with document.transaction() as transaction:
+                for start, end, text in edits:
+                    transaction.replace(start, end, text)
+        except ValueError as e:
+            document.cursor, document.cursors = previous_cursors
+            return jsonify({'error': f'Invalid edits: {e}'}), 400
+        return jsonify({'applied': len(transaction), 'length': len(document.text), 'cursors': document.all_cursors()})
+
+# Maximum suggestions per completion request
+MAX_COMPLETIONS = 20
+
+# Word completions for the word being typed in a session's document; cheap enough to call on every keystroke
+@app.route('/api/sessions/<session_id>/complete', methods=['GET'])
+def session_complete(session_id):
+    session = sessions.get(str(session_id))
+    # Built under the document's own short lock on first use, so this never waits for a running command
+    index = completion.get_completions(session.document)
+    prefix = request.args.get('prefix')
+    if prefix is None:
+        prefix = completion.word_before(session.document, request.args.get('offset', type=int))
+    limit = min(max(request.args.get('limit', 5, type=int), 0), MAX_COMPLETIONS)
+    return jsonify({'prefix': prefix, 'completions': index.complete(prefix, limit)})
+
 # Optional: Add a health check endpoint
 @app.route('/api/health', methods=['GET'])
 def health_check():
     return jsonify({'status': 'ok'})
 
+# Counters for this process: budgets hit, speculation outcomes, partial transcripts and plan cache use
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    return jsonify({
+        'budgets': dict(budgets.metrics),
+        'speculation': dict(speculation_stats),
+        'partials': dict(partials.stats),
+        'plan_cache': plan_cache.stats() if plan_cache is not None else None
+    })
+
+# Profiles of recently profiled commands
+@app.route('/api/profiles', methods=['GET'])
+def get_profiles():
+    return jsonify({'profiles': profiler.list_profiles()})
+
+# One profile in Chrome trace format: open it in chrome://tracing, Perfetto or speedscope
+@app.route('/api/profiles/<profile_id>', methods=['GET'])
+def get_profile(profile_id):
+    profile = profiler.get_profile(profile_id)
+    if profile is None:
+        return jsonify({'error': 'Unknown profile'}), 404
+    return jsonify(profile.to_chrome_trace())
+
+def build_tool_catalog():
+    """Describe every tool once; the catalog never changes while the server runs"""
+    tools_info = []
+    for tool in TOOLS:
+        tool_info = {
+            'name': tool.name,
+            'description': tool.description,
+            'args_schema': str(tool.args_schema) if hasattr(tool, 'args_schema') else None
+        }
+        tools_info.append(tool_info)
+    return tools_info
+
+# Built at import time, so pre-forked workers share it copy-on-write
+TOOL_CATALOG = build_tool_catalog()
+
 # Optional: Add a route to get available tools and their descriptions
 @app.route('/api/tools', methods=['GET'])
 def get_tools():
     try:
-        tools_info = []
-        
-        # Get all tools used when initializing the agent
-        all_tools = [
-            # Original general-purpose tools
-            search_web, calculator, get_current_time,
-            
-            # Reading and navigation tools
-            read_text, move_cursor, find_text, report_status,
-            
-            # Text manipulation tools
-            modify_selection, edit_text, clipboard_action, history_action,
-            
-            # Formatting and file management tools
-            apply_formatting, manage_file,
-            
-            # TTS and app feature tools
-            control_tts, manage_app_feature, get_help
-        ]
-        
-        # Format tool information
-        for tool in all_tools:
-            tool_info = {
-                'name': tool.name,
-                'description': tool.description,
-                'args_schema': str(tool.args_schema) if hasattr(tool, 'args_schema') else None
-            }
-            tools_info.append(tool_info)
-        
-        return jsonify({'tools': tools_info})
+        return jsonify({'tools': TOOL_CATALOG})
     except Exception as e:
         return jsonify({'error': f'Error retrieving tools: {str(e)}'}), 500
 
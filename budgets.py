@@ -0,0 +1,140 @@
+"""Per-command deadlines and ReAct step budgets.
+
+Every command gets a ``CommandBudget``: a deadline plus a maximum number of
+agent steps (model calls) and tool calls. ``BudgetCallback`` checks the budget
+each time the agent is about to call the model or a tool and aborts the run
+once it is used up. The deadline is also enforced from the outside: the API
+waits for the agent only until the deadline and then cancels it, so a slow
+model call cannot hold the request past its deadline. Counters in ``metrics``
+record how often each limit is hit.
+"""
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from speculation import AgentCancelled
+
+DEFAULT_DEADLINE_MS = int(os.environ.get("COMMAND_DEADLINE_MS", "20000"))
+MAX_DEADLINE_MS = int(os.environ.get("MAX_COMMAND_DEADLINE_MS", "120000"))
+MAX_AGENT_STEPS = int(os.environ.get("MAX_AGENT_STEPS", "6"))
+MAX_TOOL_CALLS = int(os.environ.get("MAX_TOOL_CALLS", "10"))
+
+# Reasons a run can stop early
+DEADLINE = "deadline"
+STEPS = "max_steps"
+TOOL_CALLS = "max_tool_calls"
+
+metrics: Dict[str, int] = {"commands": 0, DEADLINE: 0, STEPS: 0, TOOL_CALLS: 0}
+_metrics_lock = threading.Lock()
+
+
+def _count(name: str) -> None:
+    with _metrics_lock:
+        metrics[name] += 1
+
+
+class BudgetExceeded(AgentCancelled):
+    """Raised inside the agent run when its budget is used up."""
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+# Request fields clients can use to tighten a command's budget
+LIMIT_FIELDS = ["deadline_ms", "max_steps", "max_tool_calls"]
+
+
+def invalid_limit(data: Dict[str, Any]) -> Optional[str]:
+    """The first of ``LIMIT_FIELDS`` in ``data`` that is given but not a positive integer, or None."""
+    for field in LIMIT_FIELDS:
+        value = data.get(field)
+        if value is not None and (isinstance(value, bool) or not isinstance(value, int) or value <= 0):
+            return field
+    return None
+
+
+class CommandBudget:
+    """Deadline and step limits for one command. Limits must be positive (see ``invalid_limit``)."""
+
+    def __init__(
+        self,
+        deadline_ms: Optional[int] = None,
+        max_steps: Optional[int] = None,
+        max_tool_calls: Optional[int] = None
+    ):
+        # Clients may tighten the limits, never loosen them past the server maximum
+        deadline_ms = min(DEFAULT_DEADLINE_MS if deadline_ms is None else deadline_ms, MAX_DEADLINE_MS)
+        self.deadline = time.monotonic() + deadline_ms / 1000.0
+        self.max_steps = min(MAX_AGENT_STEPS if max_steps is None else max_steps, MAX_AGENT_STEPS)
+        self.max_tool_calls = min(MAX_TOOL_CALLS if max_tool_calls is None else max_tool_calls, MAX_TOOL_CALLS)
+        self.steps = 0
+        self.tool_calls = 0
+        self.exhausted: Optional[str] = None
+        self._lock = threading.Lock()
+        _count("commands")
+
+    @property
+    def recursion_limit(self) -> int:
+        """LangGraph superstep limit as a backstop: a ReAct step is a model node plus a tools node."""
+        return 2 * self.max_steps + 2
+
+    def remaining(self) -> float:
+        """Seconds left until the deadline (never negative)."""
+        return max(0.0, self.deadline - time.monotonic())
+
+    def exhaust(self, reason: str) -> str:
+        """Mark the budget as used up (first reason wins) and return the reason."""
+        with self._lock:
+            if self.exhausted is None:
+                self.exhausted = reason
+                _count(reason)
+            return self.exhausted
+
+    def _check(self) -> None:
+        if self.exhausted is None and time.monotonic() >= self.deadline:
+            self.exhaust(DEADLINE)
+        if self.exhausted is not None:
+            raise BudgetExceeded(self.exhausted)
+
+    def start_step(self) -> None:
+        self._check()
+        with self._lock:
+            self.steps += 1
+            over = self.steps > self.max_steps
+        if over:
+            raise BudgetExceeded(self.exhaust(STEPS))
+
+    def start_tool_call(self) -> None:
+        self._check()
+        with self._lock:
+            self.tool_calls += 1
+            over = self.tool_calls > self.max_tool_calls
+        if over:
+            raise BudgetExceeded(self.exhaust(TOOL_CALLS))
+
+
+class BudgetCallback(BaseCallbackHandler):
+    """Stops the agent before a model or tool call that would exceed its budget."""
+
+    raise_error = True
+
+    def __init__(self, budget: CommandBudget):
+        self.budget = budget
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: Any, **kwargs: Any) -> None:
+        self.budget.start_step()
+
+    def on_tool_start(self, serialized: Dict[str, Any], input_str: str, **kwargs: Any) -> None:
+        self.budget.start_tool_call()
+
+
+def describe_reason(reason: str) -> str:
+    return {
+        DEADLINE: "it ran out of time",
+        STEPS: "it reached the maximum number of reasoning steps",
+        TOOL_CALLS: "it reached the maximum number of actions",
+    }.get(reason, reason)
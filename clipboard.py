@@ -0,0 +1,152 @@
+"""Clipboard ring holding references into the document buffer.
+
+Copying a selection does not slice the text. A ``TextRef`` keeps the
+document's current (immutable) text string together with start and end
+offsets. When the document is edited, each live reference is either rebased
+onto the new text, if the edit did not touch its range, or materialized from
+the old text it still holds, if it did. Only edited or exported ranges are ever
+copied; everything else stays a pair of integers.
+
+The ring keeps a bounded number of entries and evicts the oldest ones once
+materialized entries exceed a byte budget.
+"""
+import sys
+from typing import List, Optional
+
+from document import Document, Edit
+
+MAX_ENTRIES = 20
+MAX_BYTES = 16 * 1024 * 1024
+PREVIEW_LENGTH = 40
+
+
+class TextRef:
+    """A range of text, resolved lazily against the buffer it was taken from."""
+
+    __slots__ = ("_source", "start", "end", "_text")
+
+    def __init__(self, source: str, start: int, end: int):
+        self._source: Optional[str] = source
+        self.start = start
+        self.end = end
+        self._text: Optional[str] = None
+
+    def __len__(self) -> int:
+        return self.end - self.start
+
+    @property
+    def materialized(self) -> bool:
+        return self._text is not None
+
+    @property
+    def cost(self) -> int:
+        """Memory held by this entry beyond the document itself."""
+        return sys.getsizeof(self._text) if self._text is not None else 0
+
+    def text(self) -> str:
+        """Return the referenced text, copying it out of the buffer."""
+        if self._text is not None:
+            return self._text
+        return self._source[self.start:self.end]
+
+    def preview(self, length: int = PREVIEW_LENGTH) -> str:
+        """Return at most ``length`` characters without materializing the rest."""
+        if self._text is not None:
+            snippet = self._text[:length]
+        else:
+            snippet = self._source[self.start:min(self.end, self.start + length)]
+        return snippet + ("..." if len(self) > length else "")
+
+    def rebase(self, new_source: str, edits: List[Edit]) -> None:
+        """Follow the document to ``new_source`` after ``edits``.
+
+        Edits before the range shift it, edits after it are ignored and edits
+        touching it force the range to be copied out of the old buffer.
+        """
+        if self._text is not None:
+            return
+        delta = 0
+        for start, end, replacement in edits:
+            if start >= self.end and not (start == end == self.start):
+                break
+            if end <= self.start:
+                delta += len(replacement) - (end - start)
+            else:
+                self._text = self._source[self.start:self.end]
+                self._source = None
+                return
+        self.start += delta
+        self.end += delta
+        self._source = new_source
+
+
+class ClipboardRing:
+    """Bounded clipboard history for one document."""
+
+    def __init__(self, document: Document, max_entries: int = MAX_ENTRIES, max_bytes: int = MAX_BYTES):
+        self.document = document
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries: List[TextRef] = []
+
+    @classmethod
+    def for_document(cls, document: Document) -> "ClipboardRing":
+        ring = cls(document)
+        document.add_listener(ring.on_edits)
+        return ring
+
+    def on_edits(self, edits: List[Edit]) -> None:
+        text = self.document.text
+        for entry in self.entries:
+            entry.rebase(text, edits)
+        self._enforce_budget()
+
+    def copy(self, start: int, end: int) -> TextRef:
+        """Add a reference to ``[start, end)`` of the document as the newest entry."""
+        entry = TextRef(self.document.text, start, end)
+        self.entries.insert(0, entry)
+        del self.entries[self.max_entries:]
+        return entry
+
+    def cut(self, start: int, end: int) -> TextRef:
+        """Copy ``[start, end)`` and delete it from the document as one undo step."""
+        entry = self.copy(start, end)
+        self.document.apply_edits([(start, end, "")])
+        return entry
+
+    def get(self, index: int = 0) -> Optional[TextRef]:
+        """Entry ``index`` places back in history (0 is the most recent)."""
+        if 0 <= index < len(self.entries):
+            return self.entries[index]
+        return None
+
+    def paste(self, index: int = 0) -> Optional[TextRef]:
+        """Insert an entry at the cursor, replacing the selection if there is one."""
+        entry = self.get(index)
+        if entry is None:
+            return None
+        document = self.document
+        start, end = document.selected_range() or (document.cursor, document.cursor)
+        document.apply_edits([(start, end, entry.text())])
+        document.selection = None
+        document.cursor = start + len(entry)
+        return entry
+
+    def export(self, index: int = 0) -> Optional[str]:
+        """Materialized text of an entry, for handing to the system clipboard."""
+        entry = self.get(index)
+        return entry.text() if entry is not None else None
+
+    def _enforce_budget(self) -> None:
+        total = 0
+        for position, entry in enumerate(self.entries):
+            total += entry.cost
+            # Always keep the newest entry so paste keeps working
+            if total > self.max_bytes and position > 0:
+                del self.entries[position:]
+                return
+
+
+def get_clipboard(document: Document) -> ClipboardRing:
+    """Return the clipboard ring of ``document``, creating it on first use."""
+    return document.index("clipboard", ClipboardRing.for_document)
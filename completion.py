@@ -0,0 +1,220 @@
+"""Word completion over the document's vocabulary and LaTeX commands.
+
+``CompletionIndex`` counts every word in a document and keeps the distinct
+words in a sorted array, so the words starting with a prefix are one
+contiguous slice found by binary search. Edits only recount the words around
+the changed ranges: the index keeps a reference to the text it last saw
+(strings are immutable, so this costs nothing) and compares the words of each
+touched region before and after. The index has its own lock, so queries never
+wait for a command that holds the session lock.
+
+``complete`` ranks the words for a prefix by frequency. Short prefixes match
+large slices, so the words under every prefix of up to
+``RANKED_PREFIX_LENGTH`` characters are also kept in rank order, and a count
+change moves the word within those lists (a binary search each); their top
+results are then a slice, however large the vocabulary. Longer prefixes rank
+their (small) slice of the sorted array. Prefixes starting with a backslash
+also match the static ``LATEX_COMMANDS`` dictionary, after the commands the
+document already uses.
+"""
+import heapq
+import re
+import threading
+from bisect import bisect_left, insort
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from document import Document, Edit
+
+WORD = re.compile(r"\\?[^\W\d]\w*")
+MIN_WORD_LENGTH = 3
+# Prefixes up to this length keep their words in rank order
+RANKED_PREFIX_LENGTH = 2
+# Batches changing more distinct words than this re-sort the vocabulary once instead of inserting each word
+MAX_INCREMENTAL_WORDS = 256
+
+# Common LaTeX commands, most used first
+LATEX_COMMANDS = [
+    "\\begin", "\\end", "\\section", "\\subsection", "\\subsubsection", "\\textbf", "\\textit", "\\emph",
+    "\\item", "\\label", "\\ref", "\\cite", "\\frac", "\\sqrt", "\\sum", "\\int", "\\prod", "\\lim",
+    "\\alpha", "\\beta", "\\gamma", "\\delta", "\\epsilon", "\\varepsilon", "\\zeta", "\\eta", "\\theta",
+    "\\iota", "\\kappa", "\\lambda", "\\mu", "\\nu", "\\xi", "\\pi", "\\rho", "\\sigma", "\\tau",
+    "\\upsilon", "\\phi", "\\varphi", "\\chi", "\\psi", "\\omega", "\\Gamma", "\\Delta", "\\Theta",
+    "\\Lambda", "\\Xi", "\\Pi", "\\Sigma", "\\Phi", "\\Psi", "\\Omega", "\\infty", "\\partial", "\\nabla",
+    "\\cdot", "\\cdots", "\\ldots", "\\times", "\\div", "\\pm", "\\mp", "\\leq", "\\geq", "\\neq",
+    "\\approx", "\\equiv", "\\sim", "\\propto", "\\in", "\\notin", "\\subset", "\\subseteq", "\\cup",
+    "\\cap", "\\forall", "\\exists", "\\rightarrow", "\\leftarrow", "\\Rightarrow", "\\Leftrightarrow",
+    "\\mapsto", "\\left", "\\right", "\\mathbb", "\\mathcal", "\\mathrm", "\\mathbf", "\\hat", "\\bar",
+    "\\vec", "\\dot", "\\tilde", "\\overline", "\\underline", "\\log", "\\ln", "\\exp", "\\sin", "\\cos",
+    "\\tan", "\\max", "\\min", "\\arg", "\\det", "\\quad", "\\qquad", "\\text", "\\texttt",
+    "\\footnote", "\\caption", "\\includegraphics", "\\centering", "\\documentclass", "\\usepackage",
+    "\\title", "\\author", "\\date", "\\maketitle", "\\tableofcontents", "\\chapter", "\\paragraph",
+    "\\newcommand", "\\renewcommand", "\\hline", "\\vspace", "\\hspace", "\\newline", "\\linebreak",
+    "\\newpage", "\\url", "\\href", "\\eqref", "\\pageref", "\\bibliography", "\\bibliographystyle",
+]
+_LATEX_RANK = {command: rank for rank, command in reversed(list(enumerate(LATEX_COMMANDS)))}
+_SORTED_LATEX = sorted(_LATEX_RANK)
+
+
+def _is_word_char(char: str) -> bool:
+    return char.isalnum() or char in "_\\"
+
+
+def _words(text: str) -> List[str]:
+    return [word for word in WORD.findall(text) if len(word) >= MIN_WORD_LENGTH]
+
+
+def _prefix_range(words: List[str], prefix: str) -> Tuple[int, int]:
+    start = bisect_left(words, prefix)
+    # Every word with the prefix sorts before prefix + the highest code point
+    return start, bisect_left(words, prefix + "\U0010ffff", start)
+
+
+class CompletionIndex:
+    """Word frequencies of one document, kept in step with its edits."""
+
+    def __init__(self, text: str = ""):
+        self.counts: Dict[str, int] = {}
+        self.words: List[str] = []
+        self._text = text
+        # (-count, word) of the words under each short prefix, sorted, so the most frequent come first
+        self._ranked: Dict[str, List[Tuple[int, str]]] = {}
+        self._lock = threading.Lock()
+        for word in _words(text):
+            self.counts[word] = self.counts.get(word, 0) + 1
+        self.words = sorted(self.counts)
+        self._rank_all()
+
+    @classmethod
+    def for_document(cls, document: Document) -> "CompletionIndex":
+        index = cls(document.text)
+        document.add_listener(lambda edits: index.on_edits(edits, document.text))
+        return index
+
+    # Edit tracking
+
+    def on_edits(self, edits: List[Edit], new_text: str) -> None:
+        """Recount the words around each edited range."""
+        old_text = self._text
+        changes: Dict[str, int] = {}
+        delta = 0
+        for start, end, change in self._regions(edits, old_text):
+            for word in _words(old_text[start:end]):
+                changes[word] = changes.get(word, 0) - 1
+            for word in _words(new_text[start + delta:end + delta + change]):
+                changes[word] = changes.get(word, 0) + 1
+            delta += change
+        # Words that were only retyped in place (e.g. at every cursor) cancel out here
+        changes = {word: amount for word, amount in changes.items() if amount}
+        with self._lock:
+            if len(changes) > MAX_INCREMENTAL_WORDS:
+                for word, amount in changes.items():
+                    count = self.counts.get(word, 0) + amount
+                    if count > 0:
+                        self.counts[word] = count
+                    else:
+                        self.counts.pop(word, None)
+                self.words = sorted(self.counts)
+                self._rank_all()
+            else:
+                for word, amount in changes.items():
+                    self._count(word, amount)
+            self._text = new_text
+
+    @staticmethod
+    def _regions(edits: List[Edit], text: str) -> List[Tuple[int, int, int]]:
+        """Edited ranges widened to whole words and merged: ``(start, end, length change)``."""
+        regions: List[Tuple[int, int, int]] = []
+        for edit_start, edit_end, replacement in edits:
+            change = len(replacement) - (edit_end - edit_start)
+            start, end = edit_start, edit_end
+            while start > 0 and _is_word_char(text[start - 1]):
+                start -= 1
+            while end < len(text) and _is_word_char(text[end]):
+                end += 1
+            if regions and start <= regions[-1][1]:
+                previous_start, previous_end, previous_change = regions.pop()
+                start, end, change = previous_start, max(end, previous_end), previous_change + change
+            regions.append((start, end, change))
+        return regions
+
+    def _count(self, word: str, amount: int) -> None:
+        previous = self.counts.get(word, 0)
+        count = previous + amount
+        if count > 0:
+            if not previous:
+                insort(self.words, word)
+            self.counts[word] = count
+        elif previous:
+            del self.counts[word]
+            del self.words[bisect_left(self.words, word)]
+        for prefix in _short_prefixes(word):
+            ranked = self._ranked.setdefault(prefix, [])
+            if previous:
+                del ranked[bisect_left(ranked, (-previous, word))]
+            if count > 0:
+                insort(ranked, (-count, word))
+            elif not ranked:
+                del self._ranked[prefix]
+
+    def _rank_all(self) -> None:
+        ranked: Dict[str, List[Tuple[int, str]]] = {}
+        for word, count in self.counts.items():
+            for prefix in _short_prefixes(word):
+                ranked.setdefault(prefix, []).append((-count, word))
+        for entries in ranked.values():
+            entries.sort()
+        self._ranked = ranked
+
+    def _rank(self, word: str) -> Tuple[int, str]:
+        return -self.counts[word], word
+
+    # Queries
+
+    def complete(self, prefix: str, k: int = 5) -> List[str]:
+        """Up to ``k`` completions of ``prefix``, most frequent first."""
+        if not prefix or k <= 0:
+            return []
+        with self._lock:
+            if len(prefix) <= RANKED_PREFIX_LENGTH:
+                ranked = self._ranked.get(prefix, [])
+                results = [word for _, word in ranked[:k + 1] if word != prefix][:k]
+            else:
+                start, end = _prefix_range(self.words, prefix)
+                candidates = (word for word in self.words[start:end] if word != prefix)
+                results = heapq.nsmallest(k, candidates, key=self._rank)
+        if prefix.startswith("\\"):
+            results = _merge_latex(results, prefix, k)
+        return results
+
+
+def _short_prefixes(word: str) -> Iterable[str]:
+    return (word[:length] for length in range(1, min(RANKED_PREFIX_LENGTH, len(word)) + 1))
+
+
+def _merge_latex(results: List[str], prefix: str, k: int) -> List[str]:
+    """Commands the document uses, then dictionary commands by popularity."""
+    if len(results) >= k:
+        return results
+    start, end = _prefix_range(_SORTED_LATEX, prefix)
+    seen = set(results)
+    extra = sorted((command for command in _SORTED_LATEX[start:end] if command not in seen and command != prefix),
+                   key=_LATEX_RANK.__getitem__)
+    return results + extra[:k - len(results)]
+
+
+def get_completions(document: Document) -> CompletionIndex:
+    """Return the completion index of ``document``, creating it on first use."""
+    return document.index("completion", CompletionIndex.for_document)
+
+
+def word_before(document: Document, offset: Optional[int] = None) -> str:
+    """The partial word that ends at ``offset`` (default: the cursor)."""
+    text = document.text
+    offset = min(document.cursor if offset is None else offset, len(text))
+    start = offset
+    while start > 0 and _is_word_char(text[start - 1]):
+        start -= 1
+    # A backslash can only start a LaTeX command
+    word = text[start:offset]
+    backslash = word.rfind("\\")
+    return word[backslash:] if backslash > 0 else word
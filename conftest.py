@@ -0,0 +1,28 @@
+"""Shared pytest setup.
+
+``api`` builds its OpenAI client at import time, which needs an API key even
+though the tests never call the model: endpoint tests swap in ``StubChatModel``.
+"""
+import os
+import uuid
+
+import pytest
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+
+@pytest.fixture
+def api_client(monkeypatch):
+    """A test client for the API with the stub model and no plan cache."""
+    import api
+    from stub_llm import StubChatModel
+
+    monkeypatch.setattr(api, "agent", api.initialize_agent(StubChatModel()))
+    monkeypatch.setattr(api, "plan_cache", None)
+    return api.app.test_client()
+
+
+@pytest.fixture
+def session_id():
+    """A fresh session id, so tests never share a document."""
+    return f"test-{uuid.uuid4().hex[:8]}"
@@ -0,0 +1,402 @@
+"""In-memory document model behind the editing tools.
+
+A ``Document`` owns the text buffer, cursor (plus any extra cursors for
+multi-cursor editing), selection, a line index and the undo/redo history.
+Every change goes through ``Document.apply_edits``, which takes a batch of
+non-overlapping ``(start, end, replacement)`` edits, builds the new text in a
+single pass, updates the indexes once and records the whole batch as one undo
+entry. ``Document.transaction`` stages edits from several places (every
+line of a selection, every cursor) and applies them as one such batch.
+"""
+import re
+import threading
+from bisect import bisect_right
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional, Pattern, Tuple
+
+# (start, end, replacement) in offsets of the text *before* the edit
+Edit = Tuple[int, int, str]
+EditListener = Callable[[List[Edit]], None]
+
+MAX_UNDO_ENTRIES = 500
+MAX_CACHED_SEARCHES = 32
+
+
+def compute_line_starts(text: str) -> List[int]:
+    """Return the offset at which every line of ``text`` starts."""
+    return [0] + [m.end() for m in re.finditer("\n", text)]
+
+
+def shift_offset(offset: int, edits: List[Edit]) -> int:
+    """Map an offset in the old text to the new text after ``edits``.
+
+    Offsets inside a replaced range, or at an insertion point, move to the end
+    of the replacement.
+    """
+    delta = 0
+    for start, end, replacement in edits:
+        if offset < start or (offset == start and start < end):
+            break
+        if offset < end or start == end == offset:
+            return start + delta + len(replacement)
+        delta += len(replacement) - (end - start)
+    return offset + delta
+
+
+def shift_offsets(offsets: List[int], edits: List[Edit]) -> List[int]:
+    """``shift_offset`` for sorted offsets, in one sweep over the offsets and edits together."""
+    shifted = []
+    delta = 0
+    i = 0
+    for offset in offsets:
+        while i < len(edits):
+            start, end, replacement = edits[i]
+            if offset < start or (offset == start and start < end):
+                shifted.append(offset + delta)
+                break
+            if offset < end or start == end == offset:
+                shifted.append(start + delta + len(replacement))
+                break
+            delta += len(replacement) - (end - start)
+            i += 1
+        else:
+            shifted.append(offset + delta)
+    return shifted
+
+
+def compile_search(term: str, case_sensitive: bool = True, whole_word: bool = False) -> Optional[Pattern]:
+    """Build a regex for non-literal searches, or None when ``str.find`` suffices."""
+    if case_sensitive and not whole_word:
+        return None
+    pattern = re.escape(term)
+    if whole_word:
+        pattern = r"(?<!\w)" + pattern + r"(?!\w)"
+    return re.compile(pattern, 0 if case_sensitive else re.IGNORECASE)
+
+
+class Document:
+    """A text buffer with cursor, selection, line index and edit history."""
+
+    def __init__(self, text: str = ""):
+        self.text = text
+        self.cursor = 0
+        # Extra cursors for multi-cursor editing, sorted; ``cursor`` stays the primary one
+        self.cursors: List[int] = []
+        self.selection: Optional[Tuple[int, int]] = None
+        self.line_starts = compute_line_starts(text)
+        self._search_cache: Dict[Tuple[str, bool, bool], List[Tuple[int, int]]] = {}
+        # Inverse edits of each change, with the state its listeners saved for reverting it
+        self._undo: List[Tuple[List[Edit], Dict[str, Any]]] = []
+        self._redo: List[Tuple[List[Edit], Dict[str, Any]]] = []
+        self._listeners: List[EditListener] = []
+        # Only set while listeners run, see ``add_listener``
+        self.change_state: Optional[Dict[str, Any]] = None
+        self.reverted_state: Dict[str, Any] = {}
+        self._indexes: Dict[str, Any] = {}
+        # Held only while one change (and its listeners) is applied, so readers on other
+        # threads see whole changes without waiting for a command's session lock
+        self.lock = threading.RLock()
+
+    # Change notification
+
+    def add_listener(self, listener: EditListener) -> None:
+        """Register a callback invoked once per applied batch of edits.
+
+        The callback receives the edits sorted by offset, in coordinates of the
+        text before the batch. Applying them back to front reproduces the change.
+
+        While callbacks run, ``change_state`` is a dict they can keep data in
+        (under their own key) that is handed back, as ``reverted_state``, when
+        undo or redo reverts this change; for any other change
+        ``reverted_state`` is empty.
+        """
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: EditListener) -> None:
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def index(self, name: str, factory: Callable[["Document"], Any]) -> Any:
+        """Return the named index, building it with ``factory(self)`` on first use.
+
+        Indexes keep themselves current by registering an edit listener. They
+        are built under ``lock``, so no change lands while one reads the text.
+        """
+        index = self._indexes.get(name)
+        if index is None:
+            with self.lock:
+                index = self._indexes.get(name)
+                if index is None:
+                    index = self._indexes[name] = factory(self)
+        return index
+
+    def selected_range(self) -> Optional[Tuple[int, int]]:
+        """The selection as ``(start, end)``, or None when nothing is selected."""
+        if self.selection is None or self.selection[0] == self.selection[1]:
+            return None
+        return min(self.selection), max(self.selection)
+
+    # Editing
+
+    def apply_edits(self, edits: List[Edit], record_undo: bool = True) -> List[Edit]:
+        """Apply a batch of non-overlapping edits as a single change.
+
+        Args:
+            edits: ``(start, end, replacement)`` tuples in current offsets
+            record_undo: Push the inverse of the batch onto the undo stack
+
+        Returns:
+            The inverse edits, in offsets of the new text
+        """
+        return self._apply(edits, record_undo)[0]
+
+    def _apply(self, edits: List[Edit], record_undo: bool = True,
+               reverted: Optional[Dict[str, Any]] = None) -> Tuple[List[Edit], Dict[str, Any]]:
+        """``apply_edits``, also returning the state listeners saved for reverting the change."""
+        edits = sorted(edits, key=lambda edit: (edit[0], edit[1]))
+        if not edits:
+            return [], {}
+
+        with self.lock:
+            text = self.text
+            pieces = []
+            inverse = []
+            position = 0
+            delta = 0
+            for start, end, replacement in edits:
+                if start < position or end < start or end > len(text):
+                    raise ValueError(f"Invalid or overlapping edit range {start}-{end}")
+                pieces.append(text[position:start])
+                pieces.append(replacement)
+                inverse.append((start + delta, start + delta + len(replacement), text[start:end]))
+                delta += len(replacement) - (end - start)
+                position = end
+            pieces.append(text[position:])
+
+            self.text = "".join(pieces)
+            self._update_line_starts(edits)
+            self._search_cache.clear()
+            self.cursor = shift_offset(self.cursor, edits)
+            if self.cursors:
+                self.cursors = shift_offsets(self.cursors, edits)
+            if self.selection is not None:
+                sel_start, sel_end = self.selection
+                self.selection = (shift_offset(sel_start, edits), shift_offset(sel_end, edits))
+
+            state: Dict[str, Any] = {}
+            if record_undo:
+                self._undo.append((inverse, state))
+                if len(self._undo) > MAX_UNDO_ENTRIES:
+                    del self._undo[0]
+                self._redo.clear()
+
+            self.change_state, self.reverted_state = state, reverted or {}
+            try:
+                for listener in list(self._listeners):
+                    listener(edits)
+            finally:
+                self.change_state, self.reverted_state = None, {}
+            return inverse, state
+
+    def insert(self, text: str, offset: Optional[int] = None) -> None:
+        """Insert text at ``offset`` (default: the cursor) and move the cursor after it."""
+        offset = self.cursor if offset is None else offset
+        self.apply_edits([(offset, offset, text)])
+        self.cursor = offset + len(text)
+
+    @contextmanager
+    def transaction(self):
+        """Stage edits within the block and apply them together when it exits.
+
+        Every edit is given in offsets of the text at the start of the block.
+        The staged edits become a single ``apply_edits`` batch, so offsets are
+        shifted in one sweep, indexes and listeners update once and undo
+        reverts the whole transaction. If the block raises, nothing is
+        applied.
+        """
+        transaction = Transaction(self)
+        yield transaction
+        transaction.commit()
+
+    def all_cursors(self) -> List[int]:
+        """The primary cursor and the extra cursors, sorted and without duplicates."""
+        return sorted({self.cursor, *self.cursors})
+
+    def set_cursors(self, offsets: List[int]) -> None:
+        """Put the primary cursor at the first offset and extra cursors at the rest."""
+        offsets = sorted(set(offsets))
+        if offsets and (offsets[0] < 0 or offsets[-1] > len(self.text)):
+            raise ValueError("Cursor outside the document")
+        if offsets:
+            self.cursor = offsets[0]
+        self.cursors = offsets[1:]
+
+    def insert_at_cursors(self, text: str) -> int:
+        """Insert text at every cursor as one change. Returns the number of cursors."""
+        cursors = self.all_cursors()
+        with self.transaction() as transaction:
+            for cursor in cursors:
+                transaction.insert(cursor, text)
+        return len(cursors)
+
+    def undo(self) -> bool:
+        """Revert the last change. Returns False when there is nothing to undo."""
+        if not self._undo:
+            return False
+        edits, state = self._undo.pop()
+        self._redo.append(self._apply(edits, record_undo=False, reverted=state))
+        return True
+
+    def redo(self) -> bool:
+        """Re-apply the last undone change. Returns False when there is nothing to redo."""
+        if not self._redo:
+            return False
+        edits, state = self._redo.pop()
+        self._undo.append(self._apply(edits, record_undo=False, reverted=state))
+        return True
+
+    # Search and replace
+
+    def find_all(
+        self,
+        term: str,
+        case_sensitive: bool = True,
+        whole_word: bool = False
+    ) -> List[Tuple[int, int]]:
+        """Return the ``(start, end)`` range of every non-overlapping match of ``term``.
+
+        Results are cached until the next edit.
+        """
+        if not term:
+            return []
+        key = (term, case_sensitive, whole_word)
+        matches = self._search_cache.get(key)
+        if matches is not None:
+            return matches
+
+        pattern = compile_search(term, case_sensitive, whole_word)
+        if pattern is None:
+            matches = []
+            text, size = self.text, len(term)
+            position = text.find(term)
+            while position != -1:
+                matches.append((position, position + size))
+                position = text.find(term, position + size)
+        else:
+            matches = [m.span() for m in pattern.finditer(self.text)]
+
+        if len(self._search_cache) >= MAX_CACHED_SEARCHES:
+            self._search_cache.clear()
+        self._search_cache[key] = matches
+        return matches
+
+    def replace_all(
+        self,
+        term: str,
+        replacement: str,
+        case_sensitive: bool = True,
+        whole_word: bool = False,
+        start: int = 0,
+        end: Optional[int] = None
+    ) -> int:
+        """Replace every match of ``term`` within ``[start, end)`` in one pass.
+
+        The whole operation is a single undo entry. Returns the number of replacements.
+        """
+        end = len(self.text) if end is None else end
+        matches = [
+            (match_start, match_end, replacement)
+            for match_start, match_end in self.find_all(term, case_sensitive, whole_word)
+            if match_start >= start and match_end <= end
+        ]
+        self.apply_edits(matches)
+        return len(matches)
+
+    # Positions
+
+    def line_col(self, offset: int) -> Tuple[int, int]:
+        """Return the 1-based line and column of ``offset``."""
+        line = bisect_right(self.line_starts, offset) - 1
+        return line + 1, offset - self.line_starts[line] + 1
+
+    def line_bounds(self, offset: int) -> Tuple[int, int]:
+        """Return the ``(start, end)`` of the line containing ``offset``, excluding its newline."""
+        line = bisect_right(self.line_starts, offset) - 1
+        start = self.line_starts[line]
+        end = self.line_starts[line + 1] - 1 if line + 1 < len(self.line_starts) else len(self.text)
+        return start, end
+
+    def _update_line_starts(self, edits: List[Edit]) -> None:
+        """Splice the line index for a sorted batch of edits in one sweep."""
+        old = self.line_starts
+        new = []
+        i = 0
+        delta = 0
+        for start, end, replacement in edits:
+            while i < len(old) and old[i] <= start:
+                new.append(old[i] + delta)
+                i += 1
+            # Lines starting inside the replaced range lost their newline
+            while i < len(old) and old[i] <= end:
+                i += 1
+            base = start + delta
+            position = replacement.find("\n")
+            while position != -1:
+                new.append(base + position + 1)
+                position = replacement.find("\n", position + 1)
+            delta += len(replacement) - (end - start)
+        new.extend(offset + delta for offset in old[i:])
+        self.line_starts = new
+
+
+class Transaction:
+    """Edits staged against one state of a document, applied together on commit."""
+
+    def __init__(self, document: Document):
+        self.document = document
+        self.edits: List[Edit] = []
+        self.committed = False
+
+    def __len__(self) -> int:
+        return len(self.edits)
+
+    def replace(self, start: int, end: int, text: str) -> None:
+        self.edits.append((start, end, text))
+
+    def insert(self, offset: int, text: str) -> None:
+        self.edits.append((offset, offset, text))
+
+    def delete(self, start: int, end: int) -> None:
+        self.edits.append((start, end, ""))
+
+    def commit(self) -> List[Edit]:
+        """Apply the staged edits as one batch; raises ValueError if two of them overlap."""
+        if self.committed:
+            raise ValueError("Transaction already committed")
+        self.committed = True
+        return self.document.apply_edits(self.edits)
+
+
+_active_document = Document()
+_current_document: ContextVar[Optional[Document]] = ContextVar("current_document", default=None)
+
+
+def get_document() -> Document:
+    """Return the document the editing tools operate on.
+
+    This is the document set by ``use_document`` for the current request, or
+    the shared default document.
+    """
+    document = _current_document.get()
+    return document if document is not None else _active_document
+
+
+@contextmanager
+def use_document(document: Document):
+    """Make ``document`` the one returned by ``get_document`` within the block."""
+    token = _current_document.set(document)
+    try:
+        yield document
+    finally:
+        _current_document.reset(token)
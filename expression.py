@@ -0,0 +1,212 @@
+"""Restricted arithmetic evaluator used by the calculator tool.
+
+Expressions are parsed with ``ast`` and only a whitelist of node types and
+functions is accepted. A validated expression is compiled into a tree of
+closures once and kept in an LRU cache, so repeated expressions skip parsing
+entirely. Limits on expression length, node count, exponent size, rounding
+digits and total evaluation steps keep latency predictable for hostile input
+like ``9**9**9`` or ``round(1, -10**8)``.
+"""
+import ast
+import math
+import operator
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+# Limits
+MAX_EXPRESSION_LENGTH = 500
+MAX_NODES = 200
+MAX_EXPONENT = 1000
+MAX_POWER_BITS = 4096
+MAX_ROUND_DIGITS = 1000
+MAX_STEPS = 1_000_000
+CACHE_SIZE = 256
+
+Number = Any  # int or float
+Env = Dict[str, Number]
+
+
+class ExpressionError(ValueError):
+    """Raised when an expression is not allowed or exceeds a limit."""
+
+
+CONSTANTS: Dict[str, Number] = {
+    "pi": math.pi,
+    "e": math.e,
+    "tau": math.tau,
+}
+
+def _safe_round(number: Number, ndigits: Optional[int] = None) -> Number:
+    """Round with a bound on ``ndigits`` (rounding an int to ``-n`` digits computes ``10**n``)."""
+    if ndigits is not None and isinstance(ndigits, int) and abs(ndigits) > MAX_ROUND_DIGITS:
+        raise ExpressionError(f"Rounding to {ndigits} digits exceeds the limit of {MAX_ROUND_DIGITS}")
+    return round(number, ndigits)
+
+
+FUNCTIONS: Dict[str, Callable[..., Number]] = {
+    "abs": abs,
+    "round": _safe_round,
+    "min": min,
+    "max": max,
+    "sqrt": math.sqrt,
+    "exp": math.exp,
+    "log": math.log,
+    "log10": math.log10,
+    "log2": math.log2,
+    "sin": math.sin,
+    "cos": math.cos,
+    "tan": math.tan,
+    "asin": math.asin,
+    "acos": math.acos,
+    "atan": math.atan,
+    "floor": math.floor,
+    "ceil": math.ceil,
+    "radians": math.radians,
+    "degrees": math.degrees,
+}
+
+
+def _safe_pow(base: Number, exponent: Number) -> Number:
+    """Power with bounds on the exponent and on the size of integer results."""
+    if abs(exponent) > MAX_EXPONENT:
+        raise ExpressionError(f"Exponent {exponent} exceeds the limit of {MAX_EXPONENT}")
+    if isinstance(base, int) and isinstance(exponent, int) and exponent > 0:
+        if base.bit_length() * exponent > MAX_POWER_BITS:
+            raise ExpressionError("Result of exponentiation is too large")
+    return operator.pow(base, exponent)
+
+
+BINARY_OPERATORS: Dict[type, Callable[[Number, Number], Number]] = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+    ast.Pow: _safe_pow,
+}
+
+UNARY_OPERATORS: Dict[type, Callable[[Number], Number]] = {
+    ast.UAdd: operator.pos,
+    ast.USub: operator.neg,
+}
+
+
+class CompiledExpression:
+    """A validated expression compiled to a closure tree.
+
+    Attributes:
+        source: The original expression text
+        variables: Names the expression expects to be supplied at evaluation time
+        steps: Number of operations performed by a single evaluation
+    """
+
+    def __init__(self, source: str, func: Callable[[Env], Number], variables: Tuple[str, ...], steps: int):
+        self.source = source
+        self.variables = variables
+        self.steps = steps
+        self._func = func
+
+    def evaluate(self, values: Optional[Env] = None) -> Number:
+        """Evaluate the expression once with the given variable values."""
+        return self._func(self._check_env(values))
+
+    def evaluate_many(self, inputs: Iterable[Env]) -> List[Number]:
+        """Evaluate the expression for every set of variable values in ``inputs``.
+
+        The step budget covers the whole batch and is checked before any work is done.
+        """
+        inputs = list(inputs)
+        if self.steps * len(inputs) > MAX_STEPS:
+            raise ExpressionError(f"Evaluation would exceed the limit of {MAX_STEPS} steps")
+        func = self._func
+        return [func(self._check_env(values)) for values in inputs]
+
+    def _check_env(self, values: Optional[Env]) -> Env:
+        values = values or {}
+        missing = [name for name in self.variables if name not in values]
+        if missing:
+            raise ExpressionError(f"Missing value for: {', '.join(missing)}")
+        return values
+
+
+class _Compiler:
+    """Walks a parsed expression, rejecting anything outside the whitelist."""
+
+    def __init__(self):
+        self.nodes = 0
+        self.variables: List[str] = []
+
+    def compile(self, node: ast.AST) -> Callable[[Env], Number]:
+        self.nodes += 1
+        if self.nodes > MAX_NODES:
+            raise ExpressionError(f"Expression is too complex (more than {MAX_NODES} elements)")
+
+        if isinstance(node, ast.Constant):
+            value = node.value
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                raise ExpressionError(f"Unsupported constant: {value!r}")
+            return lambda env: value
+
+        if isinstance(node, ast.Name):
+            name = node.id
+            if name in CONSTANTS:
+                value = CONSTANTS[name]
+                return lambda env: value
+            if name in FUNCTIONS:
+                raise ExpressionError(f"Function '{name}' must be called")
+            if name not in self.variables:
+                self.variables.append(name)
+            return lambda env: env[name]
+
+        if isinstance(node, ast.BinOp):
+            op = BINARY_OPERATORS.get(type(node.op))
+            if op is None:
+                raise ExpressionError(f"Unsupported operator: {type(node.op).__name__}")
+            left = self.compile(node.left)
+            right = self.compile(node.right)
+            return lambda env: op(left(env), right(env))
+
+        if isinstance(node, ast.UnaryOp):
+            op = UNARY_OPERATORS.get(type(node.op))
+            if op is None:
+                raise ExpressionError(f"Unsupported operator: {type(node.op).__name__}")
+            operand = self.compile(node.operand)
+            return lambda env: op(operand(env))
+
+        if isinstance(node, ast.Call):
+            if not isinstance(node.func, ast.Name) or node.func.id not in FUNCTIONS:
+                raise ExpressionError("Only built-in math functions can be called")
+            if node.keywords:
+                raise ExpressionError("Keyword arguments are not supported")
+            func = FUNCTIONS[node.func.id]
+            args = [self.compile(arg) for arg in node.args]
+            return lambda env: func(*(arg(env) for arg in args))
+
+        raise ExpressionError(f"Unsupported syntax: {type(node).__name__}")
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def compile_expression(expression: str) -> CompiledExpression:
+    """Parse, validate and compile an expression. Results are LRU-cached."""
+    source = expression.strip()
+    if len(source) > MAX_EXPRESSION_LENGTH:
+        raise ExpressionError(f"Expression is longer than {MAX_EXPRESSION_LENGTH} characters")
+    try:
+        tree = ast.parse(source, mode="eval")
+    except SyntaxError as e:
+        raise ExpressionError(f"Invalid expression: {e.msg}") from None
+
+    compiler = _Compiler()
+    func = compiler.compile(tree.body)
+    return CompiledExpression(source, func, tuple(compiler.variables), compiler.nodes)
+
+
+def evaluate(expression: str, values: Optional[Env] = None) -> Number:
+    """Safely evaluate an arithmetic expression."""
+    return compile_expression(expression).evaluate(values)
+
+
+def evaluate_many(expression: str, inputs: Iterable[Env]) -> List[Number]:
+    """Safely evaluate one expression over a list of variable assignments."""
+    return compile_expression(expression).evaluate_many(inputs)
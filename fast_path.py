@@ -0,0 +1,216 @@
+"""Local, rule-based interpretation of common commands.
+
+``interpret`` maps phrasings like "undo", "read the next 3 lines" or "replace
+teh with the everywhere" straight to tool calls, with a confidence score. The
+API races this against the LLM agent and commits the local plan when it is
+confident enough (see ``speculation.py``).
+
+Confidence starts from how specific the matched pattern is and is lowered by
+cheap, read-only checks against the document (for example, nothing to copy
+because nothing is selected), so doubtful cases are left to the agent.
+"""
+import os
+import re
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from document import Document
+
+# Commit a local interpretation at or above this confidence
+CONFIDENCE_THRESHOLD = float(os.environ.get("FAST_PATH_THRESHOLD", "0.8"))
+
+NUMBER_WORDS = {"one": 1, "two": 2, "three": 3, "four": 4, "five": 5,
+                "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10}
+ARITHMETIC_WORDS = [(" times ", "*"), (" multiplied by ", "*"), (" divided by ", "/"),
+                    (" plus ", "+"), (" minus ", "-"), (" to the power of ", "**")]
+POLITE_PREFIX = re.compile(r"^(please |can you |could you |would you |now |and )+")
+
+ToolCall = Dict[str, Any]
+
+
+class Interpretation:
+    """Tool calls for a command and how sure the fast path is about them."""
+
+    __slots__ = ("tool_calls", "confidence")
+
+    def __init__(self, tool_calls: List[ToolCall], confidence: float):
+        self.tool_calls = tool_calls
+        self.confidence = confidence
+
+    def __repr__(self):
+        return f"Interpretation({self.tool_calls!r}, confidence={self.confidence})"
+
+
+def _count(word: Optional[str]) -> int:
+    if not word:
+        return 1
+    return int(word) if word.isdigit() else NUMBER_WORDS.get(word, 1)
+
+
+def _call(name: str, **args) -> ToolCall:
+    return {"name": name, "args": {key: value for key, value in args.items() if value is not None}}
+
+
+def _history(m, document):
+    return [_call("history_action", action=m["action"])], 0.95
+
+
+def _clipboard(m, document):
+    confidence = 0.95
+    if m["action"] in ["copy", "cut"] and document is not None and document.selected_range() is None:
+        confidence = 0.4
+    return [_call("clipboard_action", action=m["action"])], confidence
+
+
+def _read(m, document):
+    direction = m["direction"] or "current"
+    return [_call("read_text", unit=m["unit"], direction=direction, count=_count(m["count"]))], 0.9
+
+
+def _move(m, document):
+    unit = m["unit"].replace(" ", "_")
+    return [_call("move_cursor", destination_type=unit, direction=m["direction"], count=_count(m["count"]))], 0.9
+
+
+def _go_to_line(m, document):
+    return [_call("move_cursor", destination_type="line", direction="absolute", value=int(m["line"]))], 0.95
+
+
+def _document_boundary(m, document):
+    return [_call("move_cursor", destination_type="document_boundary", direction=m["edge"])], 0.9
+
+
+def _select_all(m, document):
+    return [_call("modify_selection", action="select", unit="all")], 0.95
+
+
+def _batch_delete_words(m, document):
+    # Without "in the selection" the command means every line of the document
+    scope = "selection" if m["selection"] else "document"
+    confidence = 0.9
+    if m["selection"] and document is not None and document.selected_range() is None:
+        confidence = 0.4
+    return [_call("batch_edit", action="delete", target=f"{m['which']}_word", scope=scope)], confidence
+
+
+def _batch_line_edge(m, document):
+    scope = "selection" if m["selection"] else "document"
+    target = "line_end" if m["edge"] == "end" else "line_start"
+    confidence = 0.85
+    if m["selection"] and document is not None and document.selected_range() is None:
+        confidence = 0.4
+    return [_call("batch_edit", action="insert", target=target, text=m["text"], scope=scope)], confidence
+
+
+def _format(m, document):
+    format_type = {"underlined": "underline"}.get(m["format"], m["format"])
+    return [_call("apply_formatting", format_type=format_type, action="apply")], 0.85
+
+
+def _heading(m, document):
+    return [_call("apply_formatting", format_type="heading", action="apply", value=int(m["level"]))], 0.9
+
+
+def _replace(m, document):
+    everywhere = m["scope"] is not None
+    confidence = 0.9 if everywhere else 0.75
+    if document is not None and not document.find_all(m["old"], case_sensitive=False):
+        # Probably a misheard word; let the agent work out what was meant
+        confidence = 0.3
+    return [_call("edit_text", action="replace", text_to_replace=m["old"], replacement_text=m["new"],
+                  scope="all" if everywhere else "next")], confidence
+
+
+def _find(m, document):
+    return [_call("find_text", search_direction="new", text_to_find=m["text"])], 0.85
+
+
+def _find_again(m, document):
+    return [_call("find_text", search_direction=m["direction"])], 0.9
+
+
+def _save(m, document):
+    return [_call("manage_file", action="save")], 0.95
+
+
+def _time(m, document):
+    return [_call("get_current_time")], 0.95
+
+
+def _calculate(m, document):
+    expression = f" {m['expression']} "
+    for words, operator in ARITHMETIC_WORDS:
+        expression = expression.replace(words, f" {operator} ")
+    expression = expression.strip()
+    if not re.fullmatch(r"[\d\s.+\-*/()]+", expression):
+        return [], 0.0
+    return [_call("calculator", expression=expression)], 0.9
+
+
+def _tts_speed(m, document):
+    return [_call("control_tts", action="set_speed", value=float(m["speed"]))], 0.9
+
+
+RULES: List[Tuple[str, Callable[[Dict[str, Optional[str]], Optional[Document]], Tuple[List[ToolCall], float]]]] = [
+    (r"(?P<action>undo|redo)( that| it| the last (edit|change))?", _history),
+    (r"(?P<action>copy|cut|paste)( that| it| this| the selection| the selected text)?", _clipboard),
+    (r"read( the)? (?P<direction>current|next|previous)?\s*(?P<count>\d+|one|two|three|four|five|six|seven|eight|nine|ten)?\s*"
+     r"(?P<unit>character|word|line|sentence|paragraph)s?", _read),
+    (r"read( the)? (?P<unit>selection|document)", _read),
+    (r"(move|go|jump)( to)?( the)? (?P<direction>next|previous)\s*(?P<count>\d+)?\s*"
+     r"(?P<unit>heading|paragraph|line|word|sentence|link|table|list item)s?", _move),
+    (r"(go|move|jump) to line (?P<line>\d+)", _go_to_line),
+    (r"(go|move|jump) to the (?P<edge>start|end) of the document", _document_boundary),
+    (r"select (all|everything|the (whole|entire) document)", _select_all),
+    (r"(delete|remove) the (?P<which>first|last) word (of|on|from|in) (every|each) line"
+     r"(?P<selection> (in|of) (the|this) selection)?", _batch_delete_words),
+    (r"(add|insert|put) ['\"]?(?P<text>.+?)['\"]? (at|to) the (?P<edge>start|beginning|end) of (every|each) line"
+     r"(?P<selection> (in|of) (the|this) selection)?", _batch_line_edge),
+    (r"(make|set) (it|this|that|the selection|the selected text) (?P<format>bold|italic|underlined)", _format),
+    (r"(?P<format>bold|italic|underline)( the selection| the selected text| it| this)?", _format),
+    (r"(apply |make (it|this line) (a )?)?heading (level )?(?P<level>[1-6])( to this line)?", _heading),
+    (r"replace (?P<old>.+?) with (?P<new>.+?)(?P<scope> everywhere| throughout| in the (whole |entire )?document)?", _replace),
+    # "find next" must win over "find <text>"
+    (r"find (the )?(?P<direction>next|previous)( one| occurrence| match)?", _find_again),
+    (r"find (the (word|text|phrase) )?['\"]?(?P<text>[^'\"]+?)['\"]?( in the document)?", _find),
+    (r"save( the)?( current)?( document| file)?", _save),
+    (r"(what time is it|what's the (current )?time|what is the (current )?time)", _time),
+    (r"(what is|what's|calculate|compute) (?P<expression>[\d\s.+\-*/()a-z]+)", _calculate),
+    (r"(set|change|increase|decrease) the (text-to-speech|tts|speech|reading) speed to (?P<speed>\d+(\.\d+)?)", _tts_speed),
+]
+COMPILED_RULES = [(re.compile(pattern), handler) for pattern, handler in RULES]
+
+
+# Groups holding document text keep the user's capitalization
+CASED_GROUPS = {"old", "new", "text"}
+
+
+def normalize(command: str) -> Tuple[str, str]:
+    """Return the command lower-cased for matching, and with its case kept."""
+    cased = re.sub(r"\s+", " ", command.strip()).rstrip(".!?")
+    lowered = cased.lower()
+    if len(lowered) != len(cased):
+        cased = lowered
+    prefix = POLITE_PREFIX.match(lowered)
+    if prefix:
+        lowered, cased = lowered[prefix.end():], cased[prefix.end():]
+    return lowered, cased
+
+
+def interpret(command: str, document: Optional[Document] = None) -> Optional[Interpretation]:
+    """Return the local interpretation of a command, or None if no rule matches.
+
+    Only whole-command matches count, so "find the word 'x' and make it bold"
+    is left to the agent.
+    """
+    text, cased = normalize(command)
+    for pattern, handler in COMPILED_RULES:
+        match = pattern.fullmatch(text)
+        if match:
+            groups = {
+                name: cased[match.start(name):match.end(name)] if name in CASED_GROUPS and value is not None else value
+                for name, value in match.groupdict().items()
+            }
+            tool_calls, confidence = handler(groups, document)
+            if tool_calls:
+                return Interpretation(tool_calls, confidence)
+    return None
@@ -0,0 +1,340 @@
+"""Formatting spans for the active document.
+
+Formatting is stored as a sequence of runs, each covering a stretch of
+characters that share one set of formats. The runs live in a treap ordered by
+position, where every node also knows the total length of its subtree, so:
+
+- "what formatting is here" is a walk from the root (O(log n))
+- inserts and deletes only resize or cut the runs they touch (O(log n)),
+  and everything after the edit shifts implicitly
+- applying, removing or toggling a format over a range splits at most two
+  runs and rewrites the runs inside the range (O(log n + k))
+
+Adjacent runs with equal formats are merged so heavily edited documents do not
+fragment the tree.
+
+Inserted text takes the formats of the character before it (or of the
+character after it, at the start of the document). Edits do not report this
+as a formatting change, so anything mirroring the runs from the edit stream
+(see ``sync.py``) has to apply the same rule.
+
+The runs an edit removes are kept with its undo entry (through the
+document's ``change_state``), so text brought back by undo or redo gets its
+own formats again rather than its neighbour's. Those restored formats are
+reported as ``clear`` and ``apply`` changes while the document's listeners
+run. Formatting changes themselves are not part of the undo history.
+"""
+import random
+import threading
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, Tuple
+
+from document import Document, Edit
+
+# A format is a (name, value) pair, e.g. ("bold", None) or ("heading", "2")
+Format = Tuple[str, Optional[str]]
+Formats = FrozenSet[Format]
+
+NO_FORMATS: Formats = frozenset()
+
+# (action, start, end, name, value) for every formatting change; action is apply, remove or clear
+FormatChange = Tuple[str, int, int, Optional[str], Optional[str]]
+FormatListener = Callable[[FormatChange], None]
+
+
+class _Run:
+    __slots__ = ("length", "formats", "priority", "left", "right", "total")
+
+    def __init__(self, length: int, formats: Formats):
+        self.length = length
+        self.formats = formats
+        self.priority = random.random()
+        self.left: Optional["_Run"] = None
+        self.right: Optional["_Run"] = None
+        self.total = length
+
+
+def _total(node: Optional[_Run]) -> int:
+    return node.total if node is not None else 0
+
+
+def _update(node: _Run) -> _Run:
+    node.total = _total(node.left) + node.length + _total(node.right)
+    return node
+
+
+def _merge(left: Optional[_Run], right: Optional[_Run]) -> Optional[_Run]:
+    if left is None:
+        return right
+    if right is None:
+        return left
+    if left.priority > right.priority:
+        left.right = _merge(left.right, right)
+        return _update(left)
+    right.left = _merge(left, right.left)
+    return _update(right)
+
+
+def _split(node: Optional[_Run], offset: int) -> Tuple[Optional[_Run], Optional[_Run]]:
+    """Split so the left tree covers exactly ``offset`` characters."""
+    if node is None:
+        return None, None
+    left_total = _total(node.left)
+    if offset <= left_total:
+        left, node.left = _split(node.left, offset)
+        return left, _update(node)
+    if offset >= left_total + node.length:
+        node.right, right = _split(node.right, offset - left_total - node.length)
+        return _update(node), right
+    # The split point falls inside this run: cut it in two
+    inside = offset - left_total
+    tail = _Run(node.length - inside, node.formats)
+    # The tail takes over the node's right subtree, so it needs the node's priority to keep heap order
+    tail.priority = node.priority
+    tail.right = node.right
+    node.length = inside
+    node.right = None
+    return _update(node), _update(tail)
+
+
+def _first(node: Optional[_Run]) -> Optional[_Run]:
+    while node is not None and node.left is not None:
+        node = node.left
+    return node
+
+
+def _last(node: Optional[_Run]) -> Optional[_Run]:
+    while node is not None and node.right is not None:
+        node = node.right
+    return node
+
+
+def _extend_last(node: _Run, amount: int) -> None:
+    node.total += amount
+    if node.right is not None:
+        _extend_last(node.right, amount)
+    else:
+        node.length += amount
+
+
+def _drop_first(node: _Run) -> Optional[_Run]:
+    if node.left is None:
+        return node.right
+    node.left = _drop_first(node.left)
+    return _update(node)
+
+
+def _join(left: Optional[_Run], right: Optional[_Run]) -> Optional[_Run]:
+    """Merge two trees, coalescing the runs on either side of the seam."""
+    if left is not None and right is not None:
+        tail, head = _last(left), _first(right)
+        if tail.formats == head.formats:
+            _extend_last(left, head.length)
+            right = _drop_first(right)
+    return _merge(left, right)
+
+
+def _runs(node: Optional[_Run], out: List[_Run]) -> List[_Run]:
+    """In-order list of runs. Iterative to stay clear of the recursion limit."""
+    stack = []
+    while stack or node is not None:
+        while node is not None:
+            stack.append(node)
+            node = node.left
+        node = stack.pop()
+        out.append(node)
+        node = node.right
+    return out
+
+
+class FormattingIndex:
+    """Formatting runs for one document, kept in step with its edits."""
+
+    def __init__(self, length: int = 0, lock: Optional[Any] = None):
+        self._root: Optional[_Run] = _Run(length, NO_FORMATS) if length else None
+        self._listeners: List[FormatListener] = []
+        # The document's lock, so formatting changes are as atomic to readers as text edits
+        self.lock = lock or threading.RLock()
+
+    @classmethod
+    def for_document(cls, document: Document) -> "FormattingIndex":
+        index = cls(len(document.text), document.lock)
+        document.add_listener(lambda edits: index.on_edits(edits, document.change_state, document.reverted_state))
+        return index
+
+    def __len__(self) -> int:
+        return _total(self._root)
+
+    def add_listener(self, listener: FormatListener) -> None:
+        """Register a callback invoked with every formatting change (not with edit shifts)."""
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: FormatListener) -> None:
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def _notify(self, change: FormatChange) -> None:
+        if change[2] <= change[1]:
+            return
+        for listener in list(self._listeners):
+            listener(change)
+
+    # Edit tracking
+
+    def on_edits(self, edits: List[Edit], saved: Optional[Dict[str, Any]] = None,
+                 reverted: Optional[Dict[str, Any]] = None) -> None:
+        """Shift runs for a batch of edits. Inserted text takes the formats before it.
+
+        The runs each edit removes are stored in ``saved``; when the batch reverts
+        a change, the runs that change stored in ``reverted`` are put back instead.
+        """
+        restored = (reverted or {}).get("formatting")
+        if restored is not None and len(restored) != len(edits):
+            restored = None
+        removed: List[List[Tuple[int, Formats]]] = []
+        for i in range(len(edits) - 1, -1, -1):
+            start, end, replacement = edits[i]
+            left, rest = _split(self._root, start)
+            middle, right = _split(rest, end - start)
+            removed.append([(run.length, run.formats) for run in _runs(middle, [])])
+            runs = restored[i] if restored is not None else None
+            if runs and sum(length for length, _ in runs) == len(replacement):
+                for length, formats in runs:
+                    left = _join(left, _Run(length, formats))
+            elif replacement:
+                neighbour = _last(left) or _first(right)
+                formats = neighbour.formats if neighbour is not None else NO_FORMATS
+                left = _join(left, _Run(len(replacement), formats))
+            self._root = _join(left, right)
+        if saved is not None:
+            saved["formatting"] = removed[::-1]
+        if restored is not None and self._listeners:
+            self._notify_restored(edits, restored)
+
+    def _notify_restored(self, edits: List[Edit], restored: List[List[Tuple[int, Formats]]]) -> None:
+        """Report restored runs as format changes, in offsets of the new text."""
+        delta = 0
+        for (start, end, replacement), runs in zip(edits, restored):
+            position = start + delta
+            delta += len(replacement) - (end - start)
+            if not runs or sum(length for length, _ in runs) != len(replacement):
+                continue
+            self._notify(("clear", position, position + len(replacement), None, None))
+            for length, formats in runs:
+                for name, value in sorted(formats, key=lambda fmt: (fmt[0], fmt[1] or "")):
+                    self._notify(("apply", position, position + length, name, value))
+                position += length
+
+    # Queries
+
+    def formats_at(self, offset: int) -> Formats:
+        """Formats of the character at ``offset`` (or the last character at the end)."""
+        node = self._root
+        if node is None:
+            return NO_FORMATS
+        offset = max(0, min(offset, node.total - 1))
+        while node is not None:
+            left_total = _total(node.left)
+            if offset < left_total:
+                node = node.left
+            elif offset < left_total + node.length:
+                return node.formats
+            else:
+                offset -= left_total + node.length
+                node = node.right
+        return NO_FORMATS
+
+    def formats_in(self, start: int, end: int) -> Formats:
+        """Formats shared by every character in ``[start, end)``."""
+        if end <= start:
+            return self.formats_at(start)
+        shared = None
+        for _, _, formats in self.spans(start, end):
+            shared = formats if shared is None else shared & formats
+            if not shared:
+                break
+        return shared or NO_FORMATS
+
+    def spans(self, start: int = 0, end: Optional[int] = None) -> List[Tuple[int, int, Formats]]:
+        """``(start, end, formats)`` for every run overlapping ``[start, end)``, clipped to it."""
+        end = len(self) if end is None else end
+        result = []
+        self._collect(self._root, 0, start, end, result)
+        return result
+
+    def _collect(self, node, base, start, end, result) -> None:
+        while node is not None:
+            left_total = _total(node.left)
+            node_start = base + left_total
+            node_end = node_start + node.length
+            if start < node_start:
+                self._collect(node.left, base, start, end, result)
+            if node_start < end and node_end > start:
+                result.append((max(node_start, start), min(node_end, end), node.formats))
+            if end <= node_end:
+                return
+            base = node_end
+            node = node.right
+
+    # Updates
+
+    def apply(self, start: int, end: int, name: str, value: Optional[str] = None) -> None:
+        """Apply a format to ``[start, end)``, replacing any other value of the same format."""
+        with self.lock:
+            self._rewrite(start, end, lambda formats: _without(formats, name) | {(name, value)})
+            self._notify(("apply", start, end, name, value))
+
+    def remove(self, start: int, end: int, name: str) -> None:
+        """Remove a format (every value of it) from ``[start, end)``."""
+        with self.lock:
+            self._rewrite(start, end, lambda formats: _without(formats, name))
+            self._notify(("remove", start, end, name, None))
+
+    def clear(self, start: int, end: int) -> None:
+        """Remove all formatting from ``[start, end)``."""
+        with self.lock:
+            self._rewrite(start, end, lambda formats: NO_FORMATS)
+            self._notify(("clear", start, end, None, None))
+
+    def toggle(self, start: int, end: int, name: str, value: Optional[str] = None) -> bool:
+        """Remove the format if the whole range has it, otherwise apply it.
+
+        Returns True when the format ends up applied.
+        """
+        with self.lock:
+            if (name, value) in self.formats_in(start, end):
+                self.remove(start, end, name)
+                return False
+            self.apply(start, end, name, value)
+            return True
+
+    def _rewrite(self, start: int, end: int, change) -> None:
+        if end <= start:
+            return
+        left, rest = _split(self._root, start)
+        middle, right = _split(rest, end - start)
+        rewritten = None
+        for run in _runs(middle, []):
+            rewritten = _join(rewritten, _Run(run.length, frozenset(change(run.formats))))
+        self._root = _join(_join(left, rewritten), right)
+
+
+def _without(formats: Formats, name: str) -> Formats:
+    return frozenset(fmt for fmt in formats if fmt[0] != name)
+
+
+def get_formatting(document: Document) -> FormattingIndex:
+    """Return the formatting index of ``document``, creating it on first use."""
+    return document.index("formatting", FormattingIndex.for_document)
+
+
+def describe_formats(formats: Formats) -> str:
+    """Human-readable list of formats, e.g. 'bold, heading level 2'."""
+    names = []
+    for name, value in sorted(formats, key=lambda fmt: (fmt[0], fmt[1] or "")):
+        if value is None:
+            names.append(name)
+        elif name == "heading":
+            names.append(f"heading level {value}")
+        else:
+            names.append(f"{name} {value}")
+    return ", ".join(names)
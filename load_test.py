@@ -0,0 +1,284 @@
+"""Concurrency load test for the command API.
+
+Sends a mix of ``POST /api/command`` and ``GET /api/tools`` requests from many
+concurrent clients and reports throughput, latency percentiles, error rates
+and client-side queueing delay.
+
+Requests arrive as a Poisson process at ``--rate`` requests per second (an
+open loop, so a slow server builds up a queue instead of slowing the load
+down). Queueing delay is the time a request waited for a free client after
+its scheduled arrival. With ``--rate 0`` every client sends back to back
+instead (a closed loop).
+
+By default the harness starts ``api.py`` in-process on a free port, with the
+OpenAI model replaced by ``StubChatModel``, so no API key or network access is
+needed. Use ``--url`` to target a running server instead.
+
+Usage:
+    python load_test.py --corpus load_test_corpus.txt --rate 20 --duration 30 --clients 32
+"""
+import argparse
+import json
+import logging
+import math
+import os
+import queue
+import random
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import requests
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "load_test_corpus.txt")
+PERCENTILES = [50, 90, 95, 99]
+
+
+def load_corpus(path: str) -> List[Tuple[str, float]]:
+    """Read ``(command, weight)`` pairs from a corpus file.
+
+    Each non-empty line is either a plain command (weight 1), ``weight<TAB>command``,
+    or a JSON object with ``command`` and an optional ``weight``. Lines starting
+    with ``#`` are comments.
+    """
+    corpus = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if line.startswith("{"):
+                entry = json.loads(line)
+                corpus.append((entry["command"], float(entry.get("weight", 1))))
+            elif "\t" in line:
+                weight, command = line.split("\t", 1)
+                corpus.append((command.strip(), float(weight)))
+            else:
+                corpus.append((line, 1.0))
+    if not corpus:
+        raise ValueError(f"No commands found in {path}")
+    return corpus
+
+
+def start_stub_server(latency: float = 0.0) -> str:
+    """Serve ``api.app`` on a free local port with the LLM stubbed out. Returns the base URL."""
+    from werkzeug.serving import make_server
+
+    # ChatOpenAI is constructed at import time and only needs *a* key
+    os.environ.setdefault("OPENAI_API_KEY", "stub")
+    import api
+    from stub_llm import StubChatModel
+
+    api.agent = api.initialize_agent(StubChatModel(latency=latency))
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    server = make_server("127.0.0.1", 0, api.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}/api"
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of ``values`` (0 for an empty list)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, math.ceil(pct / 100.0 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+class LoadTest:
+    """Drives the API with concurrent clients and collects per-request samples."""
+
+    def __init__(
+        self,
+        base_url: str,
+        corpus: List[Tuple[str, float]],
+        rate: float = 10.0,
+        duration: float = 30.0,
+        clients: int = 16,
+        tools_ratio: float = 0.1,
+        timeout: float = 60.0,
+        seed: Optional[int] = None
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.commands = [command for command, _ in corpus]
+        self.weights = [weight for _, weight in corpus]
+        self.rate = rate
+        self.duration = duration
+        self.clients = clients
+        self.tools_ratio = tools_ratio
+        self.timeout = timeout
+        self.random = random.Random(seed)
+        self.samples: List[Dict[str, Any]] = []
+        self._samples_lock = threading.Lock()
+        self._jobs: "queue.Queue[Optional[Tuple[float, str, Optional[str]]]]" = queue.Queue()
+
+    def _next_job(self) -> Tuple[str, Optional[str]]:
+        if self.random.random() < self.tools_ratio:
+            return "/tools", None
+        return "/command", self.random.choices(self.commands, self.weights)[0]
+
+    def _send(self, session: requests.Session, endpoint: str, command: Optional[str], scheduled: float) -> None:
+        started = time.perf_counter()
+        error = None
+        try:
+            if endpoint == "/command":
+                response = session.post(self.base_url + endpoint, json={"command": command}, timeout=self.timeout)
+            else:
+                response = session.get(self.base_url + endpoint, timeout=self.timeout)
+            status = response.status_code
+            if status != 200:
+                error = f"HTTP {status}"
+        except requests.RequestException as e:
+            status = None
+            error = type(e).__name__
+        finished = time.perf_counter()
+        sample = {
+            "endpoint": endpoint,
+            "status": status,
+            "error": error,
+            "latency": finished - started,
+            "queue_delay": max(0.0, started - scheduled),
+            "finished": finished,
+        }
+        with self._samples_lock:
+            self.samples.append(sample)
+
+    def _open_loop_client(self) -> None:
+        session = requests.Session()
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                return
+            scheduled, endpoint, command = job
+            self._send(session, endpoint, command, scheduled)
+
+    def _closed_loop_client(self, deadline: float) -> None:
+        session = requests.Session()
+        while time.perf_counter() < deadline:
+            endpoint, command = self._next_job()
+            self._send(session, endpoint, command, time.perf_counter())
+
+    def run(self) -> Dict[str, Any]:
+        """Run the load test and return the summary from ``summarize``."""
+        started = time.perf_counter()
+        deadline = started + self.duration
+        if self.rate > 0:
+            workers = [threading.Thread(target=self._open_loop_client, daemon=True) for _ in range(self.clients)]
+        else:
+            workers = [threading.Thread(target=self._closed_loop_client, args=(deadline,), daemon=True)
+                       for _ in range(self.clients)]
+        for worker in workers:
+            worker.start()
+
+        if self.rate > 0:
+            arrival = started
+            while True:
+                arrival += self.random.expovariate(self.rate)
+                if arrival >= deadline:
+                    break
+                delay = arrival - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                self._jobs.put((arrival, *self._next_job()))
+            for _ in workers:
+                self._jobs.put(None)
+
+        for worker in workers:
+            worker.join()
+        return self.summarize(time.perf_counter() - started)
+
+    def summarize(self, elapsed: float) -> Dict[str, Any]:
+        """Aggregate samples into throughput, error rate and latency/queueing percentiles (ms)."""
+        def stats(values: List[float]) -> Dict[str, float]:
+            result = {f"p{p}": percentile(values, p) * 1000 for p in PERCENTILES}
+            result["max"] = max(values) * 1000 if values else 0.0
+            result["mean"] = sum(values) / len(values) * 1000 if values else 0.0
+            return result
+
+        endpoints = {}
+        for endpoint in sorted({sample["endpoint"] for sample in self.samples}):
+            samples = [sample for sample in self.samples if sample["endpoint"] == endpoint]
+            errors = [sample for sample in samples if sample["error"]]
+            error_kinds: Dict[str, int] = {}
+            for sample in errors:
+                error_kinds[sample["error"]] = error_kinds.get(sample["error"], 0) + 1
+            endpoints["/api" + endpoint] = {
+                "requests": len(samples),
+                "errors": len(errors),
+                "error_rate": len(errors) / len(samples),
+                "error_kinds": error_kinds,
+                "latency_ms": stats([sample["latency"] for sample in samples if not sample["error"]]),
+            }
+
+        total = len(self.samples)
+        ok = sum(1 for sample in self.samples if not sample["error"])
+        return {
+            "duration_s": elapsed,
+            "requests": total,
+            "ok": ok,
+            "errors": total - ok,
+            "error_rate": (total - ok) / total if total else 0.0,
+            "throughput_rps": ok / elapsed if elapsed else 0.0,
+            "offered_rate_rps": self.rate,
+            "clients": self.clients,
+            "endpoints": endpoints,
+            "queue_delay_ms": stats([sample["queue_delay"] for sample in self.samples]),
+        }
+
+
+def format_report(summary: Dict[str, Any]) -> str:
+    """Render a summary as a plain-text table."""
+    columns = [f"p{p}" for p in PERCENTILES] + ["max"]
+    lines = [
+        f"Requests: {summary['requests']} sent, {summary['ok']} ok, "
+        f"{summary['errors']} errors ({summary['error_rate']:.2%})",
+        f"Throughput: {summary['throughput_rps']:.1f} req/s over {summary['duration_s']:.1f} s "
+        f"(offered {summary['offered_rate_rps'] or 'closed loop'}, {summary['clients']} clients)",
+        "",
+        f"{'Latency (ms)':<16}{'count':>8}{'err%':>8}" + "".join(f"{c:>9}" for c in columns),
+    ]
+    for endpoint, data in summary["endpoints"].items():
+        latency = data["latency_ms"]
+        lines.append(
+            f"{endpoint:<16}{data['requests']:>8}{data['error_rate'] * 100:>8.1f}"
+            + "".join(f"{latency[c]:>9.1f}" for c in columns)
+        )
+        for kind, count in sorted(data["error_kinds"].items()):
+            lines.append(f"{'':<16}  {count} x {kind}")
+    queue_delay = summary["queue_delay_ms"]
+    lines.append(f"{'Queueing delay':<32}" + "".join(f"{queue_delay[c]:>9.1f}" for c in columns))
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the text editor command API")
+    parser.add_argument("--url", help="Base API URL, e.g. http://127.0.0.1:5000/api (default: in-process stub server)")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS, help="Command corpus file")
+    parser.add_argument("--rate", type=float, default=10.0, help="Arrival rate in requests/s (0 = closed loop)")
+    parser.add_argument("--duration", type=float, default=30.0, help="Test duration in seconds")
+    parser.add_argument("--clients", type=int, default=16, help="Number of concurrent clients")
+    parser.add_argument("--tools-ratio", type=float, default=0.1, help="Fraction of requests sent to /api/tools")
+    parser.add_argument("--stub-latency", type=float, default=0.05,
+                        help="Simulated LLM latency per model call for the stub server (seconds)")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Per-request timeout in seconds")
+    parser.add_argument("--seed", type=int, help="Random seed for a reproducible request sequence")
+    parser.add_argument("--json", action="store_true", help="Print the summary as JSON")
+    args = parser.parse_args()
+
+    base_url = args.url or start_stub_server(args.stub_latency)
+    test = LoadTest(
+        base_url,
+        load_corpus(args.corpus),
+        rate=args.rate,
+        duration=args.duration,
+        clients=args.clients,
+        tools_ratio=args.tools_ratio,
+        timeout=args.timeout,
+        seed=args.seed,
+    )
+    summary = test.run()
+    print(json.dumps(summary, indent=2) if args.json else format_report(summary))
+
+
+if __name__ == "__main__":
+    main()
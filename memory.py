@@ -0,0 +1,141 @@
+"""Per-session conversation memory with a bounded prompt size.
+
+The last few turns are kept verbatim. Turns that fall out of that window are
+folded into a compact summary (how many commands came before, the last few of
+them, the most recent tool calls) that is updated in constant time per turn
+and built locally, without extra LLM calls. When a prompt is assembled the
+summary, the current document state and as many recent turns as fit are
+packed into a hard token budget, so prompt size, and with it latency, stays
+flat however long the session runs.
+"""
+import re
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+
+from document import Document
+
+MAX_VERBATIM_TURNS = 6
+TOKEN_BUDGET = 1200
+MAX_SUMMARY_COMMANDS = 5
+MAX_SUMMARY_TOOL_CALLS = 5
+MAX_RESPONSE_CHARS = 400
+MAX_ARGUMENT_CHARS = 60
+SUMMARY_HEADER = "Session context (for resolving references like 'that' or 'again'):\n"
+
+# Words that make a command depend on earlier turns ("do that again", "undo it")
+CONTEXT_REFERENCES = re.compile(r"\b(that|again|it|this|those|them|same|last|previous one|just)\b", re.IGNORECASE)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token for English)."""
+    return len(text) // 4 + 1
+
+
+def references_context(command: str) -> bool:
+    """Whether a command likely refers back to earlier turns."""
+    return CONTEXT_REFERENCES.search(command) is not None
+
+
+def format_tool_call(tool_call: Dict[str, Any]) -> str:
+    """``name(key=value, ...)`` with long argument values shortened."""
+    args = ", ".join(f"{key}={_truncate(repr(value), MAX_ARGUMENT_CHARS)}"
+                     for key, value in tool_call.get("args", {}).items())
+    return f"{tool_call['name']}({args})"
+
+
+def _truncate(text: str, limit: int) -> str:
+    if len(text) <= limit:
+        return text
+    # Too short for an ellipsis
+    if limit < 4:
+        return text[:max(limit, 0)]
+    return text[:limit - 3] + "..."
+
+
+class Turn:
+    """One command and what the assistant did about it."""
+
+    __slots__ = ("command", "response", "tool_calls")
+
+    def __init__(self, command: str, response: str, tool_calls: List[Dict[str, Any]]):
+        self.command = command
+        self.response = response
+        self.tool_calls = tool_calls
+
+    def messages(self) -> List[BaseMessage]:
+        response = _truncate(str(self.response), MAX_RESPONSE_CHARS)
+        if self.tool_calls:
+            tools = "; ".join(format_tool_call(tool_call) for tool_call in self.tool_calls)
+            response = f"[tools used: {tools}] {response}"
+        return [HumanMessage(content=self.command), AIMessage(content=response)]
+
+
+class ConversationMemory:
+    """Recent turns verbatim plus a running summary of everything older."""
+
+    def __init__(self, max_turns: int = MAX_VERBATIM_TURNS, token_budget: int = TOKEN_BUDGET):
+        self.max_turns = max_turns
+        self.token_budget = token_budget
+        self.turns: Deque[Turn] = deque()
+        self.older_turns = 0
+        self.older_commands: Deque[str] = deque(maxlen=MAX_SUMMARY_COMMANDS)
+        self.recent_tool_calls: Deque[Dict[str, Any]] = deque(maxlen=MAX_SUMMARY_TOOL_CALLS)
+
+    def __len__(self) -> int:
+        return self.older_turns + len(self.turns)
+
+    def add_turn(self, command: str, response: str, tool_calls: List[Dict[str, Any]]) -> None:
+        self.turns.append(Turn(command, response, tool_calls))
+        self.recent_tool_calls.extend(tool_calls)
+        while len(self.turns) > self.max_turns:
+            old = self.turns.popleft()
+            self.older_turns += 1
+            self.older_commands.append(_truncate(old.command, 80))
+
+    def summary(self, document: Optional[Document] = None) -> str:
+        """Compact description of the session state, built without the LLM."""
+        lines = []
+        if document is not None:
+            line, column = document.line_col(document.cursor)
+            state = (f"Document: {len(document.line_starts)} lines, {len(document.text)} characters; "
+                     f"cursor at line {line}, column {column}")
+            selection = document.selected_range()
+            if selection is not None:
+                state += f"; {selection[1] - selection[0]} characters selected"
+            lines.append(state)
+        if self.older_turns:
+            lines.append(f"Earlier commands in this session: {self.older_turns}. Most recent of those: "
+                         + "; ".join(f"'{command}'" for command in self.older_commands))
+        if self.recent_tool_calls:
+            lines.append("Latest tool calls: "
+                         + "; ".join(format_tool_call(tool_call) for tool_call in self.recent_tool_calls))
+        return "\n".join(lines)
+
+    def build_messages(self, document: Optional[Document] = None, command: str = "") -> List[BaseMessage]:
+        """History messages to send before ``command``, within the token budget."""
+        budget = self.token_budget - estimate_tokens(command)
+        if budget <= 0:
+            # The command alone fills the budget
+            return []
+        messages: List[BaseMessage] = []
+
+        summary = self.summary(document)
+        # The summary gets at most a third of the budget, header included
+        summary_chars = (budget // 3) * 4 - len(SUMMARY_HEADER) - 4
+        if summary and summary_chars > 0:
+            content = SUMMARY_HEADER + _truncate(summary, summary_chars)
+            budget -= estimate_tokens(content)
+            messages.append(SystemMessage(content=content))
+
+        # Newest turns first, until the budget runs out
+        recent: List[BaseMessage] = []
+        for turn in reversed(self.turns):
+            turn_messages = turn.messages()
+            cost = sum(estimate_tokens(str(message.content)) for message in turn_messages)
+            if cost > budget:
+                break
+            budget -= cost
+            recent[:0] = turn_messages
+        return messages + recent
@@ -0,0 +1,357 @@
+"""Structural outline of a Markdown or LaTeX document, for navigation.
+
+``OutlineIndex`` keeps one sorted offset array per kind of element:
+
+- headings (Markdown ``#`` lines and LaTeX ``\\section``-style commands),
+  with their level, so the section around the cursor can be named
+- list items (``-``, ``*``, ``+``, ``1.`` and ``\\item``), with their indent
+- tables (the first row of a Markdown table, or ``\\begin{tabular}`` and
+  similar environments)
+- links (``[text](url)``, ``\\href{...}``, ``\\url{...}`` and bare URLs),
+  with their length
+- brackets (``()``, ``[]`` and ``{}``; escaped LaTeX braces are skipped)
+
+"Next heading" or "the bracket at the cursor" is then a binary search. An
+edit does not reparse the document: the lines it touches, plus one line on
+each side (a table row only starts a table if the row above is not part of
+one), are parsed again and spliced into the arrays. The arrays are split into
+blocks whose offsets are relative to the block's first entry, so shifting
+everything after an edit only adjusts one number per later block. A batch
+that touches many separate places (a multi-cursor edit, say) is instead
+merged into all arrays in a single sweep.
+
+Bracket pairs are stored as positions in the bracket array rather than as
+offsets, so edits that leave the brackets alone keep them valid. Edits that
+add or remove brackets drop the pairing, and it is rebuilt from the bracket
+array (not the text) on the next bracket lookup.
+"""
+import re
+import threading
+from bisect import bisect_left, bisect_right
+from typing import Any, Dict, List, Optional, Tuple
+
+from document import Document, Edit
+
+HEADING = re.compile(r"^(?:(#{1,6})[ \t]+\S|[ \t]*\\(part|chapter|section|subsection|subsubsection|paragraph)\*?"
+                     r"(?:\[[^\]\n]*\])?\{)", re.MULTILINE)
+LIST_ITEM = re.compile(r"^([ \t]*)(?:(?:[-*+]|\d+[.)])[ \t]+\S|\\item\b)", re.MULTILINE)
+MARKDOWN_TABLE_ROW = re.compile(r"^[ \t]*\|", re.MULTILINE)
+LATEX_TABLE = re.compile(r"\\begin\{(?:tabular[x*]?|table\*?|longtable|array)\}")
+LINK = re.compile(r"\[[^\]\n]*\]\([^)\s]*\)|\\(?:href|url)\{[^}\n]*\}(?:\{[^}\n]*\})?|https?://[^\s)>\]}]+")
+BRACKET = re.compile(r"(?<!\\)[()\[\]{}]")
+
+# LaTeX sectioning commands mapped onto Markdown's six levels, in document order
+LATEX_LEVELS = {"part": 1, "chapter": 2, "section": 3, "subsection": 4, "subsubsection": 5, "paragraph": 6}
+OPENING = {")": "(", "]": "[", "}": "{"}
+KINDS = ["heading", "list_item", "table", "link", "bracket"]
+# move_cursor destinations and read_text units answered from the outline
+OUTLINE_DESTINATIONS = ["heading", "list_item", "table", "link", "matching_bracket"]
+OUTLINE_UNITS = ["current_heading", "current_list_item"]
+
+BLOCK_SIZE = 256
+# Batches touching more regions than this rebuild the arrays in one sweep instead of splicing each region
+MAX_LOCAL_SPLICES = 32
+
+# Parsed elements of one kind: sorted offsets and a value for each
+Found = Tuple[List[int], List[Any]]
+
+
+class Entries:
+    """Sorted, distinct offsets with one value each, stored in blocks.
+
+    A block holds offsets relative to its base (the offset of its first
+    entry); ``firsts`` is the position of each block's first entry in the
+    whole array.
+    """
+
+    def __init__(self, offsets: List[int], values: List[Any]):
+        self.bases, self.blocks = _chunk(offsets, values)
+        self.firsts: List[int] = []
+        self._renumber(0)
+
+    def __len__(self) -> int:
+        return self.firsts[-1] + len(self.blocks[-1][0]) if self.blocks else 0
+
+    def _renumber(self, block: int) -> None:
+        del self.firsts[block:]
+        position = self.firsts[-1] + len(self.blocks[block - 1][0]) if block else 0
+        for offsets, _ in self.blocks[block:]:
+            self.firsts.append(position)
+            position += len(offsets)
+
+    def _block_of(self, position: int) -> int:
+        return max(bisect_right(self.firsts, position) - 1, 0)
+
+    def bisect(self, offset: int, right: bool = False) -> int:
+        """Position where ``offset`` would be inserted (after an equal entry if ``right``)."""
+        block = bisect_right(self.bases, offset) - 1
+        if block < 0:
+            return 0
+        search = bisect_right if right else bisect_left
+        return self.firsts[block] + search(self.blocks[block][0], offset - self.bases[block])
+
+    def offset(self, position: int) -> int:
+        block = self._block_of(position)
+        return self.bases[block] + self.blocks[block][0][position - self.firsts[block]]
+
+    def value(self, position: int) -> Any:
+        block = self._block_of(position)
+        return self.blocks[block][1][position - self.firsts[block]]
+
+    def offsets(self) -> List[int]:
+        return [base + offset for base, (offsets, _) in zip(self.bases, self.blocks) for offset in offsets]
+
+    def values(self) -> List[Any]:
+        return [value for _, values in self.blocks for value in values]
+
+    def splice(self, start: int, end: int, found: Found, change: int) -> List[Any]:
+        """Replace the entries in ``[start, end]`` with ``found`` and shift those after by ``change``.
+
+        Only the blocks holding the replaced entries are rebuilt. Returns the replaced values.
+        """
+        if not self.blocks:
+            self.bases, self.blocks = _chunk(*found)
+            self._renumber(0)
+            return []
+        low, high = self.bisect(start), self.bisect(end, right=True)
+        first, last = self._block_of(low), self._block_of(max(high - 1, low))
+        offsets: List[int] = []
+        values: List[Any] = []
+        for base, (block_offsets, block_values) in zip(self.bases[first:last + 1], self.blocks[first:last + 1]):
+            offsets.extend(base + offset for offset in block_offsets)
+            values.extend(block_values)
+        low, high = low - self.firsts[first], high - self.firsts[first]
+        replaced = values[low:high]
+        bases, blocks = _chunk(offsets[:low] + found[0] + [offset + change for offset in offsets[high:]],
+                               values[:low] + found[1] + values[high:])
+        self.bases[first:last + 1] = bases
+        self.blocks[first:last + 1] = blocks
+        later = first + len(blocks)
+        if change:
+            self.bases[later:] = [base + change for base in self.bases[later:]]
+        self._renumber(first)
+        return replaced
+
+
+    def splice_all(self, regions: List[Tuple[int, int, int, Found]], total: int) -> List[List[Any]]:
+        """``splice`` for many ``(start, end, delta, found)`` regions in one sweep, rebuilding every block.
+
+        ``found`` is in offsets of the new text and ``delta`` is the length change before the region;
+        ``total`` is the change of the whole batch. Returns the replaced values of each region.
+        """
+        old_offsets, old_values = self.offsets(), self.values()
+        offsets: List[int] = []
+        values: List[Any] = []
+        replaced = []
+        position = 0
+        for start, end, delta, found in regions:
+            first = bisect_left(old_offsets, start, position)
+            offsets.extend(offset + delta for offset in old_offsets[position:first])
+            values.extend(old_values[position:first])
+            position = bisect_right(old_offsets, end, first)
+            replaced.append(old_values[first:position])
+            offsets.extend(found[0])
+            values.extend(found[1])
+        offsets.extend(offset + total for offset in old_offsets[position:])
+        values.extend(old_values[position:])
+        self.bases, self.blocks = _chunk(offsets, values)
+        self._renumber(0)
+        return replaced
+
+
+def _chunk(offsets: List[int], values: List[Any]) -> Tuple[List[int], List[Tuple[List[int], List[Any]]]]:
+    bases, blocks = [], []
+    for start in range(0, len(offsets), BLOCK_SIZE):
+        base = offsets[start]
+        bases.append(base)
+        blocks.append(([offset - base for offset in offsets[start:start + BLOCK_SIZE]],
+                       values[start:start + BLOCK_SIZE]))
+    return bases, blocks
+
+
+def _line_start(text: str, offset: int) -> int:
+    return text.rfind("\n", 0, offset) + 1
+
+
+def _line_end(text: str, offset: int) -> int:
+    end = text.find("\n", offset)
+    return len(text) if end == -1 else end
+
+
+def _parse(text: str, start: int, end: int) -> Dict[str, Found]:
+    """Elements of the whole lines in ``text[start:end]``; ``start`` is a line start and ``end`` a line end."""
+    found: Dict[str, Found] = {}
+    headings = list(HEADING.finditer(text, start, end))
+    found["heading"] = ([m.start() for m in headings],
+                        [len(m.group(1)) if m.group(1) else LATEX_LEVELS[m.group(2)] for m in headings])
+    items = list(LIST_ITEM.finditer(text, start, end))
+    found["list_item"] = ([m.start() for m in items], [len(m.group(1)) for m in items])
+
+    # A Markdown table starts at a row whose previous line is not a row
+    tables = {m.start() for m in LATEX_TABLE.finditer(text, start, end)}
+    previous_row = None
+    for row in MARKDOWN_TABLE_ROW.finditer(text, start, end):
+        line_start = row.start()
+        previous_line = _line_start(text, line_start - 1) if line_start > 0 else None
+        if previous_line is None:
+            continues = False
+        elif previous_line >= start:
+            continues = previous_row == previous_line
+        else:
+            continues = MARKDOWN_TABLE_ROW.match(text, previous_line) is not None
+        if not continues:
+            tables.add(line_start)
+        previous_row = line_start
+    found["table"] = (sorted(tables), [None] * len(tables))
+
+    links = list(LINK.finditer(text, start, end))
+    found["link"] = ([m.start() for m in links], [m.end() - m.start() for m in links])
+    brackets = list(BRACKET.finditer(text, start, end))
+    found["bracket"] = ([m.start() for m in brackets], [m.group() for m in brackets])
+    return found
+
+
+class OutlineIndex:
+    """Headings, list items, tables, links and brackets of one document."""
+
+    def __init__(self, text: str = ""):
+        self._text = text
+        self.entries = {kind: Entries(*found) for kind, found in _parse(text, 0, len(text)).items()}
+        # Position of each bracket's partner in the bracket array (-1 if unmatched), built on demand
+        self._pairs: Optional[List[int]] = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_document(cls, document: Document) -> "OutlineIndex":
+        index = cls(document.text)
+        document.add_listener(lambda edits: index.on_edits(edits, document.text))
+        return index
+
+    # Edit tracking
+
+    def on_edits(self, edits: List[Edit], new_text: str) -> None:
+        """Reparse the lines around each edit and splice the results in."""
+        regions = []
+        total = 0
+        for start, end, change in self._regions(edits, self._text):
+            regions.append((start, end, total, change, _parse(new_text, start + total, end + total + change)))
+            total += change
+        with self._lock:
+            if len(regions) > MAX_LOCAL_SPLICES:
+                for kind in KINDS:
+                    replaced = self.entries[kind].splice_all(
+                        [(start, end, delta, found[kind]) for start, end, delta, _, found in regions], total)
+                    if kind == "bracket" and replaced != [found[kind][1] for *_, found in regions]:
+                        self._pairs = None
+            else:
+                # Back to front, so the old offsets of the regions still to splice stay valid
+                for start, end, delta, change, found in reversed(regions):
+                    for kind in KINDS:
+                        offsets, values = found[kind]
+                        replaced = self.entries[kind].splice(
+                            start, end, ([offset - delta for offset in offsets], values), change)
+                        if kind == "bracket" and replaced != values:
+                            self._pairs = None
+            self._text = new_text
+
+    @staticmethod
+    def _regions(edits: List[Edit], text: str) -> List[Tuple[int, int, int]]:
+        """Edited ranges widened to whole lines plus a line on each side, merged: ``(start, end, length change)``.
+
+        ``end`` is the offset of the last line's newline (or the end of the text).
+        """
+        regions: List[Tuple[int, int, int]] = []
+        for edit_start, edit_end, replacement in edits:
+            change = len(replacement) - (edit_end - edit_start)
+            start = _line_start(text, edit_start)
+            start = _line_start(text, start - 1) if start > 0 else 0
+            end = _line_end(text, edit_end)
+            end = _line_end(text, end + 1) if end < len(text) else end
+            if regions and start <= regions[-1][1]:
+                previous_start, previous_end, previous_change = regions.pop()
+                start, end, change = previous_start, max(end, previous_end), previous_change + change
+            regions.append((start, end, change))
+        return regions
+
+    # Queries
+
+    def step(self, kind: str, offset: int, direction: str, count: int = 1) -> Optional[int]:
+        """Offset of the ``count``-th element of ``kind`` after (``next``) or before (``previous``) ``offset``."""
+        with self._lock:
+            entries = self.entries[kind]
+            if direction == "previous":
+                position = entries.bisect(offset) - count
+            else:
+                position = entries.bisect(offset, right=True) + count - 1
+            return entries.offset(position) if 0 <= position < len(entries) else None
+
+    def edge(self, kind: str, direction: str) -> Optional[int]:
+        """Offset of the first (``start``) or last (``end``) element of ``kind``."""
+        with self._lock:
+            entries = self.entries[kind]
+            if not len(entries):
+                return None
+            return entries.offset(len(entries) - 1 if direction == "end" else 0)
+
+    def current(self, kind: str, offset: int) -> Optional[int]:
+        """Offset of the last element of ``kind`` starting at or before ``offset``."""
+        with self._lock:
+            entries = self.entries[kind]
+            position = entries.bisect(offset, right=True) - 1
+            return entries.offset(position) if position >= 0 else None
+
+    def value_at(self, kind: str, offset: int) -> Any:
+        """The value stored for the element of ``kind`` that starts at ``offset``."""
+        with self._lock:
+            entries = self.entries[kind]
+            position = entries.bisect(offset)
+            if position < len(entries) and entries.offset(position) == offset:
+                return entries.value(position)
+            return None
+
+    def section_path(self, offset: int) -> List[Tuple[int, int]]:
+        """``(offset, level)`` of the heading containing ``offset`` and of each heading above it, outermost first."""
+        with self._lock:
+            headings = self.entries["heading"]
+            position = headings.bisect(offset, right=True) - 1
+            path = []
+            while position >= 0:
+                level = headings.value(position)
+                if not path or level < path[-1][1]:
+                    path.append((headings.offset(position), level))
+                    if level == 1:
+                        break
+                position -= 1
+            return path[::-1]
+
+    def matching_bracket(self, offset: int) -> Optional[Tuple[int, int]]:
+        """``(bracket, partner)`` offsets for the bracket at ``offset`` or just before it."""
+        with self._lock:
+            brackets = self.entries["bracket"]
+            position = brackets.bisect(offset)
+            if position >= len(brackets) or brackets.offset(position) != offset:
+                position -= 1
+                if position < 0 or brackets.offset(position) != offset - 1:
+                    return None
+            if self._pairs is None:
+                self._pairs = _pair_brackets(brackets.values())
+            partner = self._pairs[position]
+            return (brackets.offset(position), brackets.offset(partner)) if partner >= 0 else None
+
+
+def _pair_brackets(brackets: List[str]) -> List[int]:
+    """Partner positions for a sequence of brackets; a closer that does not match the innermost opener is unmatched."""
+    pairs = [-1] * len(brackets)
+    stack: List[int] = []
+    for position, bracket in enumerate(brackets):
+        if bracket not in OPENING:
+            stack.append(position)
+        elif stack and brackets[stack[-1]] == OPENING[bracket]:
+            partner = stack.pop()
+            pairs[partner], pairs[position] = position, partner
+    return pairs
+
+
+def get_outline(document: Document) -> OutlineIndex:
+    """Return the outline index of ``document``, creating it on first use."""
+    return document.index("outline", OutlineIndex.for_document)
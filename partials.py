@@ -0,0 +1,144 @@
+"""Work started from partial transcripts, while the user is still speaking.
+
+Voice clients post partial transcripts to ``/api/command/partial`` as speech
+recognition produces them, then send the final transcript to ``/api/command``
+in the same session. For each partial the API:
+
+- classifies the intent with the local fast path (``fast_path.interpret``)
+- prefetches what the likely tools will read, such as the matches for
+  "replace X with Y", so the final command finds them cached
+- for commands that will need the agent, drafts its first step: one model
+  call whose tool calls are kept but not executed
+
+When the final transcript matches a draft (same words, same conversation
+history), the command starts from the drafted step instead of a fresh model
+call. A session has at most one draft in flight, so a long utterance costs at
+most one extra model call at a time (see ``Drafter``).
+"""
+import os
+import threading
+from concurrent.futures import Executor, Future
+from typing import Callable, Dict, List, Optional
+
+from langchain_core.messages import AIMessage, BaseMessage
+
+from document import Document
+from fast_path import Interpretation, normalize
+from formatting import get_formatting
+from outline import OUTLINE_DESTINATIONS, OUTLINE_UNITS, get_outline
+
+# Partial transcripts with fewer words are too unsettled to draft from
+MIN_DRAFT_WORDS = int(os.environ.get("PARTIAL_MIN_DRAFT_WORDS", "3"))
+# PARTIAL_DRAFTS=off keeps classification and prefetching but never calls the model early
+drafts_enabled = os.environ.get("PARTIAL_DRAFTS", "on") != "off"
+
+stats: Dict[str, int] = {"partials": 0, "partials_busy": 0, "drafts": 0, "drafts_reused": 0}
+_stats_lock = threading.Lock()
+
+
+def count(name: str) -> None:
+    with _stats_lock:
+        stats[name] += 1
+
+
+def transcript_key(transcript: str) -> str:
+    """Transcripts that differ only in spacing, end punctuation or a polite prefix share a key."""
+    return normalize(transcript)[1]
+
+
+def _contents(history: List[BaseMessage]) -> List[str]:
+    return [str(message.content) for message in history]
+
+
+class Draft:
+    """The agent's first step for one partial transcript, drafted or waiting to be."""
+
+    def __init__(self, transcript: str, history: List[BaseMessage]):
+        self.transcript = transcript
+        self.history = history
+        self.key = transcript_key(transcript)
+        self.history_contents = _contents(history)
+        self.future: "Future[AIMessage]" = Future()
+
+    def matches(self, transcript: str, history: List[BaseMessage]) -> bool:
+        """True if the draft is for this transcript with this conversation history."""
+        return self.key == transcript_key(transcript) and self.history_contents == _contents(history)
+
+    def message(self, timeout: float) -> Optional[AIMessage]:
+        """Wait for the drafted step. None if it failed, was superseded or is not ready in time."""
+        try:
+            return self.future.result(timeout=timeout)
+        except Exception:
+            # Includes the timeout and cancellation; the command then runs the agent from the start
+            return None
+
+
+class Drafter:
+    """Drafts the agent's first step for the latest partial transcript of a session.
+
+    One draft runs at a time. A partial that arrives meanwhile is queued,
+    replacing any older queued one, and drafted as soon as the running draft
+    finishes, so the last thing the user said is always drafted next.
+    """
+
+    def __init__(self, executor: Executor, draft_step: Callable[[str, List[BaseMessage]], AIMessage]):
+        self.executor = executor
+        self.draft_step = draft_step
+        self.latest: Optional[Draft] = None
+        self._queued: Optional[Draft] = None
+        self._running = False
+        self._lock = threading.Lock()
+
+    def update(self, transcript: str, history: List[BaseMessage]) -> bool:
+        """Draft this transcript if it is new and long enough. True if a draft for it exists."""
+        with self._lock:
+            if self.latest is not None and self.latest.matches(transcript, history):
+                return True
+            if not drafts_enabled or len(transcript.split()) < MIN_DRAFT_WORDS:
+                return False
+            if self._queued is not None:
+                self._queued.future.cancel()
+            self.latest = self._queued = Draft(transcript, history)
+            if not self._running:
+                self._running = True
+                self.executor.submit(self._work)
+            return True
+
+    def take(self) -> Optional[Draft]:
+        """Hand over the latest draft for the final transcript and start afresh."""
+        with self._lock:
+            draft, self.latest = self.latest, None
+            return draft
+
+    def _work(self) -> None:
+        while True:
+            with self._lock:
+                draft, self._queued = self._queued, None
+                if draft is None:
+                    self._running = False
+                    return
+            if not draft.future.set_running_or_notify_cancel():
+                continue
+            count("drafts")
+            try:
+                draft.future.set_result(self.draft_step(draft.transcript, draft.history))
+            except Exception as e:
+                draft.future.set_exception(e)
+
+
+def prefetch(interpretation: Interpretation, document: Document) -> List[str]:
+    """Warm the document caches the interpreted tool calls will use. Returns what was warmed."""
+    warmed = []
+    for tool_call in interpretation.tool_calls:
+        name, args = tool_call["name"], tool_call["args"]
+        if name == "edit_text" and args.get("text_to_replace"):
+            # Same key as the lookup edit_text makes by default
+            matches = document.find_all(args["text_to_replace"], case_sensitive=False)
+            warmed.append(f"{len(matches)} match(es) for '{args['text_to_replace']}'")
+        elif args.get("destination_type") in OUTLINE_DESTINATIONS or args.get("unit") in OUTLINE_UNITS:
+            get_outline(document)
+            warmed.append("outline index")
+        elif name == "apply_formatting" or (name == "report_status" and args.get("query") == "current_formatting"):
+            get_formatting(document)
+            warmed.append("formatting index")
+    return warmed
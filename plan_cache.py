@@ -0,0 +1,135 @@
+"""Cache of command plans: the tool calls the agent chose for a command.
+
+When the same command comes in again, the API can run the cached tool calls
+directly instead of asking the LLM. The response is then the tool outputs,
+not an answer written by the agent. A plan is only reused in the document
+state it was learned in (``document_state``): whether the document is empty,
+whether text is selected and whether there are extra cursors, since the
+agent picks different tool calls for "make it bold" with and without a
+selection. The cache is off unless enabled (see ``api.py``). Entries live in a small per-process LRU
+in front of an optional SQLite file, so in multi-worker mode a plan learned by
+one worker process is picked up by the others. SQLite in WAL mode handles
+concurrent readers and writers across processes; each thread and each forked
+process opens its own connection.
+"""
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+Plan = List[Dict[str, Any]]  # [{"name": tool name, "args": {...}}, ...]
+
+MAX_LOCAL_ENTRIES = 1024
+
+
+def document_state(document: Any) -> str:
+    """The parts of a document's state that the agent's choice of tool calls depends on."""
+    return ",".join([
+        "text" if document.text else "empty",
+        "selection" if document.selected_range() is not None else "no-selection",
+        "cursors" if document.cursors else "cursor",
+    ])
+
+
+def plan_key(command: str, state: str = "") -> str:
+    """Cache key of a command in a document state (commands never contain newlines once normalized)."""
+    key = normalize_command(command)
+    return f"{key}\n{state}" if state else key
+
+
+def normalize_command(command: str) -> str:
+    """Canonical cache key: lower case, single spaces, no trailing punctuation."""
+    return re.sub(r"\s+", " ", command.strip().lower()).rstrip(".!?")
+
+
+class PlanCache:
+    """Read-mostly command plan cache, optionally shared through a SQLite file."""
+
+    def __init__(self, path: Optional[str] = None, max_local_entries: int = MAX_LOCAL_ENTRIES):
+        self.path = path
+        self.max_local_entries = max_local_entries
+        self.hits = 0
+        self.misses = 0
+        self._local: "OrderedDict[str, Plan]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._connections = threading.local()
+        if path:
+            self._connect().execute(
+                "CREATE TABLE IF NOT EXISTS plans (key TEXT PRIMARY KEY, plan TEXT NOT NULL, updated REAL NOT NULL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        # Connections must not cross threads or a fork
+        state = self._connections
+        if getattr(state, "pid", None) != os.getpid():
+            state.connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            state.connection.execute("PRAGMA journal_mode=WAL")
+            state.connection.execute("PRAGMA synchronous=NORMAL")
+            state.pid = os.getpid()
+        return state.connection
+
+    def get(self, command: str, state: str = "", count: bool = True) -> Optional[Plan]:
+        """Return the cached plan for a command in a document state (see ``document_state``), or None.
+
+        Pass ``count=False`` for lookaheads that should not show up as hits or misses.
+        """
+        key = plan_key(command, state)
+        with self._lock:
+            plan = self._local.get(key)
+            if plan is not None:
+                self._local.move_to_end(key)
+                self.hits += count
+                return plan
+
+        if self.path:
+            row = self._connect().execute("SELECT plan FROM plans WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                plan = json.loads(row[0])
+                self._remember(key, plan)
+                with self._lock:
+                    self.hits += count
+                return plan
+
+        with self._lock:
+            self.misses += count
+        return None
+
+    def put(self, command: str, plan: Plan, state: str = "") -> None:
+        """Store the plan for a command in a document state, in this process and in the shared store."""
+        key = plan_key(command, state)
+        self._remember(key, plan)
+        if self.path:
+            self._connect().execute(
+                "INSERT OR REPLACE INTO plans (key, plan, updated) VALUES (?, ?, ?)",
+                (key, json.dumps(plan), time.time())
+            )
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "local_entries": len(self._local),
+                    "shared": bool(self.path)}
+
+    def _remember(self, key: str, plan: Plan) -> None:
+        with self._lock:
+            self._local[key] = plan
+            self._local.move_to_end(key)
+            while len(self._local) > self.max_local_entries:
+                self._local.popitem(last=False)
+
+
+def from_environment(environ: Optional[Dict[str, str]] = None) -> Optional[PlanCache]:
+    """The cache the environment opts into, or None.
+
+    ``PLAN_CACHE=on`` turns on a per-process cache; ``PLAN_CACHE_PATH`` turns
+    it on backed by that SQLite file, unless ``PLAN_CACHE=off``.
+    """
+    environ = os.environ if environ is None else environ
+    path = environ.get("PLAN_CACHE_PATH") or None
+    setting = environ.get("PLAN_CACHE")
+    if setting == "on" or (path and setting != "off"):
+        return PlanCache(path)
+    return None
@@ -0,0 +1,245 @@
+"""Per-command profiling: wall time, CPU time and memory per tool call and agent step.
+
+Profiling is off unless a request asks for it (``"profile": true``) or the
+server runs with ``PROFILE=on``. While a command is profiled, a ``Profile`` is
+set for its context; ``ProfilerCallback`` then records a span for every tool
+call, model call and LangGraph node, and ``span`` records the API's own steps
+(plan cache lookup, fast path, ...). When no profile is active, ``span`` and
+``callbacks`` cost one context variable lookup.
+
+Each span records:
+
+- wall time
+- CPU time of the thread it ran on (only when it started and ended on the
+  same thread)
+- the change in traced memory, via ``tracemalloc``. This is process-wide, so
+  concurrent requests blur it. ``PROFILE_MEMORY=off`` skips ``tracemalloc``
+  and its overhead.
+
+Finished profiles are kept in a small ring and exported in the Chrome trace
+event format, which chrome://tracing, Perfetto and speedscope all open.
+"""
+import os
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+profiling_enabled = os.environ.get("PROFILE", "off") == "on"
+memory_enabled = os.environ.get("PROFILE_MEMORY", "on") != "off"
+MAX_PROFILES = 50
+
+_current_profile: ContextVar[Optional["Profile"]] = ContextVar("current_profile", default=None)
+_tracing_users = 0
+_tracing_lock = threading.Lock()
+
+
+def _start_tracing() -> None:
+    global _tracing_users
+    with _tracing_lock:
+        if _tracing_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        _tracing_users += 1
+
+
+def _stop_tracing() -> None:
+    global _tracing_users
+    with _tracing_lock:
+        _tracing_users -= 1
+        if _tracing_users == 0 and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+
+def _traced_memory() -> int:
+    return tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else 0
+
+
+class _OpenSpan:
+    __slots__ = ("name", "category", "thread", "start", "cpu_start", "memory_start", "args")
+
+    def __init__(self, name: str, category: str, args: Dict[str, Any]):
+        self.name = name
+        self.category = category
+        self.thread = threading.get_ident()
+        self.start = time.perf_counter_ns()
+        self.cpu_start = time.thread_time_ns()
+        self.memory_start = _traced_memory()
+        self.args = args
+
+
+class Profile:
+    """Spans recorded while handling one command."""
+
+    def __init__(self, name: str):
+        self.id = uuid.uuid4().hex[:12]
+        self.name = name
+        self.events: List[Dict[str, Any]] = []
+        self.origin = time.perf_counter_ns()
+        self._open: Dict[Any, _OpenSpan] = {}
+        self._threads: Dict[int, str] = {}
+        self._lock = threading.Lock()
+
+    def begin(self, key: Any, name: str, category: str, **args: Any) -> None:
+        """Open a span. ``key`` identifies it for ``end`` (e.g. a LangChain run id)."""
+        span = _OpenSpan(name, category, args)
+        with self._lock:
+            self._open[key] = span
+            if span.thread not in self._threads:
+                self._threads[span.thread] = threading.current_thread().name
+
+    def end(self, key: Any, **args: Any) -> None:
+        """Close the span opened with ``key``, if any."""
+        end = time.perf_counter_ns()
+        with self._lock:
+            span = self._open.pop(key, None)
+        if span is None:
+            return
+        args = {**span.args, **args}
+        if span.thread == threading.get_ident():
+            args["cpu_ms"] = round((time.thread_time_ns() - span.cpu_start) / 1e6, 3)
+        if tracemalloc.is_tracing():
+            args["memory_delta_bytes"] = _traced_memory() - span.memory_start
+        event = {
+            "name": span.name,
+            "cat": span.category,
+            "ph": "X",
+            "ts": (span.start - self.origin) / 1000,
+            "dur": (end - span.start) / 1000,
+            "pid": os.getpid(),
+            "tid": span.thread,
+            "args": args,
+        }
+        with self._lock:
+            self.events.append(event)
+
+    @contextmanager
+    def span(self, name: str, category: str = "api", **args: Any) -> Iterator[None]:
+        key = object()
+        self.begin(key, name, category, **args)
+        try:
+            yield
+        finally:
+            self.end(key)
+
+    def to_chrome_trace(self) -> Dict[str, Any]:
+        """The profile in Chrome trace event format (JSON object form)."""
+        with self._lock:
+            events = sorted(self.events, key=lambda event: event["ts"])
+            threads = [
+                {"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": thread, "args": {"name": name}}
+                for thread, name in self._threads.items()
+            ]
+        return {
+            "traceEvents": threads + events,
+            "displayTimeUnit": "ms",
+            "otherData": {"profile_id": self.id, "command": self.name},
+        }
+
+
+class ProfilerCallback(BaseCallbackHandler):
+    """Records LangGraph nodes, model calls and tool calls as spans of a profile."""
+
+    def __init__(self, profile: Profile):
+        self.profile = profile
+
+    def on_chain_start(self, serialized: Optional[Dict[str, Any]], inputs: Any, *, run_id: UUID,
+                       tags: Optional[List[str]] = None, metadata: Optional[Dict[str, Any]] = None,
+                       **kwargs: Any) -> None:
+        name = kwargs.get("name")
+        node = (metadata or {}).get("langgraph_node")
+        # Only the graph itself and its nodes; skip the many internal runnables
+        if kwargs.get("parent_run_id") is None:
+            self.profile.begin(run_id, name or "graph", "graph")
+        elif name == node and any(tag.startswith("graph:step:") for tag in tags or []):
+            self.profile.begin(run_id, f"node:{node}", "graph")
+
+    def on_chain_end(self, outputs: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self.profile.end(run_id)
+
+    def on_chain_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self.profile.end(run_id, error=repr(error))
+
+    def on_chat_model_start(self, serialized: Optional[Dict[str, Any]], messages: Any, *, run_id: UUID,
+                            **kwargs: Any) -> None:
+        name = (serialized or {}).get("name") or kwargs.get("name") or "model"
+        self.profile.begin(run_id, f"model:{name}", "model")
+
+    def on_llm_end(self, response: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self.profile.end(run_id)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self.profile.end(run_id, error=repr(error))
+
+    def on_tool_start(self, serialized: Optional[Dict[str, Any]], input_str: str, *, run_id: UUID,
+                      **kwargs: Any) -> None:
+        name = (serialized or {}).get("name") or kwargs.get("name") or "tool"
+        self.profile.begin(run_id, f"tool:{name}", "tool", input=input_str)
+
+    def on_tool_end(self, output: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self.profile.end(run_id)
+
+    def on_tool_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self.profile.end(run_id, error=repr(error))
+
+
+_profiles: "OrderedDict[str, Profile]" = OrderedDict()
+_profiles_lock = threading.Lock()
+
+
+@contextmanager
+def profiling(name: str) -> Iterator[Profile]:
+    """Profile the block: set a new profile for this context and keep it once done."""
+    profile = Profile(name)
+    if memory_enabled:
+        _start_tracing()
+    token = _current_profile.set(profile)
+    try:
+        with profile.span("command", command=name):
+            yield profile
+    finally:
+        _current_profile.reset(token)
+        if memory_enabled:
+            _stop_tracing()
+        with _profiles_lock:
+            _profiles[profile.id] = profile
+            while len(_profiles) > MAX_PROFILES:
+                _profiles.popitem(last=False)
+
+
+def get_profile(profile_id: str) -> Optional[Profile]:
+    with _profiles_lock:
+        return _profiles.get(profile_id)
+
+
+def list_profiles() -> List[Dict[str, Any]]:
+    """Summaries of the kept profiles, newest first."""
+    with _profiles_lock:
+        profiles = list(reversed(_profiles.values()))
+    summaries = []
+    for profile in profiles:
+        command = next((event for event in profile.events if event["name"] == "command"), None)
+        summaries.append({
+            "profile_id": profile.id,
+            "command": profile.name,
+            "duration_ms": round(command["dur"] / 1000, 3) if command else None,
+        })
+    return summaries
+
+
+def span(name: str, category: str = "api", **args: Any):
+    """Record the block as a span of the current profile; does nothing when not profiling."""
+    profile = _current_profile.get()
+    return profile.span(name, category, **args) if profile is not None else nullcontext()
+
+
+def callbacks() -> List[BaseCallbackHandler]:
+    """LangChain callbacks that record into the current profile (none when not profiling)."""
+    profile = _current_profile.get()
+    return [ProfilerCallback(profile)] if profile is not None else []
@@ -0,0 +1,146 @@
+"""Optional recording of production commands as replayable traces.
+
+With ``RECORD_TRACES=<path>`` set, the API appends one JSON line per command
+to ``path``: the command, its session, which path handled it (agent, cached
+plan, fast path or draft), every tool call with its arguments, output and
+duration, the final response, and a fingerprint of the document before the
+command. ``replay.py`` runs these traces again without the LLM.
+
+Tool calls are captured with a LangChain callback, the same way the profiler
+hooks in; when recording is off, ``callbacks`` costs one context variable
+lookup. Each line is written with a single append, so several worker
+processes can share one file.
+"""
+import json
+import os
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from document import Document
+
+TRACE_PATH = os.environ.get("RECORD_TRACES")
+TRACE_VERSION = 1
+
+_current_recording: ContextVar[Optional["Recording"]] = ContextVar("current_recording", default=None)
+_write_lock = threading.Lock()
+
+
+def fingerprint(document: Document) -> Dict[str, int]:
+    """Cheap identity of the document state, to detect a replay drifting from the recording."""
+    return {"length": len(document.text), "crc32": zlib.crc32(document.text.encode("utf-8"))}
+
+
+class Recording:
+    """Tool calls made while handling one command."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        # The API result, set by the caller once the command has been handled
+        self.result: Optional[Dict[str, Any]] = None
+        self.tool_calls: List[Dict[str, Any]] = []
+        self._open: Dict[UUID, Dict[str, Any]] = {}
+        self._sequence = 0
+        self._lock = threading.Lock()
+
+    def begin(self, run_id: UUID, name: str, args: Any) -> None:
+        with self._lock:
+            self._sequence += 1
+            self._open[run_id] = {"name": name, "args": args, "sequence": self._sequence,
+                                  "started": time.perf_counter()}
+
+    def end(self, run_id: UUID, output: Any) -> None:
+        finished = time.perf_counter()
+        with self._lock:
+            call = self._open.pop(run_id, None)
+            if call is None:
+                return
+            call["output"] = str(getattr(output, "content", output))
+            call["ms"] = round((finished - call.pop("started")) * 1000, 3)
+            self.tool_calls.append(call)
+
+    def completed_tool_calls(self) -> List[Dict[str, Any]]:
+        """Finished tool calls in the order they started."""
+        with self._lock:
+            calls = sorted(self.tool_calls, key=lambda call: call["sequence"])
+        return [{key: value for key, value in call.items() if key != "sequence"} for call in calls]
+
+
+class RecordingCallback(BaseCallbackHandler):
+    """Captures tool calls, with arguments, output and duration, into a recording."""
+
+    def __init__(self, recording: Recording):
+        self.recording = recording
+
+    def on_tool_start(self, serialized: Optional[Dict[str, Any]], input_str: str, *, run_id: UUID,
+                      inputs: Optional[Dict[str, Any]] = None, **kwargs: Any) -> None:
+        name = (serialized or {}).get("name") or kwargs.get("name") or "tool"
+        self.recording.begin(run_id, name, inputs if inputs is not None else input_str)
+
+    def on_tool_end(self, output: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self.recording.end(run_id, output)
+
+    def on_tool_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self.recording.end(run_id, f"Error: {error!r}")
+
+
+def command_path(result: Dict[str, Any]) -> str:
+    """Which path handled a command, from its API result."""
+    for path in ["cached_plan", "fast_path", "draft_reused"]:
+        if result.get(path):
+            return path
+    return "agent"
+
+
+@contextmanager
+def recording(document: Document, command: str, session_id: Optional[str]) -> Iterator[Optional[Recording]]:
+    """Record the command handled in the block, if recording is on.
+
+    Yields the ``Recording`` (None when off); the caller sets its ``result``.
+    """
+    if not TRACE_PATH:
+        yield None
+        return
+    current = Recording()
+    before = fingerprint(document)
+    token = _current_recording.set(current)
+    try:
+        yield current
+    finally:
+        _current_recording.reset(token)
+    result = current.result
+    if result is not None:
+        write_trace({
+            "v": TRACE_VERSION,
+            "ts": round(time.time(), 3),
+            "session_id": session_id,
+            "command": command,
+            "path": command_path(result),
+            "document_before": before,
+            "tool_calls": current.completed_tool_calls(),
+            "final_response": result.get("final_response"),
+            "budget_exhausted": result.get("budget_exhausted"),
+            "ms": round((time.perf_counter() - current.started) * 1000, 3),
+        })
+
+
+def write_trace(trace: Dict[str, Any], path: Optional[str] = None) -> None:
+    line = (json.dumps(trace, separators=(",", ":"), default=str) + "\n").encode("utf-8")
+    with _write_lock:
+        fd = os.open(path or TRACE_PATH, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line)
+        finally:
+            os.close(fd)
+
+
+def callbacks() -> List[BaseCallbackHandler]:
+    """LangChain callbacks that record into the current recording (none when not recording)."""
+    current = _current_recording.get()
+    return [RecordingCallback(current)] if current is not None else []
@@ -0,0 +1,218 @@
+"""Replay recorded command traces without the LLM.
+
+Reads the JSON lines written by ``recorder.py`` and, session by session, in
+recorded order:
+
+- runs each command's recorded tool calls against the tools, on a fresh
+  document per session, and compares every output with the recorded one
+- asks the fast path (``fast_path.interpret``) for its interpretation and
+  compares it with the tool calls that were actually made
+- checks that the plan cache key (``plan_cache.plan_key``) never maps two
+  commands with different plans to the same entry
+- compares the tool timings with the recorded ones
+
+The document is fingerprinted before each command; once a session's document
+no longer matches the recording (for example because recording started in
+the middle of a session), its later output differences are reported as drift
+rather than mismatches.
+
+Usage:
+    python replay.py traces.jsonl [--json] [--show 10]
+
+Exits with status 1 when a replayed output differs from the recording.
+"""
+import argparse
+import json
+import sys
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+from langchain_core.tools import BaseTool
+
+import tools
+from document import Document, use_document
+from fast_path import CONFIDENCE_THRESHOLD, interpret
+from memory import references_context
+from plan_cache import document_state, plan_key
+from recorder import fingerprint
+
+# Tools whose output depends on the clock rather than on the document
+VOLATILE_TOOLS = {"get_current_time"}
+
+TOOLS_BY_NAME = {value.name: value for value in vars(tools).values() if isinstance(value, BaseTool)}
+
+
+def load_traces(path: str) -> List[Dict[str, Any]]:
+    traces = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                traces.append(json.loads(line))
+    return traces
+
+
+def same_calls(left: List[Dict[str, Any]], right: List[Dict[str, Any]]) -> bool:
+    return [(call["name"], call["args"]) for call in left] == [(call["name"], call["args"]) for call in right]
+
+
+class Replay:
+    """Replays traces and collects the differences from the recording."""
+
+    def __init__(self):
+        self.documents: Dict[Optional[str], Document] = defaultdict(Document)
+        self.drifted: Dict[Optional[str], bool] = defaultdict(bool)
+        self.plans: Dict[str, List[Dict[str, Any]]] = {}
+        self.counts: Dict[str, int] = defaultdict(int)
+        self.mismatches: List[Dict[str, Any]] = []
+        self.drift: List[Dict[str, Any]] = []
+        self.fast_path_conflicts: List[Dict[str, Any]] = []
+        self.plan_conflicts: List[Dict[str, Any]] = []
+        self.timings: Dict[str, Dict[str, List[float]]] = defaultdict(lambda: {"recorded": [], "replayed": []})
+
+    def run(self, traces: List[Dict[str, Any]]) -> None:
+        for trace in traces:
+            self.replay_trace(trace)
+
+    def replay_trace(self, trace: Dict[str, Any]) -> None:
+        session_id = trace.get("session_id")
+        document = self.documents[session_id]
+        command = trace["command"]
+        recorded_calls = [call for call in trace["tool_calls"] if call["name"] in TOOLS_BY_NAME]
+        self.counts["commands"] += 1
+
+        if fingerprint(document) != trace["document_before"] and not self.drifted[session_id]:
+            self.drifted[session_id] = True
+            self.drift.append({"session_id": session_id, "command": command})
+
+        # Sessions keep conversation memory; the API sends their context-dependent commands to the agent
+        context_dependent = session_id is not None and references_context(command)
+        if not context_dependent:
+            self.check_fast_path(command, document, recorded_calls)
+            self.check_plan(command, document_state(document), trace, recorded_calls)
+
+        with use_document(document):
+            for call in recorded_calls:
+                self.replay_call(trace, call)
+
+    def check_fast_path(self, command: str, document: Document, recorded_calls: List[Dict[str, Any]]) -> None:
+        interpretation = interpret(command, document)
+        if interpretation is None:
+            self.counts["fast_path_unrecognized"] += 1
+        elif same_calls(interpretation.tool_calls, recorded_calls):
+            self.counts["fast_path_agrees"] += 1
+        else:
+            self.counts["fast_path_differs"] += 1
+            if interpretation.confidence >= CONFIDENCE_THRESHOLD:
+                # The fast path would have committed a different plan than the one recorded
+                self.fast_path_conflicts.append({
+                    "command": command,
+                    "confidence": interpretation.confidence,
+                    "fast_path": interpretation.tool_calls,
+                    "recorded": [{"name": call["name"], "args": call["args"]} for call in recorded_calls],
+                })
+
+    def check_plan(self, command: str, state: str, trace: Dict[str, Any], recorded_calls: List[Dict[str, Any]]) -> None:
+        if trace.get("budget_exhausted") or not recorded_calls:
+            return
+        plan = [{"name": call["name"], "args": call["args"]} for call in recorded_calls]
+        key = plan_key(command, state)
+        cached = self.plans.setdefault(key, plan)
+        if cached is plan:
+            return
+        if same_calls(cached, plan):
+            self.counts["plan_cache_consistent"] += 1
+        else:
+            self.plan_conflicts.append({"key": key, "command": command, "cached": cached, "recorded": plan})
+
+    def replay_call(self, trace: Dict[str, Any], call: Dict[str, Any]) -> None:
+        name = call["name"]
+        started = time.perf_counter()
+        try:
+            output = str(TOOLS_BY_NAME[name].invoke(call["args"]))
+        except Exception as e:
+            output = f"Error: {e!r}"
+        elapsed = (time.perf_counter() - started) * 1000
+        self.counts["tool_calls"] += 1
+
+        self.timings[name]["recorded"].append(call.get("ms", 0.0))
+        self.timings[name]["replayed"].append(elapsed)
+        if name in VOLATILE_TOOLS or output == call["output"]:
+            return
+        difference = {"session_id": trace.get("session_id"), "command": trace["command"], "tool": name,
+                      "args": call["args"], "recorded": call["output"], "replayed": output}
+        if self.drifted[trace.get("session_id")]:
+            self.counts["drifted_outputs"] += 1
+        else:
+            self.mismatches.append(difference)
+
+    def summary(self) -> Dict[str, Any]:
+        timings = {}
+        for name, samples in sorted(self.timings.items()):
+            recorded = sum(samples["recorded"]) / len(samples["recorded"])
+            replayed = sum(samples["replayed"]) / len(samples["replayed"])
+            timings[name] = {
+                "calls": len(samples["replayed"]),
+                "recorded_mean_ms": round(recorded, 3),
+                "replayed_mean_ms": round(replayed, 3),
+                "change_pct": round((replayed - recorded) / recorded * 100, 1) if recorded else None,
+            }
+        return {
+            "counts": dict(self.counts),
+            "output_mismatches": self.mismatches,
+            "drifted_sessions": self.drift,
+            "fast_path_conflicts": self.fast_path_conflicts,
+            "plan_cache_conflicts": self.plan_conflicts,
+            "timings": timings,
+        }
+
+
+def format_report(summary: Dict[str, Any], show: int = 10) -> str:
+    counts = summary["counts"]
+    lines = [
+        f"Commands: {counts.get('commands', 0)}, tool calls replayed: {counts.get('tool_calls', 0)}",
+        f"Output mismatches: {len(summary['output_mismatches'])}"
+        + (f" (plus {counts['drifted_outputs']} in drifted sessions)" if counts.get("drifted_outputs") else ""),
+        f"Fast path: {counts.get('fast_path_agrees', 0)} agree, {counts.get('fast_path_differs', 0)} differ "
+        f"({len(summary['fast_path_conflicts'])} above the commit threshold), "
+        f"{counts.get('fast_path_unrecognized', 0)} not recognized",
+        f"Plan cache: {counts.get('plan_cache_consistent', 0)} repeated command(s) consistent, "
+        f"{len(summary['plan_cache_conflicts'])} conflicting",
+    ]
+    for title, entries in [("Output mismatches", summary["output_mismatches"]),
+                           ("Drifted sessions", summary["drifted_sessions"]),
+                           ("Fast path conflicts", summary["fast_path_conflicts"]),
+                           ("Plan cache conflicts", summary["plan_cache_conflicts"])]:
+        if entries:
+            lines.append("")
+            lines.append(f"{title}:")
+            lines.extend(f"  {json.dumps(entry, default=str)}" for entry in entries[:show])
+            if len(entries) > show:
+                lines.append(f"  ... {len(entries) - show} more")
+    if summary["timings"]:
+        lines.append("")
+        lines.append(f"{'Tool':<20} {'Calls':>6} {'Recorded ms':>12} {'Replayed ms':>12} {'Change':>8}")
+        for name, timing in summary["timings"].items():
+            change = f"{timing['change_pct']:+.1f}%" if timing["change_pct"] is not None else "-"
+            lines.append(f"{name:<20} {timing['calls']:>6} {timing['recorded_mean_ms']:>12.3f} "
+                         f"{timing['replayed_mean_ms']:>12.3f} {change:>8}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded command traces without the LLM")
+    parser.add_argument("traces", help="Trace file written with RECORD_TRACES")
+    parser.add_argument("--show", type=int, default=10, help="Differences to list per category")
+    parser.add_argument("--json", action="store_true", help="Print the summary as JSON")
+    args = parser.parse_args()
+
+    replay = Replay()
+    replay.run(load_traces(args.traces))
+    summary = replay.summary()
+    print(json.dumps(summary, indent=2, default=str) if args.json else format_report(summary, args.show))
+    sys.exit(1 if summary["output_mismatches"] else 0)
+
+
+if __name__ == "__main__":
+    main()
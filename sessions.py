@@ -0,0 +1,63 @@
+"""Editing sessions: one document and one conversation memory per client session.
+
+Clients identify a session with an ``X-Session-ID`` header or a ``session_id``
+field in the request body. Requests without one share the default document
+and get no conversation memory. The store is bounded; the least recently used
+session is dropped when it is full.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from document import Document
+from memory import ConversationMemory
+
+SESSION_HEADER = "X-Session-ID"
+MAX_SESSIONS = 1000
+
+
+class Session:
+    """State for one client session. ``lock`` serializes commands within it."""
+
+    def __init__(self, session_id: str):
+        self.id = session_id
+        self.document = Document()
+        self.memory = ConversationMemory()
+        self.lock = threading.RLock()
+        # Drafts the agent's first step from partial transcripts (see partials.py)
+        self.drafter = None
+        self.last_used = time.time()
+
+
+class SessionStore:
+    """Bounded LRU of sessions."""
+
+    def __init__(self, max_sessions: int = MAX_SESSIONS):
+        self.max_sessions = max_sessions
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str) -> Session:
+        """Return the session, creating it if needed."""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = self._sessions[session_id] = Session(session_id)
+                while len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+            else:
+                self._sessions.move_to_end(session_id)
+            session.last_used = time.time()
+            return session
+
+    def find(self, session_id: str) -> Optional[Session]:
+        """Return the session if it exists, without creating it."""
+        with self._lock:
+            return self._sessions.get(session_id)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+
+sessions = SessionStore()
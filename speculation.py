@@ -0,0 +1,102 @@
+"""Race a doubtful local interpretation against the LLM agent without double-applying edits.
+
+For a command the fast path recognizes, the API checks the confidence of the
+local interpretation first:
+
+- at or above the threshold, the local tool calls run straight away and the
+  agent is never started
+- below it, the agent starts on a worker thread and the two race. Whichever
+  path *acts* first wins: the local path acts when the agent's first model
+  response proposes exactly the local tool calls (confirming the doubtful
+  interpretation), the agent acts when it is about to run a tool it chose
+  differently
+
+Neither path touches the document before it has won the claim, so edits are
+never applied twice. A confirmation cancels the agent right after that model
+call, which saves its remaining model calls (running the tools and writing
+the final answer); the local plan's tool outputs are the response.
+"""
+import logging
+import threading
+from typing import Any, Dict, List, Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+LOCAL = "local"
+AGENT = "agent"
+
+# How often each path won, for monitoring
+stats: Dict[str, int] = {LOCAL: 0, AGENT: 0}
+_stats_lock = threading.Lock()
+
+
+def record(path: str) -> None:
+    """Count a win for ``path``."""
+    with _stats_lock:
+        stats[path] += 1
+
+
+def _calls(tool_calls: List[Dict[str, Any]]) -> List[Any]:
+    # Arguments left at None are the same as arguments left out
+    return [(call["name"], {key: value for key, value in call["args"].items() if value is not None})
+            for call in tool_calls]
+
+
+class AgentCancelled(Exception):
+    """Raised inside the agent run to stop it, e.g. after the local path won."""
+
+
+class _HideCancellations(logging.Filter):
+    """LangChain logs every callback exception; a deliberate cancellation is not an error."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        message = record.getMessage()
+        return not any(cls.__name__ in message for cls in [AgentCancelled, *AgentCancelled.__subclasses__()])
+
+
+logging.getLogger("langchain_core.callbacks.manager").addFilter(_HideCancellations())
+
+
+class Speculation:
+    """First-come claim between the local path and the agent, over the local ``tool_calls``."""
+
+    def __init__(self, tool_calls: Optional[List[Dict[str, Any]]] = None):
+        self._lock = threading.Lock()
+        self.tool_calls = tool_calls or []
+        self.winner: Optional[str] = None
+
+    def claim(self, path: str) -> bool:
+        """Claim the right to apply side effects. True if ``path`` holds it."""
+        with self._lock:
+            if self.winner is None:
+                self.winner = path
+                record(path)
+            return self.winner == path
+
+    def confirmed_by(self, tool_calls: List[Dict[str, Any]]) -> bool:
+        """True if the agent proposed exactly the local tool calls."""
+        return bool(tool_calls) and _calls(tool_calls) == _calls(self.tool_calls)
+
+
+class SpeculationCallback(BaseCallbackHandler):
+    """Claims the speculation for the local path when the agent confirms it, or for the agent on its first tool call."""
+
+    raise_error = True
+
+    def __init__(self, speculation: Speculation):
+        self.speculation = speculation
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: Any, **kwargs: Any) -> None:
+        if self.speculation.winner == LOCAL:
+            raise AgentCancelled("Local interpretation was used")
+
+    def on_llm_end(self, response: Any, **kwargs: Any) -> None:
+        generations = response.generations[0] if response.generations else []
+        message = getattr(generations[0], "message", None) if generations else None
+        if message is not None and self.speculation.confirmed_by(getattr(message, "tool_calls", None) or []) \
+                and self.speculation.claim(LOCAL):
+            raise AgentCancelled("The agent confirmed the local interpretation")
+
+    def on_tool_start(self, serialized: Dict[str, Any], input_str: str, **kwargs: Any) -> None:
+        if not self.speculation.claim(AGENT):
+            raise AgentCancelled("Local interpretation was used")
@@ -1,29 +1,63 @@
 import streamlit as st
 import requests
 import json
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from requests.adapters import HTTPAdapter
 
 # API endpoint - adjust if your Flask API is running on a different host/port
 API_URL = "http://localhost:5000/api"
 
+# Connection pool and background worker sizes, shared by all browser tabs
+MAX_CONNECTIONS = 16
+MAX_BACKGROUND_COMMANDS = 8
+
+# How long cached API metadata stays fresh (seconds)
+HEALTH_TTL = 5
+TOOLS_TTL = 300
+
+# Request timeouts (seconds)
+METADATA_TIMEOUT = 5
+COMMAND_TIMEOUT = 120
+
+@st.cache_resource
+def get_http_session():
+    """A pooled HTTP session kept across reruns so connections are reused"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=MAX_CONNECTIONS)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+@st.cache_resource
+def get_command_executor():
+    """Worker threads for commands that should not block the UI"""
+    return ThreadPoolExecutor(max_workers=MAX_BACKGROUND_COMMANDS, thread_name_prefix="command")
+
+@st.cache_data(ttl=TOOLS_TTL, show_spinner=False)
+def fetch_tools():
+    """Fetch available tools from the API. Failures raise, so they are not cached"""
+    response = get_http_session().get(f"{API_URL}/tools", timeout=METADATA_TIMEOUT)
+    response.raise_for_status()
+    return response.json()['tools']
+
 def get_tools():
     """Fetch available tools from the API"""
     try:
-        response = requests.get(f"{API_URL}/tools")
-        if response.status_code == 200:
-            return response.json()['tools']
-        else:
-            st.error(f"Error fetching tools: {response.status_code}")
-            return []
+        return fetch_tools()
+    except requests.HTTPError as e:
+        st.error(f"Error fetching tools: {e.response.status_code}")
+        return []
     except Exception as e:
         st.error(f"Error connecting to API: {str(e)}")
         return []
 
-def send_command(command):
+def send_command(command, session=None):
     """Send a command to the API and return the response"""
     try:
         payload = {"command": command}
-        response = requests.post(f"{API_URL}/command", json=payload)
+        session = session or get_http_session()
+        response = session.post(f"{API_URL}/command", json=payload, timeout=COMMAND_TIMEOUT)
         
         if response.status_code == 200:
             return response.json()
@@ -32,14 +66,58 @@ def send_command(command):
     except Exception as e:
         return {"error": f"Exception occurred: {str(e)}"}
 
+@st.cache_data(ttl=HEALTH_TTL, show_spinner=False)
 def check_api_health():
     """Check if the API is running"""
     try:
-        response = requests.get(f"{API_URL}/health")
+        response = get_http_session().get(f"{API_URL}/health", timeout=METADATA_TIMEOUT)
         return response.status_code == 200
     except:
         return False
 
+def make_history_item(command, result):
+    """Build a command history entry from an API result"""
+    timestamp = datetime.now().strftime("%H:%M:%S")
+    
+    # Check if there was an error
+    if "error" in result:
+        return {
+            "timestamp": timestamp,
+            "command": command,
+            "error": result.get("error")
+        }
+    return {
+        "timestamp": timestamp,
+        "command": command,
+        "final_response": result.get("final_response", "No response provided"),
+        "process_details": result.get("process_details", [])
+    }
+
+def submit_command(command):
+    """Send a command on a worker thread; its result is collected on a later rerun"""
+    # Worker threads have no script context, so hand them the session directly
+    future = get_command_executor().submit(send_command, command, get_http_session())
+    st.session_state.pending_commands.append({"command": command, "future": future})
+
+def collect_finished_commands():
+    """Move finished background commands into the command history"""
+    still_pending = []
+    for pending in st.session_state.pending_commands:
+        if pending["future"].done():
+            result = pending["future"].result()
+            st.session_state.command_history.append(make_history_item(pending["command"], result))
+        else:
+            still_pending.append(pending)
+    st.session_state.pending_commands = still_pending
+
+# Add command history and pending commands to session state if they don't exist
+if 'command_history' not in st.session_state:
+    st.session_state.command_history = []
+if 'pending_commands' not in st.session_state:
+    st.session_state.pending_commands = []
+
+collect_finished_commands()
+
 # App title and description
 st.title("Text Editor Accessibility Assistant")
 st.markdown("""
@@ -67,38 +145,22 @@ with tab1:
     # Command input
     command = st.text_input("Enter your command:", placeholder="e.g., Read the current paragraph")
     
-    # Add command history to session state if it doesn't exist
-    if 'command_history' not in st.session_state:
-        st.session_state.command_history = []
-    
     # Process command button
     if st.button("Send Command") and command:
         with st.spinner("Processing command..."):
             result = send_command(command)
-            
-            # Add to history with timestamp
-            timestamp = datetime.now().strftime("%H:%M:%S")
-            
-            # Check if there was an error
-            if "error" in result:
-                history_item = {
-                    "timestamp": timestamp,
-                    "command": command,
-                    "error": result.get("error")
-                }
-            else:
-                history_item = {
-                    "timestamp": timestamp,
-                    "command": command,
-                    "final_response": result.get("final_response", "No response provided"),
-                    "process_details": result.get("process_details", [])
-                }
-            
-            st.session_state.command_history.append(history_item)
+            st.session_state.command_history.append(make_history_item(command, result))
         
         # Clear input after sending
         st.rerun()
     
+    # Commands still running in the background
+    if st.session_state.pending_commands:
+        st.info("Running in the background: " + ", ".join(
+            f"'{pending['command']}'" for pending in st.session_state.pending_commands))
+        if st.button("Refresh Results"):
+            st.rerun()
+    
     # Display command history
     if st.session_state.command_history:
         st.subheader("Command History")
@@ -146,28 +208,7 @@ with tab1:
                 
                 # Add a button to repeat this command
                 if st.button("Repeat Command", key=f"repeat_{i}"):
-                    with st.spinner("Processing command..."):
-                        result = send_command(item['command'])
-                        
-                        # Add to history with timestamp
-                        timestamp = datetime.now().strftime("%H:%M:%S")
-                        
-                        # Check if there was an error
-                        if "error" in result:
-                            history_item = {
-                                "timestamp": timestamp,
-                                "command": item['command'],
-                                "error": result.get("error")
-                            }
-                        else:
-                            history_item = {
-                                "timestamp": timestamp,
-                                "command": item['command'],
-                                "final_response": result.get("final_response", "No response provided"),
-                                "process_details": result.get("process_details", [])
-                            }
-                        
-                        st.session_state.command_history.append(history_item)
+                    submit_command(item['command'])
                     
                     # Update UI
                     st.rerun()
@@ -225,31 +266,9 @@ with tab2:
                 st.markdown(f"• {cmd}")
             with col2:
                 if st.button("Try", key=f"try_{category}_{i}"):
-                    with st.spinner("Processing command..."):
-                        result = send_command(cmd)
-                        
-                        # Add to history with timestamp
-                        timestamp = datetime.now().strftime("%H:%M:%S")
-                        
-                        # Check if there was an error
-                        if "error" in result:
-                            history_item = {
-                                "timestamp": timestamp,
-                                "command": cmd,
-                                "error": result.get("error")
-                            }
-                        else:
-                            history_item = {
-                                "timestamp": timestamp,
-                                "command": cmd,
-                                "final_response": result.get("final_response", "No response provided"),
-                                "process_details": result.get("process_details", [])
-                            }
-                        
-                        st.session_state.command_history.append(history_item)
+                    submit_command(cmd)
                     
-                    # Show the output immediately and switch to the command tab
-                    tab1.button("See result in Command Interface")
+                    # The result shows up in the Command Interface tab once it is ready
                     st.rerun()
 
 # Tab 3: Available Tools
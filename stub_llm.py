@@ -0,0 +1,89 @@
+"""Deterministic stand-in for the OpenAI chat model.
+
+``StubChatModel`` plugs into ``create_react_agent`` like ``ChatOpenAI`` but
+picks a tool with simple keyword rules instead of calling an API. It is meant
+for load tests and offline runs, where what matters is exercising the server,
+the agent graph and the tools with realistic timing, not the quality of the
+answers. ``latency`` adds a fixed delay per model call to simulate the LLM.
+"""
+import re
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+# (keyword pattern, tool name, tool arguments), first match wins
+KEYWORD_RULES: List[Tuple[str, str, Dict[str, Any]]] = [
+    (r"\b(undo|redo)\b", "history_action", {"action": "{0}"}),
+    (r"\breplace\b", "edit_text", {"action": "replace", "text_to_replace": "teh",
+                                   "replacement_text": "the", "scope": "all"}),
+    (r"\b(copy|cut|paste)\b", "clipboard_action", {"action": "{0}"}),
+    (r"\b(bold|italic|underline)\b", "apply_formatting", {"format_type": "{0}", "action": "toggle"}),
+    (r"\bheading level (\d)\b", "apply_formatting", {"format_type": "heading", "value": "{0}"}),
+    (r"\bfind\b", "find_text", {"search_direction": "new", "text_to_find": "accessibility"}),
+    (r"\bselect\b", "modify_selection", {"action": "select", "unit": "line"}),
+    (r"\b(delete|insert)\b", "edit_text", {"action": "{0}", "unit": "word", "direction": "previous",
+                                          "text_to_insert": "text"}),
+    (r"\b(move|go to|next|previous)\b", "move_cursor", {"destination_type": "heading", "direction": "next"}),
+    (r"\bread\b", "read_text", {"unit": "paragraph", "direction": "current"}),
+    (r"\b(save|open|close)\b", "manage_file", {"action": "{0}", "filename": "report.txt"}),
+    (r"\b(speed|voice|spell)\b", "control_tts", {"action": "set_speed", "value": 1.5}),
+    (r"\btime\b", "get_current_time", {}),
+    (r"(\d+)\s*(?:times|\*)\s*(\d+)", "calculator", {"expression": "{0}*{1}"}),
+    (r"\b(weather|search)\b", "search_web", {"query": "{0}"}),
+    (r"\b(status|where am i|unsaved)\b", "report_status", {"query": "cursor_position"}),
+]
+FALLBACK_TOOL = ("get_help", {"topic": "commands"})
+
+
+def choose_tool_call(command: str) -> Tuple[str, Dict[str, Any]]:
+    """Pick a tool and arguments for a command using ``KEYWORD_RULES``."""
+    text = command.lower()
+    for pattern, name, args in KEYWORD_RULES:
+        match = re.search(pattern, text)
+        if match:
+            groups = match.groups() or (match.group(0),)
+            return name, {
+                key: value.format(*groups) if isinstance(value, str) else value
+                for key, value in args.items()
+            }
+    return FALLBACK_TOOL
+
+
+class StubChatModel(BaseChatModel):
+    """Chat model that calls one keyword-selected tool, then summarizes its result."""
+
+    latency: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub"
+
+    def bind_tools(self, tools: Sequence[Any], **kwargs: Any) -> "StubChatModel":
+        return self
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any
+    ) -> ChatResult:
+        if self.latency:
+            time.sleep(self.latency)
+
+        if messages and isinstance(messages[-1], ToolMessage):
+            message = AIMessage(content=str(messages[-1].content))
+        else:
+            command = next(
+                (m.content for m in reversed(messages) if isinstance(m, HumanMessage)), ""
+            )
+            name, args = choose_tool_call(str(command))
+            message = AIMessage(
+                content="",
+                tool_calls=[{"name": name, "args": args, "id": f"call_{uuid.uuid4().hex[:12]}"}]
+            )
+        return ChatResult(generations=[ChatGeneration(message=message)])
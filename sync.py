@@ -0,0 +1,190 @@
+"""Delta sync for documents shared by several clients.
+
+Every client of a session (the Streamlit UI, a screen reader, a second
+device) edits the same ``Document``. An ``OperationLog`` turns each change to
+that document into a numbered operation:
+
+- ``{"seq": 7, "op": "edit", "edits": [[start, end, text], ...]}`` for text
+  changes (edit_text, cut and paste, undo and redo). Edits are sorted and in
+  offsets of the text before the operation; applying them back to front
+  reproduces it.
+- ``{"seq": 8, "op": "format", "action": "apply", "start": 0, "end": 5,
+  "name": "bold", "value": null}`` for formatting changes (``action`` is
+  apply, remove or clear).
+
+Subscribers keep a position in the log and receive the operations after it
+in batches: a batch collects everything that arrived within
+``BATCH_INTERVAL`` and merges runs of adjacent inserts (typing) into one.
+Edits carry no formatting: inserted text takes the formats of the character
+before it (or after it, at the start of the document), and clients applying
+edits must do the same to keep their spans in step (see ``formatting.py``).
+When undo or redo brings back text with formats of its own, ``format``
+operations restoring them follow the edit.
+
+Only the last ``MAX_TAIL_OPS`` operations are kept; a client that is further
+behind, or joins late, gets a snapshot (text, formatting spans and the
+sequence number it reflects) and continues from there. Positions from another
+log (every log has a ``log_id``), e.g. from before the session was recreated,
+also lead to a snapshot. Work per subscriber is proportional to the
+operations it receives, not to the document size.
+
+The log is created on first use, so documents nobody subscribes to pay
+nothing for it.
+"""
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from document import Document, Edit
+from formatting import FormatChange, get_formatting
+
+MAX_TAIL_OPS = 1000
+BATCH_INTERVAL = 0.05
+
+Operation = Dict[str, Any]
+
+
+def coalesce(operations: List[Operation]) -> List[Operation]:
+    """Merge runs of single inserts where each continues where the previous one ended."""
+    merged: List[Operation] = []
+    for operation in operations:
+        previous = merged[-1] if merged else None
+        if previous is not None and _is_insert(previous) and _is_insert(operation):
+            start, _, text = previous["edits"][0]
+            position, _, more = operation["edits"][0]
+            if position == start + len(text):
+                merged[-1] = {"seq": operation["seq"], "op": "edit", "edits": [[start, start, text + more]]}
+                continue
+        merged.append(operation)
+    return merged
+
+
+def _is_insert(operation: Operation) -> bool:
+    if operation["op"] != "edit" or len(operation["edits"]) != 1:
+        return False
+    start, end, _ = operation["edits"][0]
+    return start == end
+
+
+class OperationLog:
+    """Numbered changes of one document, with a bounded tail for subscribers.
+
+    Snapshots take the document's own lock, which is held only while a single
+    change is applied, so the text, spans and sequence number agree without
+    waiting for a running command.
+    """
+
+    def __init__(self, document: Document):
+        self.document = document
+        self.id = uuid.uuid4().hex[:8]
+        self.seq = 0
+        self.tail: Deque[Operation] = deque(maxlen=MAX_TAIL_OPS)
+        self._condition = threading.Condition()
+        # Format changes reported while an edit is applied, which belong after it in the log
+        self._pending: List[Operation] = []
+        # The formatting index listens to the document before this log does
+        self.formatting = get_formatting(document)
+        document.add_listener(self.on_edits)
+        self.formatting.add_listener(self.on_format_change)
+
+    def on_edits(self, edits: List[Edit]) -> None:
+        self._append({"op": "edit", "edits": [list(edit) for edit in edits]})
+        pending, self._pending = self._pending, []
+        for operation in pending:
+            self._append(operation)
+
+    def on_format_change(self, change: FormatChange) -> None:
+        action, start, end, name, value = change
+        operation = {"op": "format", "action": action, "start": start, "end": end, "name": name, "value": value}
+        if self.document.change_state is not None:
+            self._pending.append(operation)
+        else:
+            self._append(operation)
+
+    def _append(self, operation: Operation) -> None:
+        with self._condition:
+            self.seq += 1
+            operation["seq"] = self.seq
+            self.tail.append(operation)
+            self._condition.notify_all()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """The whole document state and the sequence number it reflects."""
+        with self.document.lock:
+            with self._condition:
+                seq = self.seq
+            spans = [
+                [start, end, sorted([name, value] for name, value in formats)]
+                for start, end, formats in self.formatting.spans()
+                if formats
+            ]
+            return {"type": "snapshot", "log_id": self.id, "seq": seq, "text": self.document.text,
+                    "formatting": spans}
+
+    def operations_since(self, seq: Optional[int]) -> Optional[List[Operation]]:
+        """Operations after ``seq``, or None if they are no longer in the tail."""
+        with self._condition:
+            if seq is None or seq > self.seq:
+                return None
+            oldest = self.tail[0]["seq"] if self.tail else self.seq + 1
+            if seq + 1 < oldest:
+                return None
+            return [operation for operation in self.tail if operation["seq"] > seq]
+
+    def batch_since(self, seq: Optional[int], log_id: Optional[str] = None) -> Dict[str, Any]:
+        """A batch of coalesced operations after ``seq``, or a snapshot if it is too old or from another log."""
+        operations = self.operations_since(seq) if log_id in (None, self.id) else None
+        if operations is None:
+            return self.snapshot()
+        to_seq = operations[-1]["seq"] if operations else seq
+        return {"type": "batch", "log_id": self.id, "from_seq": seq, "to_seq": to_seq, "ops": coalesce(operations)}
+
+    def wait(self, seq: int, timeout: float) -> bool:
+        """Block until there are operations after ``seq``. False on timeout."""
+        with self._condition:
+            return self._condition.wait_for(lambda: self.seq > seq, timeout)
+
+    def subscribe(self, since: Optional[int] = None, log_id: Optional[str] = None) -> "Subscription":
+        """Start a subscription after ``since``; it begins with a snapshot if that position is unknown."""
+        with self._condition:
+            known = log_id in (None, self.id) and since is not None and since <= self.seq
+        return Subscription(self, since if known else None)
+
+
+class Subscription:
+    """One subscriber's position in an ``OperationLog``."""
+
+    def __init__(self, log: OperationLog, since: Optional[int] = None):
+        self.log = log
+        self.seq = since
+
+    def next_message(self, timeout: float) -> Optional[Dict[str, Any]]:
+        """The next snapshot or batch, or None if nothing happened within ``timeout``."""
+        if self.seq is None:
+            message = self.log.snapshot()
+        else:
+            if not self.log.wait(self.seq, timeout):
+                return None
+            # Let operations that arrive right after this one join the batch
+            time.sleep(BATCH_INTERVAL)
+            message = self.log.batch_since(self.seq)
+        self.seq = message["seq"] if message["type"] == "snapshot" else message["to_seq"]
+        return message
+
+
+def parse_position(position: Optional[str]) -> Tuple[Optional[str], Optional[int]]:
+    """Split a ``log_id:seq`` position (as sent in event ids) into its parts."""
+    if not position:
+        return None, None
+    log_id, _, seq = position.rpartition(":")
+    try:
+        return log_id or None, int(seq)
+    except ValueError:
+        return None, None
+
+
+def get_operation_log(document: Document) -> OperationLog:
+    """Return the operation log of ``document``, creating it on first use."""
+    return document.index("sync", OperationLog)
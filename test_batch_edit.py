@@ -0,0 +1,151 @@
+"""Tests for batch edits: the batch_edit tool and its fast-path phrasings."""
+import pytest
+
+import completion
+import outline
+from completion import CompletionIndex, get_completions
+from document import Document, compute_line_starts, use_document
+from fast_path import interpret
+from outline import KINDS, OutlineIndex, get_outline
+from sessions import sessions
+from tools import batch_edit
+
+
+def run(document, **args):
+    with use_document(document):
+        return batch_edit.invoke(args)
+
+
+def run_command(document, command):
+    interpretation = interpret(command, document)
+    assert interpretation is not None
+    with use_document(document):
+        for tool_call in interpretation.tool_calls:
+            assert tool_call["name"] == "batch_edit"
+            batch_edit.invoke(tool_call["args"])
+
+
+def test_every_line_means_the_document_even_with_a_selection():
+    document = Document("one two\nthree four\nfive six")
+    document.selection = (0, 7)
+    run_command(document, "delete the first word of every line")
+    assert document.text == "two\nfour\nsix"
+
+    document = Document("a\nb")
+    document.selection = (0, 1)
+    run_command(document, "add '- ' at the start of every line")
+    assert document.text == "- a\n- b"
+
+
+def test_in_the_selection_limits_the_lines():
+    document = Document("one two\nthree four\nfive six")
+    document.selection = (0, 7)
+    run_command(document, "delete the first word of every line in the selection")
+    assert document.text == "two\nthree four\nfive six"
+
+
+@pytest.mark.parametrize("text, selection, expected", [
+    ("a\nb\nc", (2, 5), "a"),
+    ("a\nb\nc", (0, 3), "c"),
+    ("a\nb\nc", (2, 3), "a\nc"),
+    ("a\nb\nc", (0, 5), ""),
+    ("a\nb\nc\n", (2, 5), "a\n"),
+    ("a\nb\nc", (4, 5), "a\nb"),
+])
+def test_deleting_lines(text, selection, expected):
+    document = Document(text)
+    document.selection = selection
+    run(document, action="delete", target="line", scope="selection")
+    assert document.text == expected
+    document.undo()
+    assert document.text == text
+
+
+def assert_indexes_match_a_rebuild(document):
+    assert document.line_starts == compute_line_starts(document.text)
+    rebuilt = OutlineIndex(document.text)
+    for kind in KINDS:
+        assert get_outline(document).entries[kind].offsets() == rebuilt.entries[kind].offsets(), kind
+        assert get_outline(document).entries[kind].values() == rebuilt.entries[kind].values(), kind
+    assert get_completions(document).counts == CompletionIndex(document.text).counts
+    assert get_completions(document).words == CompletionIndex(document.text).words
+
+
+def test_large_batches_take_the_sweep_paths(monkeypatch):
+    sweeps = []
+    splice_all = outline.Entries.splice_all
+    monkeypatch.setattr(outline.Entries, "splice_all", lambda self, *args: sweeps.append(1) or splice_all(self, *args))
+
+    # Two blank lines between items keep each edited line a separate outline region
+    lines = [f"- item{i} (word{i})" for i in range(outline.MAX_LOCAL_SPLICES * 3)]
+    document = Document("\n\n\n".join(lines))
+    get_outline(document), get_completions(document)
+    run(document, action="replace", target="match", scope="document", match_text="(word", text="[(word")
+    assert sweeps
+    assert_indexes_match_a_rebuild(document)
+    document.undo()
+    assert_indexes_match_a_rebuild(document)
+
+    # More distinct words change than are inserted one by one
+    lines = [f"word{i}" for i in range(completion.MAX_INCREMENTAL_WORDS + 10)]
+    document = Document("\n".join(lines))
+    get_outline(document), get_completions(document)
+    assert get_completions(document).complete("wo", 3) == ["word0", "word1", "word10"]
+    run(document, action="insert", target="line_start", scope="document", text="# ")
+    assert len(get_outline(document).entries["heading"]) == len(lines)
+    run(document, action="delete", target="first_word", scope="document")
+    assert_indexes_match_a_rebuild(document)
+    assert get_completions(document).counts == {}
+    assert get_completions(document).complete("wo") == []
+
+
+def test_multi_cursor_typing_keeps_indexes_in_step():
+    document = Document("\n".join(f"line {i} (" for i in range(100)))
+    get_outline(document), get_completions(document)
+    run(document, action="add_cursors", target="line_end", scope="document")
+    assert len(document.all_cursors()) == 100
+    for character in "word)":
+        document.insert_at_cursors(character)
+    assert document.text.startswith("line 0 (word)\nline 1 (word)")
+    assert_indexes_match_a_rebuild(document)
+    assert get_outline(document).matching_bracket(document.text.index("(")) == (7, 12)
+    assert get_completions(document).counts["word"] == 100
+
+
+def edits_url(session_id):
+    return f"/api/sessions/{session_id}/edits"
+
+
+def test_edits_endpoint_applies_one_undoable_batch(api_client, session_id):
+    response = api_client.post(edits_url(session_id), json={"edits": [[0, 0, "one two three"]]})
+    assert response.get_json() == {"applied": 1, "length": 13, "cursors": [13]}
+    response = api_client.post(edits_url(session_id), json={"edits": [[8, 13, "3"], [0, 3, "1"]],
+                                                            "cursors": [4, 13]})
+    assert response.status_code == 200
+    # Cursors are given in the text before the edits, then moved by them
+    assert response.get_json() == {"applied": 2, "length": 7, "cursors": [2, 7]}
+    document = sessions.get(session_id).document
+    assert document.text == "1 two 3"
+    document.undo()
+    assert document.text == "one two three"
+
+
+@pytest.mark.parametrize("body", [
+    {},
+    {"edits": "0,0,x"},
+    {"edits": [[0, 0]]},
+    {"edits": [["a", 1, "x"]]},
+    {"edits": [[0, 0, "x"]], "cursors": ["a"]},
+    {"edits": [[0, 2, "x"], [1, 3, "y"]]},
+    {"edits": [[0, 99, "x"]]},
+    {"edits": [[0, 0, "x"]], "cursors": [99]},
+])
+def test_edits_endpoint_rejects_bad_edits(api_client, session_id, body):
+    api_client.post(edits_url(session_id), json={"edits": [[0, 0, "text"]]})
+    assert api_client.post(edits_url(session_id), json={"edits": [], "cursors": [2]}).status_code == 200
+    response = api_client.post(edits_url(session_id), json=body)
+    assert response.status_code == 400
+    assert "error" in response.get_json()
+    document = sessions.get(session_id).document
+    assert document.text == "text"
+    assert document.all_cursors() == [2]
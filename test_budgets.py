@@ -0,0 +1,53 @@
+"""Tests for per-command budgets and their request validation."""
+import time
+
+import pytest
+
+import budgets
+from budgets import STEPS, BudgetExceeded, CommandBudget, invalid_limit
+
+
+def test_limits_default_and_cap():
+    budget = CommandBudget()
+    assert budget.max_steps == budgets.MAX_AGENT_STEPS
+    assert budget.max_tool_calls == budgets.MAX_TOOL_CALLS
+    assert budget.remaining() <= budgets.DEFAULT_DEADLINE_MS / 1000.0
+    loose = CommandBudget(budgets.MAX_DEADLINE_MS * 10, budgets.MAX_AGENT_STEPS + 5, budgets.MAX_TOOL_CALLS + 5)
+    assert loose.max_steps == budgets.MAX_AGENT_STEPS
+    assert loose.max_tool_calls == budgets.MAX_TOOL_CALLS
+    assert loose.remaining() <= budgets.MAX_DEADLINE_MS / 1000.0
+
+
+def test_steps_run_out():
+    budget = CommandBudget(max_steps=2)
+    budget.start_step()
+    budget.start_step()
+    with pytest.raises(BudgetExceeded) as raised:
+        budget.start_step()
+    assert raised.value.reason == STEPS
+    assert budget.exhausted == STEPS
+
+
+def test_deadline_passes():
+    budget = CommandBudget(deadline_ms=1)
+    time.sleep(0.01)
+    assert budget.remaining() == 0.0
+    with pytest.raises(BudgetExceeded):
+        budget.start_tool_call()
+
+
+@pytest.mark.parametrize("value", ["5000", 0, -1, 1.5, True, [3]])
+def test_invalid_limits(value):
+    assert invalid_limit({"command": "undo", "max_steps": value}) == "max_steps"
+
+
+def test_valid_limits():
+    assert invalid_limit({"command": "undo"}) is None
+    assert invalid_limit({"deadline_ms": 5000, "max_steps": 1, "max_tool_calls": None}) is None
+
+
+@pytest.mark.parametrize("field, value", [("deadline_ms", "soon"), ("max_steps", 0), ("max_tool_calls", -2)])
+def test_command_rejects_invalid_limits(api_client, field, value):
+    response = api_client.post("/api/command", json={"command": "undo", field: value})
+    assert response.status_code == 400
+    assert field in response.get_json()["error"]
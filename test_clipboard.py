@@ -0,0 +1,79 @@
+"""Tests for the clipboard ring of lazy text references."""
+import random
+
+import pytest
+
+from document import Document, use_document
+from clipboard import get_clipboard
+from test_document import random_batch
+from tools import clipboard_action
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_references_keep_their_text_through_random_edits(seed):
+    rng = random.Random(seed)
+    document = Document("".join(rng.choice("abc \n") for _ in range(300)))
+    clipboard = get_clipboard(document)
+    copied = []
+    for _ in range(60):
+        if len(document.text) < 50:
+            document.apply_edits([(len(document.text), len(document.text), "abc \n" * 20)])
+        start = rng.randrange(len(document.text))
+        end = min(len(document.text), start + rng.randrange(1, 20))
+        clipboard.copy(start, end)
+        copied.insert(0, document.text[start:end])
+        del copied[clipboard.max_entries:]
+        document.apply_edits(random_batch(rng, document.text, rng.randrange(1, 4)))
+        assert [entry.text() for entry in clipboard.entries] == copied
+
+
+def test_untouched_references_are_not_copied():
+    document = Document("alpha beta gamma")
+    clipboard = get_clipboard(document)
+    entry = clipboard.copy(6, 10)
+    document.apply_edits([(0, 0, ">> ")])
+    assert not entry.materialized
+    assert (entry.start, entry.end) == (9, 13)
+    document.apply_edits([(10, 11, "E")])
+    assert entry.materialized
+    assert entry.text() == "beta"
+
+
+def test_cut_and_paste_replaces_the_selection():
+    document = Document("one two three")
+    clipboard = get_clipboard(document)
+    clipboard.cut(3, 7)
+    assert document.text == "one three"
+    document.selection = (4, 9)
+    clipboard.paste()
+    assert document.text == "one  two"
+    assert document.cursor == 8
+    document.undo()
+    document.undo()
+    assert document.text == "one two three"
+
+
+def test_byte_budget_evicts_old_materialized_entries():
+    document = Document("x" * 1000)
+    clipboard = get_clipboard(document)
+    clipboard.max_bytes = 1500
+    for _ in range(3):
+        clipboard.copy(0, 1000)
+    document.apply_edits([(0, 1000, "")])
+    # All three were materialized; only what fits the budget (and always the newest) is kept
+    assert len(clipboard.entries) == 1
+    assert clipboard.export() == "x" * 1000
+
+
+def test_clipboard_tool():
+    document = Document("copy me")
+    with use_document(document):
+        assert clipboard_action.invoke({"action": "copy"}) == "Nothing is selected to copy"
+        assert clipboard_action.invoke({"action": "paste"}) == "Clipboard is empty"
+        document.selection = (0, 4)
+        assert clipboard_action.invoke({"action": "copy"}) == "Copied 4 characters to clipboard"
+        document.selection = None
+        document.cursor = len(document.text)
+        clipboard_action.invoke({"action": "paste"})
+        assert document.text == "copy mecopy"
+        assert clipboard_action.invoke({"action": "history"}) == "Clipboard history: 0: 'copy'"
@@ -0,0 +1,178 @@
+"""Tests for the word completion index and the completion endpoint."""
+import random
+import threading
+import time
+
+import pytest
+
+import completion
+from completion import CompletionIndex, get_completions, word_before
+from document import Document
+
+VOCABULARY = ["alpha", "alphabet", "alpine", "almond", "beta", "better", "bet", "\\alpha", "\\beta",
+              "gamma", "game", "al", "x"]
+PREFIXES = ["a", "al", "alp", "alpha", "b", "be", "bet", "g", "ga", "\\", "\\a", "\\al", "z"]
+
+
+def random_words(rng, count):
+    return " ".join(rng.choice(VOCABULARY) for _ in range(count))
+
+
+def random_word_batch(rng, text, size):
+    """Sorted, non-overlapping random edits that add and remove words, often mid-word."""
+    points = sorted(rng.sample(range(len(text) + 1), min(2 * size, len(text) + 1)))
+    edits = []
+    for start, end in zip(points[::2], points[1::2]):
+        if rng.random() < 0.3:
+            end = start
+        edits.append((start, end, rng.choice(["", " ", "\n", "a", "al", random_words(rng, rng.randrange(1, 4))])))
+    return edits
+
+
+def assert_matches_rebuild(index, text):
+    rebuilt = CompletionIndex(text)
+    assert index.counts == rebuilt.counts
+    assert index.words == rebuilt.words
+    for prefix in PREFIXES:
+        for k in (1, 5, 30):
+            assert index.complete(prefix, k) == rebuilt.complete(prefix, k), (prefix, k)
+
+
+@pytest.mark.parametrize("seed", range(8))
+@pytest.mark.parametrize("max_incremental", [completion.MAX_INCREMENTAL_WORDS, 2])
+def test_incremental_index_matches_a_rebuild(monkeypatch, seed, max_incremental):
+    # A small limit sends most batches down the re-sort path
+    monkeypatch.setattr(completion, "MAX_INCREMENTAL_WORDS", max_incremental)
+    rng = random.Random(seed)
+    document = Document(random_words(rng, 200))
+    index = get_completions(document)
+    for step in range(60):
+        if step % 3 == 0:
+            # Query between edits, so stale ranked lists would show
+            for prefix in PREFIXES:
+                index.complete(prefix, rng.choice([1, 5, 20]))
+        document.apply_edits(random_word_batch(rng, document.text, rng.randrange(1, 6)))
+        if len(document.text) < 100:
+            document.insert(" " + random_words(rng, 50), len(document.text))
+        assert_matches_rebuild(index, document.text)
+
+
+def test_undo_and_single_edits_are_tracked():
+    document = Document("alpha beta")
+    index = get_completions(document)
+    document.insert("bet", 5)
+    assert_matches_rebuild(index, document.text)
+    assert "alphabet" in index.counts and "alpha" not in index.counts
+    document.undo()
+    assert_matches_rebuild(index, document.text)
+    assert index.counts == {"alpha": 1, "beta": 1}
+
+
+def test_ranked_by_frequency_then_alphabetically():
+    index = CompletionIndex("alpine almond alpha alpha almond alpha al")
+    assert index.complete("al") == ["alpha", "almond", "alpine"]
+    assert index.complete("al", 1) == ["alpha"]
+    # The prefix itself is not offered, and short words are not indexed
+    assert index.complete("alpha") == []
+    assert "al" not in index.counts
+    assert index.complete("") == [] and index.complete("a", 0) == []
+
+
+def test_short_prefix_follows_count_changes():
+    document = Document("almond alpine alpine")
+    index = get_completions(document)
+    assert index.complete("a") == ["alpine", "almond"]
+    document.insert(" almond almond", len(document.text))
+    assert index.complete("a") == ["almond", "alpine"]
+    document.apply_edits([(0, 6, "")])
+    document.apply_edits([(0, len(document.text), "alpine")])
+    assert index.complete("a") == ["alpine"]
+
+
+def test_short_prefixes_stay_fast_on_a_large_vocabulary():
+    rng = random.Random(0)
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    text = " ".join("".join(rng.choices(letters, k=rng.randrange(3, 11))) for _ in range(200000))
+    document = Document(text)
+    index = get_completions(document)
+    assert len(index.counts) > 150000
+
+    def median_ms(prefix):
+        timings = []
+        for _ in range(21):
+            started = time.perf_counter()
+            index.complete(prefix, 5)
+            timings.append(time.perf_counter() - started)
+        return sorted(timings)[len(timings) // 2] * 1000
+
+    # Lowering the top words' counts must not fall back to scanning the slice
+    top = index.complete("t", 5)
+    for word in top:
+        start = document.text.index(word + " ")
+        document.apply_edits([(start, start + len(word), "")])
+    assert index.complete("t", 5) == CompletionIndex(document.text).complete("t", 5)
+    for prefix in ("t", "q", "th"):
+        assert median_ms(prefix) < 0.5, prefix
+
+
+def test_latex_commands_follow_the_documents_own():
+    index = CompletionIndex("\\alpha \\alphabetize")
+    results = index.complete("\\al", 5)
+    assert results[:2] == ["\\alpha", "\\alphabetize"]
+    assert "\\alpha" not in results[2:]
+    assert index.complete("\\fr") == ["\\frac"]
+    # Dictionary commands are ordered by popularity
+    assert CompletionIndex("").complete("\\be", 2) == ["\\begin", "\\beta"]
+
+
+def test_word_before():
+    document = Document("some text \\alph")
+    assert word_before(document, 9) == "text"
+    assert word_before(document, 10) == ""
+    assert word_before(document, len(document.text)) == "\\alph"
+    document.cursor = 4
+    assert word_before(document) == "some"
+    assert word_before(Document("a\\beta"), 6) == "\\beta"
+
+
+def test_complete_endpoint(api_client, session_id):
+    text = "alpha alpine alpha al"
+    api_client.post(f"/api/sessions/{session_id}/edits", json={"edits": [[0, 0, text]]})
+    response = api_client.get(f"/api/sessions/{session_id}/complete?offset={len(text)}")
+    assert response.get_json() == {"prefix": "al", "completions": ["alpha", "alpine"]}
+    response = api_client.get(f"/api/sessions/{session_id}/complete?prefix=alp&limit=1")
+    assert response.get_json() == {"prefix": "alp", "completions": ["alpha"]}
+    response = api_client.get(f"/api/sessions/{session_id}/complete?offset=3")
+    assert response.get_json()["prefix"] == "alp"
+    response = api_client.get(f"/api/sessions/{session_id}/complete?prefix=alp&limit=-1")
+    assert response.get_json()["completions"] == []
+    # The index built above follows later edits
+    api_client.post(f"/api/sessions/{session_id}/edits", json={"edits": [[0, 0, "alpine alpine "]]})
+    response = api_client.get(f"/api/sessions/{session_id}/complete?prefix=al")
+    assert response.get_json()["completions"] == ["alpine", "alpha"]
+
+
+def test_first_completion_does_not_wait_for_a_running_command(api_client, session_id):
+    from sessions import sessions
+
+    session = sessions.get(session_id)
+    session.document.apply_edits([(0, 0, "alpha alpine al")])
+    command_running = threading.Event()
+    command_done = threading.Event()
+
+    def command():
+        with session.lock:
+            command_running.set()
+            command_done.wait(10)
+
+    thread = threading.Thread(target=command)
+    thread.start()
+    command_running.wait(5)
+    try:
+        started = time.monotonic()
+        response = api_client.get(f"/api/sessions/{session_id}/complete?prefix=al")
+        assert time.monotonic() - started < 5
+        assert response.get_json()["completions"] == ["alpha", "alpine"]
+    finally:
+        command_done.set()
+        thread.join()
@@ -0,0 +1,164 @@
+"""Tests for the document model: batched edits, line index, offset shifting and undo."""
+import random
+
+import pytest
+
+from document import Document, compute_line_starts, shift_offset, shift_offsets, use_document
+from tools import edit_text
+
+
+def random_batch(rng, text, size):
+    """Sorted, non-overlapping random edits of ``text``."""
+    points = sorted(rng.sample(range(len(text) + 1), min(2 * size, len(text) + 1)))
+    edits = []
+    for start, end in zip(points[::2], points[1::2]):
+        if rng.random() < 0.3:
+            end = start
+        edits.append((start, end, rng.choice(["", "x", "\n", "ab\ncd", "\n\n"])))
+    return edits
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_line_index_matches_a_rebuild_after_random_batches(seed):
+    rng = random.Random(seed)
+    document = Document("\n".join("line %d" % i for i in range(50)))
+    for _ in range(100):
+        document.apply_edits(random_batch(rng, document.text, rng.randrange(1, 6)))
+        assert document.line_starts == compute_line_starts(document.text)
+
+
+def test_batch_is_one_undo_entry_and_notifies_once():
+    document = Document("one two three")
+    calls = []
+    document.add_listener(calls.append)
+    document.apply_edits([(8, 13, "3"), (0, 3, "1")])
+    assert document.text == "1 two 3"
+    assert calls == [[(0, 3, "1"), (8, 13, "3")]]
+    assert document.undo() and document.text == "one two three"
+    assert document.redo() and document.text == "1 two 3"
+    assert not document.redo()
+
+
+def test_overlapping_edits_are_rejected_without_changes():
+    document = Document("abcdef")
+    with pytest.raises(ValueError):
+        document.apply_edits([(0, 3, "x"), (2, 4, "y")])
+    with pytest.raises(ValueError):
+        document.apply_edits([(4, 9, "x")])
+    assert document.text == "abcdef"
+    assert not document.undo()
+
+
+@pytest.mark.parametrize("offset, expected", [
+    (0, 0), (2, 2),    # before the first edit
+    (3, 4),            # at an insertion point: after the inserted text
+    (5, 6),            # the start of a replaced range only moves with earlier edits
+    (6, 6), (7, 6),    # inside a replaced range: the end of the replacement
+    (8, 6), (12, 10),  # after both edits
+])
+def test_shift_offset(offset, expected):
+    edits = [(3, 3, "X"), (5, 8, "")]
+    assert shift_offset(offset, edits) == expected
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_shift_offsets_matches_shift_offset(seed):
+    rng = random.Random(seed)
+    text = "x" * 60
+    for _ in range(50):
+        edits = random_batch(rng, text, rng.randrange(1, 8))
+        offsets = sorted(rng.sample(range(len(text) + 1), 20))
+        assert shift_offsets(offsets, edits) == [shift_offset(offset, edits) for offset in offsets]
+
+
+def test_transaction_is_one_undo_entry_in_original_offsets():
+    document = Document("one two three")
+    calls = []
+    document.add_listener(calls.append)
+    with document.transaction() as transaction:
+        transaction.replace(8, 13, "3")
+        transaction.insert(0, ">")
+        transaction.delete(3, 4)
+        # Nothing is applied until the block exits
+        assert document.text == "one two three"
+    assert len(transaction) == 3
+    assert document.text == ">onetwo 3"
+    assert len(calls) == 1
+    document.undo()
+    assert document.text == "one two three"
+    with pytest.raises(ValueError):
+        transaction.commit()
+
+
+def test_transaction_applies_nothing_when_the_block_raises():
+    document = Document("text")
+    with pytest.raises(RuntimeError):
+        with document.transaction() as transaction:
+            transaction.insert(0, "more ")
+            raise RuntimeError("stop")
+    assert document.text == "text"
+    assert not document.undo()
+    with pytest.raises(ValueError):
+        with document.transaction() as transaction:
+            transaction.replace(0, 3, "a")
+            transaction.replace(2, 4, "b")
+    assert document.text == "text"
+
+
+def test_cursors_follow_edits_and_insert_together():
+    document = Document("ab\ncd\nef")
+    document.set_cursors([6, 0, 3, 3])
+    assert document.cursor == 0 and document.cursors == [3, 6]
+    assert document.insert_at_cursors("- ") == 3
+    assert document.text == "- ab\n- cd\n- ef"
+    assert document.all_cursors() == [2, 7, 12]
+    document.undo()
+    assert document.text == "ab\ncd\nef"
+    with pytest.raises(ValueError):
+        document.set_cursors([0, 99])
+
+
+def test_cursor_and_selection_follow_edits():
+    document = Document("hello world")
+    document.cursor = 6
+    document.selection = (6, 11)
+    document.apply_edits([(0, 0, ">> ")])
+    assert document.cursor == 9
+    assert document.selection == (9, 14)
+
+
+def test_replace_all_is_one_undo_entry():
+    document = Document("teh cat and teh dog; Teh end")
+    assert document.replace_all("teh", "the") == 2
+    assert document.text == "the cat and the dog; Teh end"
+    document.undo()
+    assert document.text == "teh cat and teh dog; Teh end"
+    assert document.replace_all("TEH", "the", case_sensitive=False) == 3
+    assert document.text == "the cat and the dog; the end"
+
+
+def test_replace_all_whole_words_within_a_range():
+    document = Document("cat category cat cat")
+    assert document.replace_all("cat", "dog", whole_word=True, start=4) == 2
+    assert document.text == "cat category dog dog"
+
+
+def test_find_all_cache_is_cleared_by_edits():
+    document = Document("a b a")
+    assert document.find_all("a") == [(0, 1), (4, 5)]
+    document.apply_edits([(2, 3, "a")])
+    assert document.find_all("a") == [(0, 1), (2, 3), (4, 5)]
+
+
+def test_edit_text_replace_scopes():
+    document = Document("teh one teh two teh")
+    document.selection = (4, 15)
+    with use_document(document):
+        assert "1 occurrence" in edit_text.invoke({"action": "replace", "text_to_replace": "teh",
+                                                   "replacement_text": "the", "scope": "selection"})
+        assert document.text == "teh one the two teh"
+        assert "2 occurrence" in edit_text.invoke({"action": "replace", "text_to_replace": "teh",
+                                                   "replacement_text": "the", "scope": "all"})
+        assert "No occurrences" in edit_text.invoke({"action": "replace", "text_to_replace": "xyz",
+                                                     "replacement_text": "the", "scope": "all"})
+    assert document.text == "the one the two the"
@@ -0,0 +1,68 @@
+"""Tests for the calculator's restricted expression evaluator."""
+import math
+
+import pytest
+
+from expression import MAX_STEPS, ExpressionError, compile_expression, evaluate, evaluate_many
+from tools import calculator
+
+
+@pytest.mark.parametrize("expression, expected", [
+    ("2 + 3 * 4", 14),
+    ("(2 + 3) * 4", 20),
+    ("7 // 2 + 7 % 2", 4),
+    ("-2 ** 2", -4),
+    ("sqrt(16) + max(1, 5, 3)", 9.0),
+    ("round(pi, 2)", 3.14),
+    ("round(12345, -2)", 12300),
+    ("round(2.5)", 2),
+    ("2 ** 10", 1024),
+])
+def test_arithmetic(expression, expected):
+    assert evaluate(expression) == expected
+
+
+@pytest.mark.parametrize("expression", [
+    "__import__('os').system('true')",
+    "open('x')",
+    "(1).__class__",
+    "[1, 2]",
+    "'text'",
+    "True + 1",
+    "x if 1 else 2",
+    "lambda: 1",
+    "sqrt",
+    "round(2.5, ndigits=1)",
+    "1 +",
+])
+def test_disallowed_syntax_is_rejected(expression):
+    with pytest.raises(ExpressionError):
+        evaluate(expression)
+
+
+@pytest.mark.parametrize("expression", ["9 ** 9 ** 9", "2 ** 5000", "10 ** 10 ** 10", "1 + " * 300 + "1", "1" * 600,
+                                        "round(1, -10 ** 8)", "round(1.5, 10 ** 8)"])
+def test_limits(expression):
+    with pytest.raises(ExpressionError):
+        evaluate(expression)
+
+
+def test_variables_and_batches():
+    compiled = compile_expression("a * x + b")
+    assert compiled.variables == ("a", "x", "b")
+    assert compiled.evaluate({"a": 2, "x": 3, "b": 1}) == 7
+    assert evaluate_many("x * x", [{"x": 1}, {"x": 2}, {"x": 3}]) == [1, 4, 9]
+    with pytest.raises(ExpressionError):
+        compiled.evaluate({"a": 1})
+    with pytest.raises(ExpressionError):
+        evaluate_many("x + 1", [{"x": i} for i in range(MAX_STEPS)])
+
+
+def test_compiled_expressions_are_cached():
+    assert compile_expression("1 + 2") is compile_expression("1 + 2")
+
+
+def test_calculator_tool_reports_errors():
+    assert calculator.invoke({"expression": "6 * 7"}) == "The result of 6 * 7 is 42"
+    assert calculator.invoke({"expression": "log(e)"}) == f"The result of log(e) is {math.log(math.e)}"
+    assert calculator.invoke({"expression": "import os"}).startswith("Error evaluating expression")
@@ -0,0 +1,141 @@
+"""Tests for the formatting treap, against a per-character model."""
+import random
+
+import pytest
+
+from document import Document
+from formatting import NO_FORMATS, _runs, get_formatting
+
+
+def check_treap(node):
+    """Heap order on priorities and correct subtree totals. Returns the subtree total."""
+    if node is None:
+        return 0
+    for child in (node.left, node.right):
+        if child is not None:
+            assert child.priority <= node.priority
+    total = check_treap(node.left) + node.length + check_treap(node.right)
+    assert node.total == total
+    return total
+
+
+def per_character(formatting):
+    formats = []
+    for start, end, run in formatting.spans():
+        formats.extend([run] * (end - start))
+    return formats
+
+
+def insert_formats(model, start, end, length):
+    del model[start:end]
+    neighbour = model[start - 1] if start > 0 else (model[start] if model else NO_FORMATS)
+    model[start:start] = [neighbour] * length
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_random_edits_and_formats_match_a_per_character_model(seed):
+    rng = random.Random(seed)
+    document = Document("x" * 200)
+    formatting = get_formatting(document)
+    model = [NO_FORMATS] * 200
+    for _ in range(400):
+        size = len(document.text)
+        start = rng.randrange(size + 1)
+        end = min(size, start + rng.randrange(12))
+        kind = rng.random()
+        if kind < 0.4:
+            text = "y" * rng.randrange(6)
+            document.apply_edits([(start, end, text)])
+            insert_formats(model, start, end, len(text))
+        elif kind < 0.7:
+            name, value = rng.choice([("bold", None), ("italic", None), ("heading", "1"), ("heading", "2")])
+            formatting.apply(start, end, name, value)
+            for offset in range(start, end):
+                model[offset] = frozenset({fmt for fmt in model[offset] if fmt[0] != name} | {(name, value)})
+        elif kind < 0.9:
+            name = rng.choice(["bold", "italic", "heading"])
+            formatting.remove(start, end, name)
+            for offset in range(start, end):
+                model[offset] = frozenset(fmt for fmt in model[offset] if fmt[0] != name)
+        else:
+            formatting.clear(start, end)
+            model[start:end] = [NO_FORMATS] * (end - start)
+        assert check_treap(formatting._root) == len(document.text)
+    assert per_character(formatting) == model
+    # Adjacent runs with equal formats are merged
+    runs = _runs(formatting._root, [])
+    assert all(a.formats != b.formats for a, b in zip(runs, runs[1:]))
+
+
+def test_splits_keep_heap_order():
+    document = Document("a" * 1000)
+    formatting = get_formatting(document)
+    for start in range(0, 1000, 7):
+        formatting.apply(start, start + 3, "bold")
+        check_treap(formatting._root)
+
+
+def test_toggle_and_formats_in():
+    formatting = get_formatting(Document("hello world"))
+    assert formatting.toggle(0, 5, "bold") is True
+    assert ("bold", None) in formatting.formats_in(0, 5)
+    assert formatting.formats_in(0, 6) == NO_FORMATS
+    assert formatting.toggle(0, 5, "bold") is False
+    assert formatting.formats_at(2) == NO_FORMATS
+
+
+def test_undo_and_redo_restore_formats():
+    document = Document("ab cd ef")
+    formatting = get_formatting(document)
+    formatting.apply(3, 5, "bold")
+    formatting.apply(4, 8, "italic")
+    before = per_character(formatting)
+    document.apply_edits([(0, 1, ""), (3, 7, "xy")])
+    # The inserted text took its neighbour's formats
+    assert formatting.formats_in(2, 4) == NO_FORMATS
+    after = per_character(formatting)
+    document.undo()
+    assert document.text == "ab cd ef"
+    assert per_character(formatting) == before
+    document.redo()
+    assert per_character(formatting) == after
+    document.undo()
+    assert per_character(formatting) == before
+
+
+def test_redo_restores_formats_applied_after_the_insert():
+    document = Document("ab")
+    formatting = get_formatting(document)
+    document.insert(" cd", 2)
+    formatting.apply(3, 5, "bold")
+    document.undo()
+    document.redo()
+    assert formatting.formats_in(3, 5) == frozenset({("bold", None)})
+    assert formatting.formats_at(1) == NO_FORMATS
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_undoing_random_edits_restores_every_state(seed):
+    rng = random.Random(seed)
+    document = Document("x" * 100)
+    formatting = get_formatting(document)
+    for _ in range(30):
+        start = rng.randrange(100)
+        formatting.apply(start, min(100, start + rng.randrange(20)), rng.choice(["bold", "italic"]))
+    states = []
+    for _ in range(60):
+        states.append((document.text, per_character(formatting)))
+        edits = []
+        for offset in sorted(rng.sample(range(len(document.text) + 1), min(3, len(document.text) + 1))):
+            if not edits or offset > edits[-1][1]:
+                end = min(len(document.text), offset + rng.randrange(8))
+                edits.append((offset, end, "y" * rng.randrange(6)))
+        document.apply_edits(edits)
+    final = (document.text, per_character(formatting))
+    for state in reversed(states):
+        document.undo()
+        assert (document.text, per_character(formatting)) == state
+        assert check_treap(formatting._root) == len(document.text)
+    for _ in states:
+        document.redo()
+    assert (document.text, per_character(formatting)) == final
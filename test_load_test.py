@@ -0,0 +1,70 @@
+"""Tests for the load test harness: corpus parsing, percentiles and a short run."""
+import pytest
+
+import load_test
+from load_test import LoadTest, format_report, load_corpus, percentile
+
+
+def test_corpus_formats(tmp_path):
+    path = tmp_path / "corpus.txt"
+    path.write_text(
+        "# a comment\n"
+        "\n"
+        "Read the current paragraph\n"
+        "3\tCopy the current line \n"
+        '{"command": "Undo that", "weight": 2}\n'
+        '{"command": "Save the document"}\n',
+        encoding="utf-8",
+    )
+    assert load_corpus(str(path)) == [
+        ("Read the current paragraph", 1.0),
+        ("Copy the current line", 3.0),
+        ("Undo that", 2.0),
+        ("Save the document", 1.0),
+    ]
+
+
+def test_empty_corpus(tmp_path):
+    path = tmp_path / "corpus.txt"
+    path.write_text("# only comments\n\n", encoding="utf-8")
+    with pytest.raises(ValueError):
+        load_corpus(str(path))
+
+
+def test_default_corpus_loads():
+    assert load_corpus(load_test.DEFAULT_CORPUS)
+
+
+def test_percentile_nearest_rank():
+    values = [5, 1, 4, 2, 3]
+    assert percentile([], 50) == 0.0
+    assert percentile(values, 0) == 1
+    assert percentile(values, 50) == 3
+    assert percentile(values, 90) == 5
+    assert percentile(values, 100) == 5
+    assert percentile(list(range(1, 101)), 95) == 95
+
+
+@pytest.mark.parametrize("rate", [0.0, 50.0])
+def test_short_run(monkeypatch, rate):
+    import api
+
+    # start_stub_server swaps the module-level agent; put it back afterwards
+    monkeypatch.setattr(api, "agent", api.agent)
+    monkeypatch.setattr(api, "plan_cache", None)
+    base_url = load_test.start_stub_server()
+    corpus = [("Read the current paragraph", 1.0), ("Copy the current line", 1.0)]
+    test = LoadTest(base_url, corpus, rate=rate, duration=0.5, clients=2, tools_ratio=0.5, timeout=10, seed=1)
+    summary = test.run()
+
+    assert summary["requests"] > 0
+    assert summary["errors"] == 0
+    assert summary["ok"] == summary["requests"]
+    assert summary["offered_rate_rps"] == rate
+    assert set(summary["endpoints"]) <= {"/api/command", "/api/tools"}
+    assert sum(data["requests"] for data in summary["endpoints"].values()) == summary["requests"]
+    for data in summary["endpoints"].values():
+        latency = data["latency_ms"]
+        assert latency["p50"] <= latency["p90"] <= latency["p99"] <= latency["max"]
+    report = format_report(summary)
+    assert "Throughput" in report and "Queueing delay" in report
@@ -0,0 +1,142 @@
+"""Tests for conversation memory and per-session routing of commands."""
+import pytest
+from langchain_core.messages import SystemMessage
+
+import memory
+from document import Document
+from memory import ConversationMemory, estimate_tokens, references_context
+from sessions import SESSION_HEADER, SessionStore, sessions
+
+ADD_X = "add 'x' at the start of every line"
+
+
+def _tokens(messages):
+    return sum(estimate_tokens(str(message.content)) for message in messages)
+
+
+def test_references_context():
+    assert references_context("do that again")
+    assert references_context("Undo it")
+    assert not references_context("Read the current paragraph")
+    # Whole words only
+    assert not references_context("Find the word 'thistle'")
+
+
+def test_old_turns_fold_into_summary():
+    conversation = ConversationMemory(max_turns=2)
+    for i in range(5):
+        conversation.add_turn(f"command {i}", f"response {i}", [{"name": "tool", "args": {"n": i}}])
+    assert len(conversation) == 5
+    assert [turn.command for turn in conversation.turns] == ["command 3", "command 4"]
+    summary = conversation.summary()
+    assert "Earlier commands in this session: 3" in summary
+    assert "'command 0'; 'command 1'; 'command 2'" in summary
+    assert "tool(n=4)" in summary
+
+
+def test_summary_describes_document():
+    document = Document("one\ntwo")
+    document.cursor = 5
+    document.selection = (4, 7)
+    summary = ConversationMemory().summary(document)
+    assert "2 lines, 7 characters" in summary
+    assert "3 characters selected" in summary
+
+
+def test_messages_stay_within_budget():
+    conversation = ConversationMemory(max_turns=50, token_budget=300)
+    for i in range(50):
+        conversation.add_turn(f"command {i} " + "word " * 20, "done " * 40, [])
+    messages = conversation.build_messages(Document("text"), "next command")
+    assert _tokens(messages) <= 300
+    assert isinstance(messages[0], SystemMessage)
+    # Whatever fits is the newest turns, in order
+    assert messages[-2].content.startswith("command 49 ")
+    assert messages[1].content.startswith("command ")
+
+
+@pytest.mark.parametrize("command_chars", [10, 3000, 4790, 4800, 5000])
+def test_budget_holds_for_oversized_commands_and_arguments(command_chars):
+    conversation = ConversationMemory()
+    conversation.add_turn("insert the report", "Inserted", [{"name": "edit_text", "args": {"text_to_insert": "x" * 40000}}])
+    for i in range(10):
+        conversation.add_turn(f"command {i} " + "y" * 2000, "done", [{"name": "read_text", "args": {"unit": "z" * 500}}])
+    command = "c" * command_chars
+    messages = conversation.build_messages(Document("text"), command)
+    # The history only gets what the command leaves of the budget
+    assert _tokens(messages) <= max(0, conversation.token_budget - estimate_tokens(command))
+    for message in messages:
+        assert "x" * (memory.MAX_ARGUMENT_CHARS + 1) not in message.content
+
+
+def test_tool_arguments_are_shortened():
+    call = memory.format_tool_call({"name": "edit_text", "args": {"text_to_insert": "x" * 1000, "unit": "word"}})
+    assert len(call) < 2 * memory.MAX_ARGUMENT_CHARS + 40
+    assert call.endswith(", unit='word')")
+
+
+def test_truncate_respects_tiny_limits():
+    assert memory._truncate("abcdef", 3) == "abc"
+    assert memory._truncate("abcdef", 0) == ""
+    assert memory._truncate("abcdef", -5) == ""
+    assert memory._truncate("abcdef", 5) == "ab..."
+    assert memory._truncate("abc", 3) == "abc"
+
+
+def test_long_responses_are_truncated():
+    conversation = ConversationMemory()
+    conversation.add_turn("read", "x" * 5000, [])
+    response = conversation.build_messages()[-1].content
+    assert len(response) == memory.MAX_RESPONSE_CHARS
+    assert response.endswith("...")
+
+
+def test_store_evicts_least_recently_used():
+    store = SessionStore(max_sessions=2)
+    first = store.get("a")
+    store.get("b")
+    assert store.get("a") is first
+    store.get("c")
+    assert store.find("b") is None
+    assert store.find("a") is first and len(store) == 2
+
+
+def _snapshot(api_client, session_id):
+    return api_client.get(f"/api/sessions/{session_id}/snapshot").get_json()["text"]
+
+
+def test_sessions_get_their_own_document_and_memory(api_client, session_id):
+    other = session_id + "-other"
+    response = api_client.post("/api/command", json={"command": ADD_X, "session_id": session_id})
+    assert response.status_code == 200
+    assert response.get_json()["session_id"] == session_id
+    response = api_client.post("/api/command", json={"command": ADD_X}, headers={SESSION_HEADER: session_id})
+    assert response.get_json()["session_id"] == session_id
+    response = api_client.post("/api/command", json={"command": ADD_X}, headers={SESSION_HEADER: other})
+    assert response.get_json()["session_id"] == other
+
+    assert _snapshot(api_client, session_id) == "xx"
+    assert _snapshot(api_client, other) == "x"
+    assert len(sessions.get(session_id).memory) == 2
+    assert len(sessions.get(other).memory) == 1
+
+
+def test_body_session_wins_over_header(api_client, session_id):
+    other = session_id + "-other"
+    response = api_client.post("/api/command", json={"command": ADD_X, "session_id": session_id},
+                               headers={SESSION_HEADER: other})
+    assert response.get_json()["session_id"] == session_id
+    assert _snapshot(api_client, session_id) == "x"
+    assert sessions.find(other) is None
+
+
+def test_commands_without_session_have_no_memory(api_client):
+    response = api_client.post("/api/command", json={"command": ADD_X})
+    assert response.status_code == 200
+    assert "session_id" not in response.get_json()
+
+
+def test_missing_command_is_rejected(api_client, session_id):
+    response = api_client.post("/api/command", json={"session_id": session_id})
+    assert response.status_code == 400
+    assert sessions.find(session_id) is None
@@ -0,0 +1,159 @@
+"""Tests for the outline index and the navigation built on it."""
+import random
+
+import pytest
+
+import outline
+from document import Document, use_document
+from outline import KINDS, OutlineIndex, get_outline
+from tools import move_cursor, read_text
+
+LINES = ["# Title", "## Part", "### Deep", "\\section{Intro}", "\\subsection*{More}", "- item", "  * nested",
+         "1. first", "\\item latex", "| a | b |", "| - | - |", "\\begin{tabular}{cc}", "see [docs](url)",
+         "\\href{http://x.org}{x}", "https://example.com/a", "f(a[b]{c})", "\\{ escaped \\}", "plain text", ""]
+PIECES = ["", "\n", "x", "(", ")", "[", "]", "{", "}", "\\", "# ", "- ", "|", "\n| c |\n", "[a](b)"]
+
+
+def random_text(rng, lines):
+    return "\n".join(rng.choice(LINES) for _ in range(lines))
+
+
+def random_outline_batch(rng, text, size):
+    """Sorted, non-overlapping random edits of ``text`` that add and remove outline elements."""
+    points = sorted(rng.sample(range(len(text) + 1), min(2 * size, len(text) + 1)))
+    edits = []
+    for start, end in zip(points[::2], points[1::2]):
+        if rng.random() < 0.3:
+            end = start
+        replacement = rng.choice(PIECES) if rng.random() < 0.7 else "\n" + random_text(rng, 2) + "\n"
+        edits.append((start, end, replacement))
+    return edits
+
+
+def assert_matches_rebuild(index, text):
+    rebuilt = OutlineIndex(text)
+    for kind in KINDS:
+        entries = index.entries[kind]
+        assert entries.offsets() == rebuilt.entries[kind].offsets(), kind
+        assert entries.values() == rebuilt.entries[kind].values(), kind
+        assert len(entries) == len(rebuilt.entries[kind])
+        assert [entries.offset(position) for position in range(len(entries))] == entries.offsets()
+    for offset in rebuilt.entries["bracket"].offsets():
+        assert index.matching_bracket(offset) == rebuilt.matching_bracket(offset), offset
+
+
+@pytest.mark.parametrize("seed", range(8))
+@pytest.mark.parametrize("max_local_splices", [outline.MAX_LOCAL_SPLICES, 2])
+def test_incremental_index_matches_a_rebuild(monkeypatch, seed, max_local_splices):
+    # Small blocks, so splices cross block boundaries; a small splice limit sends most batches through splice_all
+    monkeypatch.setattr(outline, "BLOCK_SIZE", 4)
+    monkeypatch.setattr(outline, "MAX_LOCAL_SPLICES", max_local_splices)
+    rng = random.Random(seed)
+    document = Document(random_text(rng, 80))
+    index = get_outline(document)
+    for step in range(60):
+        if step % 4 == 0:
+            # Pair the brackets, so edits that keep them have to keep the pairing valid
+            index.matching_bracket(index.edge("bracket", "start") or 0)
+        document.apply_edits(random_outline_batch(rng, document.text, rng.randrange(1, 9)))
+        if len(document.text) < 200:
+            document.insert("\n" + random_text(rng, 20), len(document.text))
+        assert_matches_rebuild(index, document.text)
+
+
+def test_undo_is_tracked():
+    document = Document("# One\n\ntext\n")
+    index = get_outline(document)
+    document.insert("## Two\n", len(document.text))
+    assert index.entries["heading"].values() == [1, 2]
+    document.undo()
+    assert_matches_rebuild(index, document.text)
+    assert index.entries["heading"].values() == [1]
+
+
+def test_parsed_elements():
+    text = ("# Top\n"
+            "\\subsection{Sub}\n"
+            "- a\n"
+            "  2) b\n"
+            "| x |\n"
+            "| y |\n"
+            "\n"
+            "| z |\n"
+            "[t](u) and https://e.org/p.\n"
+            "\\{ (x) \\}")
+    index = OutlineIndex(text)
+    headings = index.entries["heading"]
+    assert headings.values() == [1, 4]
+    assert index.entries["list_item"].values() == [0, 2]
+    # A row directly under another row continues its table
+    tables = index.entries["table"].offsets()
+    assert [text[offset:offset + 5] for offset in tables] == ["| x |", "| z |"]
+    links = index.entries["link"]
+    assert [text[offset:offset + length] for offset, length in zip(links.offsets(), links.values())] == \
+        ["[t](u)", "https://e.org/p."]
+    # Escaped LaTeX braces are not brackets; the list marker's parenthesis is
+    assert index.entries["bracket"].values() == ["{", "}", ")", "[", "]", "(", ")", "(", ")"]
+
+
+def test_matching_bracket_and_unmatched_closers():
+    text = "a(b[c]d)e ] {f"
+    index = OutlineIndex(text)
+    assert index.matching_bracket(1) == (1, 7)
+    # Just after a bracket counts too
+    assert index.matching_bracket(8) == (7, 1)
+    assert index.matching_bracket(3) == (3, 5)
+    assert index.matching_bracket(10) is None
+    assert index.matching_bracket(12) is None
+    assert index.matching_bracket(0) is None
+
+
+def test_section_path():
+    text = "# A\n## B\n### C\n## D\ntext\n#### E\n"
+    index = OutlineIndex(text)
+    assert index.section_path(0) == [(0, 1)]
+    assert index.section_path(text.index("C")) == [(0, 1), (4, 2), (9, 3)]
+    assert index.section_path(text.index("text")) == [(0, 1), (15, 2)]
+    assert index.section_path(text.index("E")) == [(0, 1), (15, 2), (25, 4)]
+    assert OutlineIndex("text\n# A").section_path(0) == []
+
+
+def test_step_edge_and_current():
+    text = "- a\n- b\n- c\n"
+    index = OutlineIndex(text)
+    assert index.step("list_item", 0, "next") == 4
+    assert index.step("list_item", 0, "next", 2) == 8
+    assert index.step("list_item", 0, "next", 3) is None
+    assert index.step("list_item", 8, "previous", 2) == 0
+    assert index.edge("list_item", "end") == 8
+    assert index.edge("heading", "start") is None
+    assert index.current("list_item", 6) == 4
+    assert index.value_at("list_item", 4) == 0
+    assert index.value_at("list_item", 5) is None
+
+
+def test_navigation_tools():
+    document = Document("# Intro\ntext (a [b])\n- one\n- two\n  more\n\n## Details\nsee [docs](url)\n")
+    with use_document(document):
+        assert move_cursor.invoke({"destination_type": "heading", "direction": "next"}) == \
+            "Moved to next heading 'Details' at line 7"
+        assert read_text.invoke({"unit": "current_heading", "direction": "current"}) == \
+            "Current section: Intro > Details"
+        assert move_cursor.invoke({"destination_type": "list_item", "direction": "start"}) == \
+            "Moved to first list item at line 3"
+        assert move_cursor.invoke({"destination_type": "list_item", "direction": "next"}).endswith("line 4")
+        document.cursor += 10
+        assert read_text.invoke({"unit": "current_list_item", "direction": "current"}) == \
+            "List item: '- two\n  more'"
+        assert move_cursor.invoke({"destination_type": "link", "direction": "next"}) == \
+            "Moved to next link '[docs](url)' at line 8"
+        assert move_cursor.invoke({"destination_type": "table", "direction": "next"}) == "No next table found"
+
+        document.cursor = document.text.index("(")
+        assert move_cursor.invoke({"destination_type": "matching_bracket", "direction": "next"}) == \
+            "Moved to matching ')' at line 2, column 12"
+        assert document.cursor == document.text.index("])") + 1
+        document.cursor += 1
+        move_cursor.invoke({"destination_type": "matching_bracket", "direction": "next"})
+        # From just after the closer to just after the opener
+        assert document.cursor == document.text.index("(") + 1
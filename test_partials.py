@@ -0,0 +1,54 @@
+"""Tests for the partial transcript endpoint and drafts."""
+import threading
+
+import api
+
+
+def partial(client, session_id, transcript):
+    return client.post("/api/command/partial", json={"transcript": transcript, "session_id": session_id})
+
+
+def test_partials_need_a_session(api_client):
+    response = api_client.post("/api/command/partial", json={"transcript": "undo"})
+    assert response.status_code == 400
+    assert api_client.post("/api/command/partial", json={"session_id": "x"}).status_code == 400
+
+
+def test_confident_partial_is_classified_without_a_draft(api_client, session_id):
+    result = partial(api_client, session_id, "undo").get_json()
+    assert result["intent"] == ["history_action"]
+    assert result["drafting"] is False
+
+
+def test_partial_during_a_command_returns_at_once(api_client, session_id):
+    session = api.sessions.get(session_id)
+    command_running = threading.Event()
+    command_done = threading.Event()
+
+    def command():
+        with session.lock:
+            command_running.set()
+            command_done.wait(10)
+
+    thread = threading.Thread(target=command)
+    thread.start()
+    command_running.wait(5)
+    try:
+        results = []
+        reader = threading.Thread(target=lambda: results.append(
+            partial(api_client, session_id, "make the second paragraph").get_json()))
+        reader.start()
+        reader.join(5)
+        assert not reader.is_alive(), "the partial waited for the running command"
+        assert results[0]["busy"] is True
+        assert results[0]["drafting"] is False
+    finally:
+        command_done.set()
+        thread.join()
+
+
+def test_draft_is_reused_by_the_final_command(api_client, session_id):
+    transcript = "what is the weather in Paris"
+    assert partial(api_client, session_id, transcript).get_json()["drafting"] is True
+    result = api_client.post("/api/command", json={"command": transcript, "session_id": session_id}).get_json()
+    assert result.get("draft_reused") is True
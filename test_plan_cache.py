@@ -0,0 +1,66 @@
+"""Tests for the command plan cache."""
+import pytest
+
+import api
+from document import Document
+from plan_cache import PlanCache, document_state, from_environment, normalize_command
+
+BOLD = [{"name": "apply_formatting", "args": {"format_type": "bold", "action": "apply"}}]
+
+
+def test_normalized_commands_share_an_entry():
+    cache = PlanCache()
+    cache.put("Make it bold.", BOLD)
+    assert cache.get("  make it   BOLD!") == BOLD
+    assert normalize_command("Undo that. ") == "undo that"
+
+
+def test_plans_are_kept_per_document_state():
+    cache = PlanCache()
+    document = Document("some text")
+    unselected = document_state(document)
+    cache.put("make it bold", BOLD, unselected)
+    document.selection = (0, 4)
+    assert document_state(document) != unselected
+    assert cache.get("make it bold", document_state(document)) is None
+    assert cache.get("make it bold", unselected) == BOLD
+    assert document_state(Document()) != unselected
+
+
+def test_shared_store(tmp_path):
+    path = str(tmp_path / "plans.sqlite3")
+    PlanCache(path).put("save", [{"name": "manage_file", "args": {"action": "save"}}], "text")
+    other = PlanCache(path)
+    assert other.get("save", "text") == [{"name": "manage_file", "args": {"action": "save"}}]
+    assert other.stats()["hits"] == 1
+    assert other.get("save", "empty") is None
+
+
+@pytest.mark.parametrize("environment, enabled", [
+    ({}, False),
+    ({"PLAN_CACHE": "off"}, False),
+    ({"PLAN_CACHE": "on"}, True),
+    ({"PLAN_CACHE_PATH": "plans.sqlite3"}, True),
+    ({"PLAN_CACHE_PATH": "plans.sqlite3", "PLAN_CACHE": "off"}, False),
+])
+def test_cache_is_opt_in(monkeypatch, tmp_path, environment, enabled):
+    monkeypatch.chdir(tmp_path)
+    assert (from_environment(environment) is not None) == enabled
+
+
+def test_cached_plan_is_replayed_in_the_same_state(api_client, session_id, monkeypatch):
+    monkeypatch.setattr(api, "plan_cache", PlanCache())
+    monkeypatch.setattr(api, "fast_path_enabled", False)
+    first = api_client.post("/api/command", json={"command": "bold", "session_id": session_id}).get_json()
+    assert "cached_plan" not in first
+    second = api_client.post("/api/command", json={"command": "bold", "session_id": session_id}).get_json()
+    assert second["cached_plan"] is True
+    # A new session's document is in the same (empty) state, so it shares the plan
+    other = api_client.post("/api/command", json={"command": "bold", "session_id": session_id + "-2"}).get_json()
+    assert other["cached_plan"] is True
+    # With text selected the agent is asked again
+    document = api.sessions.get(session_id).document
+    document.apply_edits([(0, 0, "hello")])
+    document.selection = (0, 5)
+    third = api_client.post("/api/command", json={"command": "bold", "session_id": session_id}).get_json()
+    assert "cached_plan" not in third
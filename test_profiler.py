@@ -0,0 +1,85 @@
+"""Tests for per-command profiles and the profile endpoints."""
+import threading
+
+import profiler
+
+
+def test_spans_nest_inside_the_command():
+    with profiler.profiling("read it") as profile:
+        with profiler.span("plan_cache.get"):
+            with profiler.span("inner", category="test", size=3):
+                pass
+    trace = profile.to_chrome_trace()
+    events = {event["name"]: event for event in trace["traceEvents"] if event["ph"] == "X"}
+    assert set(events) == {"command", "plan_cache.get", "inner"}
+    command, inner = events["command"], events["inner"]
+    assert command["ts"] <= inner["ts"] and inner["ts"] + inner["dur"] <= command["ts"] + command["dur"]
+    assert inner["cat"] == "test"
+    assert inner["args"]["size"] == 3
+    assert "cpu_ms" in inner["args"]
+    assert trace["otherData"] == {"profile_id": profile.id, "command": "read it"}
+    # The recording thread is named in a metadata event
+    assert any(event["ph"] == "M" and event["tid"] == threading.get_ident() for event in trace["traceEvents"])
+    assert profiler.get_profile(profile.id) is profile
+
+
+def test_span_is_a_no_op_without_a_profile():
+    with profiler.span("anything"):
+        pass
+    assert profiler.callbacks() == []
+
+
+def test_span_ended_on_another_thread_has_no_cpu_time():
+    profile = profiler.Profile("threads")
+    profile.begin("key", "handoff", "test")
+    thread = threading.Thread(target=profile.end, args=("key",))
+    thread.start()
+    thread.join()
+    profile.end("unknown")
+    [event] = profile.events
+    assert "cpu_ms" not in event["args"]
+
+
+def test_only_recent_profiles_are_kept(monkeypatch):
+    monkeypatch.setattr(profiler, "MAX_PROFILES", 2)
+    ids = []
+    for i in range(3):
+        with profiler.profiling(f"command {i}") as profile:
+            pass
+        ids.append(profile.id)
+    assert profiler.get_profile(ids[0]) is None
+    listed = [summary["profile_id"] for summary in profiler.list_profiles()]
+    assert listed == [ids[2], ids[1]]
+
+
+def test_profiled_command_endpoints(api_client, session_id, monkeypatch):
+    import api
+
+    # Send the command through the agent, so the profile has model and tool spans
+    monkeypatch.setattr(api, "fast_path_enabled", False)
+    response = api_client.post("/api/command", json={"command": "Read the current paragraph",
+                                                     "session_id": session_id, "profile": True})
+    assert response.status_code == 200
+    profile_id = response.get_json()["profile_id"]
+
+    listed = api_client.get("/api/profiles").get_json()["profiles"]
+    assert listed[0]["profile_id"] == profile_id
+    assert listed[0]["command"] == "Read the current paragraph"
+    assert listed[0]["duration_ms"] >= 0
+
+    trace = api_client.get(f"/api/profiles/{profile_id}").get_json()
+    names = [event["name"] for event in trace["traceEvents"] if event["ph"] == "X"]
+    assert "command" in names
+    assert any(name.startswith("model:") for name in names)
+    assert "tool:read_text" in names
+    assert all(event["dur"] >= 0 for event in trace["traceEvents"] if event["ph"] == "X")
+
+
+def test_unprofiled_command_has_no_profile_id(api_client, session_id):
+    response = api_client.post("/api/command", json={"command": "Read the current paragraph",
+                                                     "session_id": session_id})
+    assert "profile_id" not in response.get_json()
+
+
+def test_unknown_profile_is_404(api_client):
+    assert api_client.get("/api/profiles/nope").status_code == 404
@@ -0,0 +1,99 @@
+"""Tests for recording command traces and replaying them without the LLM."""
+import copy
+
+import pytest
+
+import recorder
+from recorder import command_path, fingerprint
+from document import Document
+from replay import Replay, format_report, load_traces
+
+COMMANDS = [
+    "insert 'hello world' at the cursor",
+    "Read the current paragraph",
+    "add '- ' at the start of every line",
+    "What's the current time?",
+]
+
+
+@pytest.fixture
+def traces(api_client, session_id, tmp_path, monkeypatch):
+    """Traces recorded from a short session, through both the fast path and the agent."""
+    path = tmp_path / "traces.jsonl"
+    monkeypatch.setattr(recorder, "TRACE_PATH", str(path))
+    for command in COMMANDS:
+        response = api_client.post("/api/command", json={"command": command, "session_id": session_id})
+        assert response.status_code == 200
+    return load_traces(str(path))
+
+
+def _replay(traces):
+    replay = Replay()
+    replay.run(traces)
+    return replay.summary()
+
+
+def test_traces_are_recorded(traces, session_id):
+    assert [trace["command"] for trace in traces] == COMMANDS
+    assert [trace["session_id"] for trace in traces] == [session_id] * len(COMMANDS)
+    assert traces[0]["document_before"] == fingerprint(Document())
+    assert {trace["path"] for trace in traces} == {"agent", "fast_path"}
+    for trace in traces:
+        assert trace["v"] == recorder.TRACE_VERSION
+        assert trace["tool_calls"], trace["command"]
+        for call in trace["tool_calls"]:
+            assert set(call) == {"name", "args", "output", "ms"}
+
+
+def test_replay_matches_recording(traces):
+    summary = _replay(traces)
+    assert summary["output_mismatches"] == []
+    assert summary["drifted_sessions"] == []
+    assert summary["plan_cache_conflicts"] == []
+    assert summary["counts"]["commands"] == len(traces)
+    assert summary["counts"]["tool_calls"] == sum(len(trace["tool_calls"]) for trace in traces)
+    assert "get_current_time" in summary["timings"]
+    assert "Output mismatches: 0" in format_report(summary)
+
+
+def test_changed_output_is_a_mismatch(traces):
+    traces = copy.deepcopy(traces)
+    call = traces[1]["tool_calls"][0]
+    call["output"] = "something else"
+    [mismatch] = _replay(traces)["output_mismatches"]
+    assert mismatch["command"] == traces[1]["command"]
+    assert mismatch["tool"] == call["name"]
+    assert mismatch["recorded"] == "something else"
+
+
+def test_changed_document_is_drift(traces, session_id):
+    traces = copy.deepcopy(traces)
+    # As if recording had started in the middle of the session
+    del traces[0]
+    traces[1]["tool_calls"][0]["output"] = "something else"
+    summary = _replay(traces)
+    assert summary["drifted_sessions"] == [{"session_id": session_id, "command": traces[0]["command"]}]
+    assert summary["output_mismatches"] == []
+    assert summary["counts"]["drifted_outputs"] >= 1
+
+
+def test_conflicting_plans_for_one_key(traces):
+    repeated = copy.deepcopy(traces[-1])
+    repeated["tool_calls"] = [{"name": "get_help", "args": {"topic": "commands"}, "output": "", "ms": 0.0}]
+    summary = _replay(traces + [repeated])
+    [conflict] = summary["plan_cache_conflicts"]
+    assert conflict["command"] == repeated["command"]
+
+
+def test_command_path():
+    assert command_path({"fast_path": True}) == "fast_path"
+    assert command_path({"cached_plan": True}) == "cached_plan"
+    assert command_path({"draft_reused": True}) == "draft_reused"
+    assert command_path({}) == "agent"
+
+
+def test_recording_is_off_by_default(monkeypatch):
+    monkeypatch.setattr(recorder, "TRACE_PATH", None)
+    with recorder.recording(Document(), "undo", None) as recording:
+        assert recording is None
+        assert recorder.callbacks() == []
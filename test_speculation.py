@@ -0,0 +1,64 @@
+"""Tests for racing the local fast path against the agent."""
+from typing import Any, ClassVar, List
+
+import pytest
+
+import api
+from speculation import AGENT, LOCAL, Speculation
+from stub_llm import StubChatModel
+
+
+class CountingStub(StubChatModel):
+    calls: ClassVar[List[Any]] = []
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        CountingStub.calls.append(messages)
+        return super()._generate(messages, stop, run_manager, **kwargs)
+
+
+@pytest.fixture
+def model_calls(monkeypatch, api_client):
+    CountingStub.calls = []
+    monkeypatch.setattr(api, "agent", api.initialize_agent(CountingStub()))
+    return CountingStub.calls
+
+
+def command(client, session_id, text):
+    response = client.post("/api/command", json={"command": text, "session_id": session_id})
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def test_confident_command_never_starts_the_agent(api_client, session_id, model_calls, monkeypatch):
+    monkeypatch.setattr(api, "AgentRun", None)  # Starting the agent would fail
+    result = command(api_client, session_id, "select all")
+    assert result["fast_path"] is True
+    assert model_calls == []
+
+
+def test_doubtful_command_confirmed_by_the_agent_uses_the_local_plan(api_client, session_id, model_calls):
+    # Nothing is selected, so the local "copy" is doubtful; the stub proposes the same call
+    result = command(api_client, session_id, "copy")
+    assert result["fast_path"] is True
+    assert "confirmed" in result["process_details"][1]["content"]
+    # The agent stopped after its first model call instead of writing a final answer
+    assert len(model_calls) == 1
+
+
+def test_doubtful_command_the_agent_disagrees_with(api_client, session_id, model_calls):
+    # "foo" is not in the document, so the local replace is doubtful; the stub replaces "teh" instead
+    result = command(api_client, session_id, "replace foo with bar")
+    assert "fast_path" not in result
+    assert len(model_calls) == 2
+    tool_calls = api.tool_calls_made(result["process_details"])
+    assert tool_calls[0]["args"]["text_to_replace"] == "teh"
+
+
+def test_first_claim_wins():
+    speculation = Speculation([{"name": "history_action", "args": {"action": "undo"}}])
+    assert speculation.confirmed_by([{"name": "history_action", "args": {"action": "undo", "count": None}}])
+    assert not speculation.confirmed_by([{"name": "history_action", "args": {"action": "redo"}}])
+    assert not speculation.confirmed_by([])
+    assert speculation.claim(LOCAL)
+    assert not speculation.claim(AGENT)
+    assert speculation.winner == LOCAL
@@ -0,0 +1,94 @@
+"""Tests for the Streamlit client: pooled connections, cached metadata and background commands."""
+import time
+
+import pytest
+import requests
+
+streamlit = pytest.importorskip("streamlit")
+from streamlit.testing.v1 import AppTest  # noqa: E402
+
+TOOLS = [{"name": "history_action", "description": "Undoes or redoes", "args_schema": "None"}]
+
+
+class FakeResponse:
+    def __init__(self, payload, status_code=200):
+        self.status_code = status_code
+        self._payload = payload
+
+    def json(self):
+        return self._payload
+
+    def raise_for_status(self):
+        if self.status_code != 200:
+            raise requests.HTTPError(response=self)
+
+
+class Calls(list):
+    """Requests made by the client, plus the ids of the sessions that made them."""
+
+    def __init__(self):
+        super().__init__()
+        self.sessions = set()
+
+
+@pytest.fixture
+def api_calls(monkeypatch):
+    """Serve the client's requests from memory and record them."""
+    calls = Calls()
+    sessions = calls.sessions
+
+    def get(self, url, **kwargs):
+        calls.append(("GET", url.rsplit("/", 1)[-1]))
+        sessions.add(id(self))
+        return FakeResponse({"status": "ok"} if url.endswith("/health") else {"tools": TOOLS})
+
+    def post(self, url, json=None, **kwargs):
+        calls.append(("POST", json["command"]))
+        sessions.add(id(self))
+        return FakeResponse({"final_response": f"Handled {json['command']}", "process_details": []})
+
+    monkeypatch.setattr(requests.Session, "get", get)
+    monkeypatch.setattr(requests.Session, "post", post)
+    streamlit.cache_data.clear()
+    streamlit.cache_resource.clear()
+    return calls
+
+
+@pytest.fixture
+def app(monkeypatch):
+    # AppTest in this Streamlit version never settles when a click handler calls st.rerun;
+    # each app.run() below is the rerun
+    monkeypatch.setattr(streamlit, "rerun", lambda: None)
+    return AppTest.from_file("streamlit_app.py", default_timeout=30)
+
+
+def test_metadata_is_cached_across_reruns(app, api_calls):
+    app.run()
+    app.run()
+    app.run()
+    assert api_calls.count(("GET", "health")) == 1
+    assert api_calls.count(("GET", "tools")) == 1
+    # Every request went through the one pooled session
+    assert len(api_calls.sessions) == 1
+
+
+def test_command_result_lands_in_the_history(app, api_calls):
+    app.run()
+    app.text_input[0].input("undo")
+    app.button[0].click()
+    app.run()
+    assert ("POST", "undo") in api_calls
+    assert any("Handled undo" in element.value for element in app.success)
+
+
+def test_example_commands_run_in_the_background(app, api_calls):
+    app.run()
+    try_button = next(button for button in app.button if button.key and button.key.startswith("try_"))
+    try_button.click()
+    app.run()
+    deadline = time.monotonic() + 10
+    while not app.session_state.command_history and time.monotonic() < deadline:
+        time.sleep(0.05)
+        app.run()
+    assert len(app.session_state.command_history) == 1
+    assert app.session_state.pending_commands == []
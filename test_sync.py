@@ -0,0 +1,123 @@
+"""Tests for the operation log behind shared session sync."""
+import threading
+
+from document import Document
+from formatting import get_formatting
+from sync import coalesce, get_operation_log, parse_position
+
+
+def apply_operations(text, spans, operations):
+    """A client's view of the document: edits back to front, inserted text taking its neighbour's formats."""
+    formats = [frozenset() for _ in text]
+    for start, end, names in spans:
+        for offset in range(start, end):
+            formats[offset] = frozenset(tuple(name) for name in names)
+    for operation in operations:
+        if operation["op"] == "edit":
+            for start, end, replacement in reversed(operation["edits"]):
+                del formats[start:end]
+                neighbour = formats[start - 1] if start > 0 else (formats[start] if formats else frozenset())
+                formats[start:start] = [neighbour] * len(replacement)
+                text = text[:start] + replacement + text[end:]
+        else:
+            for offset in range(operation["start"], operation["end"]):
+                kept = {fmt for fmt in formats[offset] if operation["action"] != "clear" and fmt[0] != operation["name"]}
+                if operation["action"] == "apply":
+                    kept.add((operation["name"], operation["value"]))
+                formats[offset] = frozenset(kept)
+    return text, formats
+
+
+def formats_of(document):
+    formats = []
+    for start, end, run in get_formatting(document).spans():
+        formats.extend([frozenset(run)] * (end - start))
+    return formats
+
+
+def test_a_client_replaying_the_log_matches_the_document():
+    document = Document("hello world")
+    log = get_operation_log(document)
+    snapshot = log.snapshot()
+    formatting = get_formatting(document)
+    formatting.apply(0, 5, "bold")
+    document.apply_edits([(5, 5, "!!"), (0, 0, ">")])
+    formatting.apply(3, 9, "heading", "2")
+    document.apply_edits([(6, 9, "")])
+    formatting.remove(0, 4, "bold")
+    document.apply_edits([(0, 0, "<")])
+
+    batch = log.batch_since(snapshot["seq"], snapshot["log_id"])
+    assert batch["type"] == "batch"
+    text, formats = apply_operations(snapshot["text"], snapshot["formatting"], batch["ops"])
+    assert text == document.text
+    assert formats == formats_of(document)
+
+
+def test_undo_restoring_formats_is_in_the_log():
+    document = Document("hello world")
+    log = get_operation_log(document)
+    formatting = get_formatting(document)
+    formatting.apply(0, 5, "bold")
+    formatting.apply(6, 11, "heading", "2")
+    snapshot = log.snapshot()
+    document.apply_edits([(3, 8, "")])
+    document.undo()
+    document.redo()
+    document.undo()
+
+    batch = log.batch_since(snapshot["seq"], snapshot["log_id"])
+    text, formats = apply_operations(snapshot["text"], snapshot["formatting"], batch["ops"])
+    assert text == document.text == "hello world"
+    assert formats == formats_of(document)
+    assert formatting.formats_in(0, 5) == frozenset({("bold", None)})
+
+
+def test_typing_is_coalesced():
+    operations = [{"seq": 1, "op": "edit", "edits": [[0, 0, "a"]]},
+                  {"seq": 2, "op": "edit", "edits": [[1, 1, "b"]]},
+                  {"seq": 3, "op": "edit", "edits": [[5, 5, "c"]]}]
+    assert coalesce(operations) == [{"seq": 2, "op": "edit", "edits": [[0, 0, "ab"]]},
+                                    {"seq": 3, "op": "edit", "edits": [[5, 5, "c"]]}]
+
+
+def test_old_or_foreign_positions_get_a_snapshot():
+    document = Document("x")
+    log = get_operation_log(document)
+    document.apply_edits([(0, 0, "y")])
+    assert log.batch_since(0)["type"] == "batch"
+    assert log.batch_since(0, "other-log")["type"] == "snapshot"
+    assert log.batch_since(99)["type"] == "snapshot"
+    assert parse_position(f"{log.id}:3") == (log.id, 3)
+    assert parse_position("garbage") == (None, None)
+
+
+def test_snapshots_do_not_wait_for_a_running_command(api_client, session_id):
+    import api
+
+    session = api.sessions.get(session_id)
+    session.document.apply_edits([(0, 0, "shared text")])
+    command_running = threading.Event()
+    command_done = threading.Event()
+
+    def command():
+        with session.lock:
+            command_running.set()
+            command_done.wait(10)
+
+    thread = threading.Thread(target=command)
+    thread.start()
+    command_running.wait(5)
+    try:
+        responses = []
+        reader = threading.Thread(target=lambda: responses.extend([
+            api_client.get(f"/api/sessions/{session_id}/snapshot").get_json(),
+            api_client.get(f"/api/sessions/{session_id}/ops?since=0").get_json(),
+        ]))
+        reader.start()
+        reader.join(5)
+        assert not reader.is_alive(), "sync endpoints waited for the session lock"
+        assert responses[0]["text"] == "shared text"
+    finally:
+        command_done.set()
+        thread.join()
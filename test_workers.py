@@ -0,0 +1,65 @@
+"""Tests for session routing in multi-worker mode."""
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import pytest
+import requests
+
+from workers import session_for_request
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+JSON = {"Content-Type": "application/json"}
+
+
+def test_session_from_body_header_or_path():
+    assert session_for_request("/api/command", JSON, b'{"command": "undo", "session_id": "a"}') == "a"
+    # The body wins over the header, as in the API
+    assert session_for_request("/api/command", {**JSON, "X-Session-ID": "b"}, b'{"session_id": "a"}') == "a"
+    assert session_for_request("/api/command", {**JSON, "X-Session-ID": "b"}, b'{"command": "undo"}') == "b"
+    assert session_for_request("/api/sessions/c/ops", {}, None) == "c"
+    assert session_for_request("/api/command", JSON, b"not json") is None
+    assert session_for_request("/api/command", {"Content-Type": "text/plain"}, b'{"session_id": "a"}') is None
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture
+def two_workers():
+    port = _free_port()
+    env = {**os.environ, "OPENAI_API_KEY": "test", "PLAN_CACHE": "off"}
+    process = subprocess.Popen([sys.executable, "workers.py", "--workers", "2", "--host", "127.0.0.1",
+                                "--port", str(port)], cwd=HERE, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.monotonic() + 60
+        while True:
+            try:
+                requests.get(f"{url}/api/health", timeout=1)
+                break
+            except requests.ConnectionError:
+                if time.monotonic() > deadline or process.poll() is not None:
+                    raise
+                time.sleep(0.2)
+        yield url
+    finally:
+        process.terminate()
+        process.wait(10)
+
+
+def test_body_only_session_commands_share_one_document(two_workers):
+    # Round-robin routing would alternate these between the two workers' copies of the session
+    for _ in range(4):
+        response = requests.post(f"{two_workers}/api/command", timeout=30,
+                                 json={"command": "add 'x' at the start of every line", "session_id": "shared"})
+        assert response.status_code == 200
+        assert response.json().get("fast_path")
+    snapshot = requests.get(f"{two_workers}/api/sessions/shared/snapshot", timeout=10).json()
+    assert snapshot["text"] == "xxxx"
@@ -1,5 +1,20 @@
+import re
+from bisect import bisect_right
 from langchain_core.tools import tool
 from typing import Optional, Union, List, Dict, Any
+from expression import evaluate
+from document import get_document
+from formatting import get_formatting, describe_formats
+from clipboard import get_clipboard
+from completion import get_completions, word_before
+from outline import get_outline
+
+SELECTION_PREVIEW_LENGTH = 200
+WORD_PATTERN = re.compile(r"\w+")
+# How batch_edit reports each editing action
+BATCH_ACTIONS = {"insert": "Inserted text at", "append": "Appended text to", "delete": "Deleted", "replace": "Replaced"}
+# Outline elements move_cursor steps between, and how to say them
+ELEMENT_NAMES = {"heading": "heading", "list_item": "list item", "table": "table", "link": "link"}
 
 @tool
 def search_web(query: str) -> str:
@@ -17,7 +32,7 @@ def search_web(query: str) -> str:
 def calculator(expression: str) -> str:
     """Evaluate a mathematical expression."""
     try:
-        result = eval(expression)
+        result = evaluate(expression)
         return f"The result of {expression} is {result}"
     except Exception as e:
         return f"Error evaluating expression: {str(e)}"
@@ -45,6 +60,20 @@ def read_text(
         direction: Direction relative to cursor/selection (current, next, previous)
         count: Number of units to read (e.g., read next 3 words)
     """
+    if unit == "current_heading":
+        document = get_document()
+        path = get_outline(document).section_path(document.cursor)
+        if not path:
+            return "The cursor is not under any heading"
+        return "Current section: " + " > ".join(_heading_title(document, offset) for offset, _ in path)
+    elif unit == "current_list_item":
+        document = get_document()
+        item = _list_item_range(document)
+        if item is None:
+            return "The cursor is not in a list item"
+        start, end = item
+        preview = document.text[start:min(end, start + SELECTION_PREVIEW_LENGTH)].strip()
+        return f"List item: '{preview}'"
     # Mock implementation
     return f"Reading {count} {unit}(s) in {direction} direction"
 
@@ -64,12 +93,68 @@ def move_cursor(
         value: Specific value if needed (e.g., line number for 'line' type with 'absolute' direction)
         count: Number of units to move (e.g., move forward 2 paragraphs)
     """
+    if destination_type in ELEMENT_NAMES and direction in ["next", "previous", "start", "end"]:
+        return _move_to_element(get_document(), destination_type, direction, count or 1)
+    elif destination_type == "matching_bracket":
+        document = get_document()
+        pair = get_outline(document).matching_bracket(document.cursor)
+        if pair is None:
+            return "No matched bracket at the cursor"
+        bracket, partner = pair
+        # Land on the same side of the partner as the cursor was of the bracket
+        document.cursor = partner if bracket == document.cursor else partner + 1
+        line, column = document.line_col(partner)
+        return f"Moved to matching '{document.text[partner]}' at line {line}, column {column}"
     # Mock implementation
     if direction == "absolute" and value is not None:
         return f"Moved cursor to {value} {destination_type}"
     else:
         return f"Moved cursor {direction} {count} {destination_type}(s)"
 
+def _move_to_element(document, destination_type: str, direction: str, count: int) -> str:
+    """Move the cursor to a heading, list item, table or link found through the outline index."""
+    outline = get_outline(document)
+    name = ELEMENT_NAMES[destination_type]
+    if direction in ["start", "end"]:
+        target = outline.edge(destination_type, direction)
+        where = "first" if direction == "start" else "last"
+    else:
+        target = outline.step(destination_type, document.cursor, direction, count)
+        where = direction
+    if target is None:
+        return f"No {where} {name} found"
+    document.cursor = target
+    line, _ = document.line_col(target)
+    if destination_type == "heading":
+        return f"Moved to {where} heading '{_heading_title(document, target)}' at line {line}"
+    if destination_type == "link":
+        length = outline.value_at("link", target) or 0
+        return f"Moved to {where} link '{document.text[target:target + length]}' at line {line}"
+    return f"Moved to {where} {name} at line {line}"
+
+def _heading_title(document, offset: int) -> str:
+    """The title of the heading line starting at ``offset``, without Markdown or LaTeX markup."""
+    start, end = document.line_bounds(offset)
+    line = document.text[start:end].strip()
+    if line.startswith("#"):
+        return line.lstrip("#").strip()
+    title_start = line.find("{") + 1
+    title_end = line.rfind("}")
+    return line[title_start:title_end if title_end >= title_start else len(line)].strip()
+
+def _list_item_range(document):
+    """The list item around the cursor: its line and any continuation lines up to the next item or blank line."""
+    outline = get_outline(document)
+    start = outline.current("list_item", document.cursor)
+    if start is None:
+        return None
+    end = outline.step("list_item", start, "next")
+    blank_line = document.text.find("\n\n", start)
+    if blank_line != -1 and (end is None or blank_line < end):
+        end = blank_line
+    end = len(document.text) if end is None else end
+    return (start, end) if document.cursor <= end else None
+
 # 3. Search Tools
 @tool
 def find_text(
@@ -99,12 +184,38 @@ def report_status(query: str) -> str:
         query: The specific information requested (cursor_position, selection_content, selection_boundaries, 
                current_formatting, document_stats, current_mode, unsaved_changes)
     """
+    if query == "current_formatting":
+        document = get_document()
+        formatting = get_formatting(document)
+        if document.selected_range() is not None:
+            formats = formatting.formats_in(*document.selected_range())
+            where = "Selected text"
+        else:
+            formats = formatting.formats_at(document.cursor - 1 if document.cursor else 0)
+            where = "Current text"
+        if not formats:
+            return f"{where} has no formatting"
+        return f"{where} has {describe_formats(formats)} formatting"
+
+    elif query in ["selection_content", "selection_boundaries"]:
+        document = get_document()
+        selection = document.selected_range()
+        if selection is None:
+            return "No text is selected"
+        start, end = selection
+        if query == "selection_content":
+            # Read a bounded preview rather than copying a possibly huge selection
+            preview = document.text[start:min(end, start + SELECTION_PREVIEW_LENGTH)]
+            more = f" ({end - start} characters in total)" if end - start > SELECTION_PREVIEW_LENGTH else ""
+            return f"Selected text: '{preview}'{more}"
+        start_line, start_col = document.line_col(start)
+        end_line, end_col = document.line_col(end)
+        return (f"Selection starts at line {start_line}, column {start_col} "
+                f"and ends at line {end_line}, column {end_col}")
+
     # Mock implementation
     status_responses = {
         "cursor_position": "Cursor is at line 15, column 42",
-        "selection_content": "Selected text: 'example selected text'",
-        "selection_boundaries": "Selection starts at line 15, column 30 and ends at line 15, column 47",
-        "current_formatting": "Current text has bold and italic formatting",
         "document_stats": "Document has 120 lines, 1,500 words, and 9,876 characters",
         "current_mode": "Current mode is editing (not insert mode)",
         "unsaved_changes": "Document has unsaved changes"
@@ -129,11 +240,17 @@ def modify_selection(
         start_point: Description of the start point for a 'range' selection (e.g., "line 5")
         end_point: Description of the end point for a 'range' selection (e.g., "line 10")
     """
-    # Mock implementation
+    document = get_document()
     if action == "clear":
+        document.selection = None
         return "Selection cleared"
     elif action == "select" and unit == "all":
+        document.selection = (0, len(document.text))
         return "Selected entire document"
+    elif action == "select" and unit == "line":
+        document.selection = document.line_bounds(document.cursor)
+        line, _ = document.line_col(document.cursor)
+        return f"Selected line {line}"
     elif action == "select" and unit == "range" and start_point and end_point:
         return f"Selected range from {start_point} to {end_point}"
     else:
@@ -148,7 +265,9 @@ def edit_text(
     direction: Optional[str] = None,
     text_to_replace: Optional[str] = None,
     replacement_text: Optional[str] = None,
-    scope: Optional[str] = None
+    scope: Optional[str] = None,
+    case_sensitive: Optional[bool] = False,
+    whole_word: Optional[bool] = False
 ) -> str:
     """Inserts text, deletes text/selection, or performs backspace/replace operations.
     
@@ -160,9 +279,15 @@ def edit_text(
         text_to_replace: The text to find and replace (for action 'replace')
         replacement_text: The text to replace with (for action 'replace')
         scope: Scope for replacement (next, all, selection)
+        case_sensitive: Match case when replacing
+        whole_word: Only replace whole-word matches
     """
-    # Mock implementation
+    document = get_document()
     if action == "insert" and text_to_insert:
+        if document.cursors:
+            count = document.insert_at_cursors(text_to_insert)
+            return f"Inserted text: '{text_to_insert}' at {count} cursors"
+        document.insert(text_to_insert)
         return f"Inserted text: '{text_to_insert}'"
     elif action == "delete":
         if unit == "selection":
@@ -172,25 +297,178 @@ def edit_text(
     elif action == "backspace":
         return "Performed backspace operation"
     elif action == "replace":
-        return f"Replaced '{text_to_replace}' with '{replacement_text}' in {scope} scope"
+        if not text_to_replace:
+            return "Error: no text to replace was given"
+        return _replace_text(document, text_to_replace, replacement_text or "", scope,
+                             bool(case_sensitive), bool(whole_word))
     else:
         return f"Performed {action} operation"
 
+def _replace_text(document, text_to_replace: str, replacement_text: str, scope: Optional[str],
+                  case_sensitive: bool, whole_word: bool) -> str:
+    """Replace matches in the active document according to ``scope``."""
+    if scope == "next":
+        matches = document.find_all(text_to_replace, case_sensitive, whole_word)
+        following = [match for match in matches if match[0] >= document.cursor] or matches[:1]
+        if not following:
+            return f"No occurrences of '{text_to_replace}' found"
+        start, end = following[0]
+        document.apply_edits([(start, end, replacement_text)])
+        line, column = document.line_col(start)
+        return f"Replaced '{text_to_replace}' with '{replacement_text}' at line {line}, column {column}"
+
+    if scope == "selection":
+        if document.selected_range() is None:
+            return "Error: no text is selected"
+        start, end = document.selected_range()
+        count = document.replace_all(text_to_replace, replacement_text, case_sensitive, whole_word, start, end)
+    else:
+        count = document.replace_all(text_to_replace, replacement_text, case_sensitive, whole_word)
+    if count == 0:
+        return f"No occurrences of '{text_to_replace}' found"
+    return f"Replaced {count} occurrence(s) of '{text_to_replace}' with '{replacement_text}'"
+
+@tool
+def batch_edit(
+    action: str,
+    target: str,
+    text: Optional[str] = None,
+    scope: Optional[str] = None,
+    match_text: Optional[str] = None
+) -> str:
+    """Applies one edit to many places at once, as a single undoable change, or places multiple cursors.
+    
+    Args:
+        action: What to do at each target (insert, append, delete, replace, add_cursors, clear_cursors)
+        target: Where to act (line_start, line_end, first_word, last_word, line, match, cursors)
+        text: The text to insert, append or replace with
+        scope: Lines to act on (selection, document); defaults to the selection if there is one
+        match_text: The text to find, for target 'match'
+    """
+    document = get_document()
+    if action == "clear_cursors":
+        document.cursors = []
+        return "Removed the extra cursors"
+    if action not in BATCH_ACTIONS and action != "add_cursors":
+        return f"Unknown batch edit action: {action}"
+    if action in ["insert", "append", "replace"] and text is None:
+        return f"Error: no text was given to {action}"
+    if target == "match" and not match_text:
+        return "Error: no text to match was given"
+    if scope == "selection" and document.selected_range() is None:
+        return "Error: no text is selected"
+
+    ranges = _batch_targets(document, target, scope, match_text, action == "delete")
+    if ranges is None:
+        return f"Unknown batch edit target: {target}"
+    if not ranges:
+        return f"No {target.replace('_', ' ')} found to {action.replace('_', ' ')}"
+    if action == "add_cursors":
+        document.set_cursors([start for start, _ in ranges])
+        return f"Placed {len(ranges)} cursors"
+
+    with document.transaction() as transaction:
+        for start, end in ranges:
+            if action == "insert":
+                transaction.insert(start, text)
+            elif action == "append":
+                transaction.insert(end, text)
+            elif action == "delete":
+                transaction.delete(start, end)
+            else:
+                transaction.replace(start, end, text)
+    noun = "cursor" if target == "cursors" else target.replace('_', ' ')
+    return f"{BATCH_ACTIONS[action]} {len(transaction)} {noun}(s) as one change"
+
+def _batch_targets(document, target: str, scope: Optional[str], match_text: Optional[str], deleting: bool):
+    """The ``(start, end)`` range of every target in scope, in document order, or None for an unknown target."""
+    text = document.text
+    if target == "cursors":
+        return [(cursor, cursor) for cursor in document.all_cursors()]
+    if scope != "document" and document.selected_range() is not None:
+        start, end = document.selected_range()
+    else:
+        start, end = 0, len(text)
+    if target == "match":
+        return [match for match in document.find_all(match_text, case_sensitive=False)
+                if match[0] >= start and match[1] <= end]
+    if target not in ["line_start", "line_end", "first_word", "last_word", "line"]:
+        return None
+
+    ranges = []
+    line_starts = document.line_starts
+    first = bisect_right(line_starts, start) - 1
+    # A selection that ends at the start of a line does not include that line
+    last = bisect_right(line_starts, max(start, end - 1)) - 1
+    for line in range(first, last + 1):
+        line_start = line_starts[line]
+        line_end = line_starts[line + 1] - 1 if line + 1 < len(line_starts) else len(text)
+        if target == "line_start":
+            ranges.append((line_start, line_start))
+        elif target == "line_end":
+            ranges.append((line_end, line_end))
+        elif target == "line":
+            # Deleting a line takes its newline with it
+            ranges.append((line_start, min(line_end + 1, len(text)) if deleting else line_end))
+        else:
+            words = WORD_PATTERN.finditer(text, line_start, line_end)
+            word = next(words, None)
+            if word is None:
+                continue
+            if target == "last_word":
+                for word in words:
+                    pass
+            word_start, word_end = word.span()
+            if deleting and target == "first_word":
+                # Take the spaces after the word too, so the rest of the line closes up
+                while word_end < line_end and text[word_end] in " \t":
+                    word_end += 1
+            elif deleting:
+                while word_start > line_start and text[word_start - 1] in " \t":
+                    word_start -= 1
+            ranges.append((word_start, word_end))
+    if target == "line" and deleting and ranges and ranges[-1][1] == len(text) and not text.endswith("\n"):
+        # The last line has no newline of its own; take the one before the deleted block instead
+        first_deleted = len(ranges) - 1
+        while first_deleted > 0 and ranges[first_deleted - 1][1] == ranges[first_deleted][0]:
+            first_deleted -= 1
+        block_start, block_end = ranges[first_deleted]
+        if block_start > 0:
+            ranges[first_deleted] = (block_start - 1, block_end)
+    return ranges
+
 # 7. Clipboard Tools
 @tool
-def clipboard_action(action: str) -> str:
+def clipboard_action(action: str, history_index: Optional[int] = 0) -> str:
     """Performs copy, cut, or paste operations using the system clipboard.
     
     Args:
-        action: The clipboard action to perform (copy, cut, paste)
+        action: The clipboard action to perform (copy, cut, paste, history)
+        history_index: Which clipboard history entry to paste (0 is the most recent)
     """
-    # Mock implementation
-    actions = {
-        "copy": "Copied selection to clipboard",
-        "cut": "Cut selection to clipboard",
-        "paste": "Pasted clipboard content at cursor position"
-    }
-    return actions.get(action, f"Performed {action} clipboard operation")
+    document = get_document()
+    clipboard = get_clipboard(document)
+    if action in ["copy", "cut"]:
+        selection = document.selected_range()
+        if selection is None:
+            return f"Nothing is selected to {action}"
+        if action == "copy":
+            entry = clipboard.copy(*selection)
+            return f"Copied {len(entry)} characters to clipboard"
+        entry = clipboard.cut(*selection)
+        document.selection = None
+        return f"Cut {len(entry)} characters to clipboard"
+    elif action == "paste":
+        entry = clipboard.paste(history_index or 0)
+        if entry is None:
+            return "Clipboard is empty"
+        return "Pasted clipboard content at cursor position"
+    elif action == "history":
+        if not clipboard.entries:
+            return "Clipboard is empty"
+        items = [f"{i}: '{entry.preview()}'" for i, entry in enumerate(clipboard.entries)]
+        return "Clipboard history: " + "; ".join(items)
+    return f"Performed {action} clipboard operation"
 
 # 8. History Tools
 @tool
@@ -200,7 +478,11 @@ def history_action(action: str) -> str:
     Args:
         action: History action (undo, redo)
     """
-    # Mock implementation
+    document = get_document()
+    if action == "undo":
+        return "Undid the last edit" if document.undo() else "Nothing to undo"
+    elif action == "redo":
+        return "Redid the last undone edit" if document.redo() else "Nothing to redo"
     return f"Performed {action} operation"
 
 # 9. Formatting Tools
@@ -217,19 +499,46 @@ def apply_formatting(
         action: How to interact with the format (apply, remove, toggle, insert, wrap, start)
         value: Specific value needed for the format (e.g., heading level, list type, LaTeX command)
     """
-    # Mock implementation
-    if format_type == "heading" and value:
-        return f"Applied heading level {value} formatting"
-    elif format_type == "latex_command" and value:
-        return f"Inserted LaTeX command \\{value}"
-    elif format_type == "clear":
-        return "Cleared all formatting from selection"
-    else:
-        if action:
+    if format_type.startswith("latex") or action in ["insert", "wrap", "start"]:
+        # Mock implementation
+        if format_type == "latex_command" and value:
+            return f"Inserted LaTeX command \\{value}"
+        elif action:
             return f"{action.capitalize()}d {format_type} formatting"
         else:
             return f"Applied {format_type} formatting"
 
+    document = get_document()
+    target = _formatting_range(document, format_type)
+    if target is None:
+        return f"No text is selected to format as {format_type}"
+    start, end = target
+    formatting = get_formatting(document)
+    format_value = str(value) if value is not None else None
+
+    if format_type == "clear":
+        formatting.clear(start, end)
+        return "Cleared all formatting from selection"
+    elif action == "remove":
+        formatting.remove(start, end, format_type)
+        return f"Removed {format_type} formatting"
+    elif action == "toggle":
+        applied = formatting.toggle(start, end, format_type, format_value)
+        return f"{'Applied' if applied else 'Removed'} {format_type} formatting"
+    else:
+        formatting.apply(start, end, format_type, format_value)
+        if format_type == "heading" and value:
+            return f"Applied heading level {value} formatting"
+        return f"Applied {format_type} formatting"
+
+def _formatting_range(document, format_type: str):
+    """The selection, or the cursor's line for line-level formats like headings."""
+    if document.selected_range() is not None:
+        return document.selected_range()
+    if format_type in ["heading", "list"] and document.text:
+        return document.line_bounds(document.cursor)
+    return None
+
 # 10. File Management Tools
 @tool
 def manage_file(
@@ -297,9 +606,18 @@ def manage_app_feature(
     
     Args:
         feature: The application feature to control (grammar_check, autocomplete, settings_menu, etc.)
-        action: Action to perform on the feature (enable, disable, run_check, etc.)
-        value: Value to set (e.g., theme name)
+        action: Action to perform on the feature (enable, disable, run_check, suggest, etc.)
+        value: Value to set (e.g., theme name), or the prefix to complete for autocomplete 'suggest'
     """
+    if feature == "autocomplete" and action == "suggest":
+        document = get_document()
+        prefix = value or word_before(document)
+        if not prefix:
+            return "No word to complete at the cursor"
+        suggestions = get_completions(document).complete(prefix)
+        if not suggestions:
+            return f"No completions for '{prefix}'"
+        return f"Completions for '{prefix}': {', '.join(suggestions)}"
     # Mock implementation
     if action in ["enable", "disable"]:
         return f"{action.capitalize()}d {feature} feature"
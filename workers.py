@@ -0,0 +1,266 @@
+"""Pre-fork multi-worker mode for the command API.
+
+A single Flask process runs parsing, serialization and tool execution under
+one GIL. This module starts several worker processes instead:
+
+- The arbiter (the process you start) imports ``api`` once, which builds the
+  agent and the tool catalog, then forks the workers. Everything built before
+  the fork is shared copy-on-write.
+- Each worker serves ``api.app`` on its own pre-bound local socket.
+- A router process listens on the public port and relays each request to a
+  worker. Requests for a session (a ``session_id`` in the JSON body, an
+  ``X-Session-ID`` header or a ``/api/sessions/<id>/...`` path) always go to
+  the same worker, so the session's document state stays in one process;
+  other requests are spread round-robin. Event streams are relayed as they are produced.
+- When the command plan cache is on, workers share it through a SQLite file,
+  so a plan learned by one worker is reused by all of them.
+
+The arbiter restarts any worker or router that exits. Requires ``os.fork``
+(Linux/macOS).
+
+Usage:
+    python workers.py --workers 8 --port 5000 [--plan-cache plans.sqlite3]
+"""
+import argparse
+import http.client
+import itertools
+import json
+import logging
+import os
+import re
+import shutil
+import signal
+import socket
+import sys
+import tempfile
+import threading
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+from sessions import SESSION_HEADER
+
+WORKER_TIMEOUT = 300
+SESSION_PATH = re.compile(r"^/api/sessions/([^/?]+)")
+
+# Headers that describe one connection and must not be relayed
+HOP_BY_HOP_HEADERS = {
+    "connection", "keep-alive", "proxy-authenticate", "proxy-authorization",
+    "te", "trailers", "transfer-encoding", "upgrade", "content-length",
+}
+
+
+def worker_for_session(session_id: str, workers: int) -> int:
+    """Stable worker index for a session (the same in every process and run)."""
+    return zlib.crc32(session_id.encode("utf-8")) % workers
+
+
+def session_for_request(path: str, headers, body: Optional[bytes]) -> Optional[str]:
+    """The session a request belongs to, looked up in the same order as the API does.
+
+    The API prefers a ``session_id`` in the JSON body over the header, so the
+    router must too, or body-only sessions would be spread over the workers.
+    """
+    if body and headers.get("Content-Type", "").startswith("application/json"):
+        try:
+            data = json.loads(body)
+        except ValueError:
+            data = None
+        if isinstance(data, dict) and data.get("session_id"):
+            return str(data["session_id"])
+    if headers.get(SESSION_HEADER):
+        return headers.get(SESSION_HEADER)
+    path_session = SESSION_PATH.match(path)
+    return path_session.group(1) if path_session else None
+
+
+class RouterHandler(BaseHTTPRequestHandler):
+    """Relays requests to workers, keeping one keep-alive connection per thread and worker."""
+
+    protocol_version = "HTTP/1.1"
+    worker_ports: List[int] = []
+    _round_robin = itertools.count()
+    _connections = threading.local()
+
+    def do_GET(self):
+        self._relay()
+
+    def do_POST(self):
+        self._relay()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _relay(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else None
+        session_id = session_for_request(self.path, self.headers, body)
+        if session_id:
+            index = worker_for_session(session_id, len(self.worker_ports))
+        else:
+            index = next(self._round_robin) % len(self.worker_ports)
+        headers = {key: value for key, value in self.headers.items() if key.lower() not in HOP_BY_HOP_HEADERS}
+
+        # A kept-alive connection may have been closed by the worker; retry once on a fresh one
+        for attempt in range(2):
+            connection = self._connection(index)
+            try:
+                connection.request(self.command, self.path, body=body, headers=headers)
+                response = connection.getresponse()
+                if response.getheader("Content-Type", "").startswith("text/event-stream"):
+                    self._relay_stream(index, response)
+                    return
+                data = response.read()
+                break
+            except (http.client.HTTPException, OSError):
+                self._drop_connection(index)
+                if attempt == 1:
+                    self.send_error(502, "Worker unavailable")
+                    return
+        if response.will_close:
+            self._drop_connection(index)
+
+        self.send_response(response.status)
+        for key, value in response.getheaders():
+            if key.lower() not in HOP_BY_HOP_HEADERS:
+                self.send_header(key, value)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _relay_stream(self, index: int, response: http.client.HTTPResponse) -> None:
+        """Pass an event stream through chunk by chunk until either side closes it."""
+        self.close_connection = True
+        self.send_response(response.status)
+        for key, value in response.getheaders():
+            if key.lower() not in HOP_BY_HOP_HEADERS:
+                self.send_header(key, value)
+        self.send_header("Connection", "close")
+        self.end_headers()
+        try:
+            chunk = response.read1(65536)
+            while chunk:
+                self.wfile.write(chunk)
+                self.wfile.flush()
+                chunk = response.read1(65536)
+        except OSError:
+            pass
+        finally:
+            # The worker connection is mid-stream and cannot be reused
+            self._drop_connection(index)
+
+    def _connection(self, index: int) -> http.client.HTTPConnection:
+        pool: Dict[int, http.client.HTTPConnection] = self._connections.__dict__.setdefault("pool", {})
+        if index not in pool:
+            pool[index] = http.client.HTTPConnection("127.0.0.1", self.worker_ports[index], timeout=WORKER_TIMEOUT)
+        return pool[index]
+
+    def _drop_connection(self, index: int) -> None:
+        pool = self._connections.__dict__.get("pool", {})
+        connection = pool.pop(index, None)
+        if connection is not None:
+            connection.close()
+
+
+def run_router(listener: socket.socket, worker_ports: List[int]) -> None:
+    RouterHandler.worker_ports = worker_ports
+    server = ThreadingHTTPServer(listener.getsockname()[:2], RouterHandler, bind_and_activate=False)
+    server.socket.close()
+    server.socket = listener
+    server.daemon_threads = True
+    server.serve_forever()
+
+
+def run_worker(listener: socket.socket) -> None:
+    from werkzeug.serving import make_server
+    import api
+
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    host, port = listener.getsockname()[:2]
+    make_server(host, port, api.app, threaded=True, fd=listener.fileno()).serve_forever()
+
+
+def _listen(host: str, port: int) -> socket.socket:
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind((host, port))
+    listener.listen(128)
+    listener.set_inheritable(True)
+    return listener
+
+
+def serve(host: str = "0.0.0.0", port: int = 5000, workers: Optional[int] = None,
+          plan_cache_path: Optional[str] = None) -> None:
+    """Run the arbiter: fork workers and the router, and restart them if they exit."""
+    if not hasattr(os, "fork"):
+        raise RuntimeError("Multi-worker mode requires os.fork; run 'python api.py' instead")
+    workers = workers or os.cpu_count() or 1
+
+    # The plan cache is opt-in: --plan-cache, or PLAN_CACHE=on for a temporary shared file
+    temp_dir = None
+    if plan_cache_path is None and os.environ.get("PLAN_CACHE") == "on":
+        temp_dir = tempfile.mkdtemp(prefix="plan-cache-")
+        plan_cache_path = os.path.join(temp_dir, "plans.sqlite3")
+    if plan_cache_path is not None:
+        os.environ["PLAN_CACHE_PATH"] = plan_cache_path
+
+    # Build the agent, tools and catalog once, before forking
+    import api  # noqa: F401
+
+    worker_listeners = [_listen("127.0.0.1", 0) for _ in range(workers)]
+    worker_ports = [listener.getsockname()[1] for listener in worker_listeners]
+    router_listener = _listen(host, port)
+
+    roles = {f"worker-{i}": (run_worker, (listener,)) for i, listener in enumerate(worker_listeners)}
+    roles["router"] = (run_router, (router_listener, worker_ports))
+    children: Dict[int, str] = {}
+
+    def spawn(role: str) -> None:
+        target, args = roles[role]
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            try:
+                target(*args)
+            finally:
+                os._exit(1)
+        children[pid] = role
+
+    def shutdown(signum, frame):
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        if temp_dir:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+        sys.exit(0)
+
+    signal.signal(signal.SIGINT, shutdown)
+    signal.signal(signal.SIGTERM, shutdown)
+    for role in roles:
+        spawn(role)
+    print(f"Serving on http://{host}:{port} with {workers} workers (plan cache: {plan_cache_path or 'off'})")
+
+    while True:
+        pid, status = os.wait()
+        role = children.pop(pid, None)
+        if role is not None:
+            print(f"{role} (pid {pid}) exited with status {status}, restarting", file=sys.stderr)
+            spawn(role)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the command API with several worker processes")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--workers", type=int, help="Number of worker processes (default: CPU count)")
+    parser.add_argument("--plan-cache", help="SQLite file for the shared plan cache, which turns it on "
+                        "(default: off, or a temporary file with PLAN_CACHE=on)")
+    args = parser.parse_args()
+    serve(args.host, args.port, args.workers, args.plan_cache)
+
+
+if __name__ == "__main__":
+    main()